@@ -1,11 +1,12 @@
 from django.contrib import admin
-from .models import ClaimList, ClaimDetail, ClaimFlag, ClaimNote
+from .models import ClaimList, ClaimDetail, ClaimFlag, ClaimNote, ClaimStatus, DenialReason, Insurer, ReloadJob
 
 @admin.register(ClaimList)
 class ClaimListAdmin(admin.ModelAdmin):
-    list_display = ('id', 'patient_name', 'status', 'insurer_name', 'discharge_date', 'billed_amount', 'paid_amount')
-    list_filter = ('status', 'insurer_name', 'discharge_date')
-    search_fields = ('id', 'patient_name', 'insurer_name')
+    list_display = ('id', 'patient_name', 'status', 'insurer', 'discharge_date', 'billed_amount', 'paid_amount')
+    list_filter = ('status', 'insurer', 'discharge_date')
+    list_select_related = ('status', 'insurer')
+    search_fields = ('id', 'patient_name', 'insurer__name')
     ordering = ('-discharge_date',)
     list_per_page = 50
 
@@ -13,10 +14,25 @@ class ClaimListAdmin(admin.ModelAdmin):
 class ClaimDetailAdmin(admin.ModelAdmin):
     list_display = ('id', 'claim_id', 'denial_reason', 'cpt_codes')
     list_filter = ('denial_reason',)
-    search_fields = ('id', 'claim_id', 'denial_reason', 'cpt_codes')
+    list_select_related = ('denial_reason',)
+    search_fields = ('id', 'claim__id', 'denial_reason__name', 'cpt_codes')
     ordering = ('-id',)
     list_per_page = 50
 
+@admin.register(ClaimStatus, Insurer, DenialReason)
+class LookupValueAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name')
+    search_fields = ('name',)
+    ordering = ('name',)
+
+    # Loaders, rollups, the search index and is_test_insurer all assume a
+    # name never changes once interned, so the lookups are view-only
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
 @admin.register(ClaimFlag)
 class ClaimFlagAdmin(admin.ModelAdmin):
     list_display = ('id', 'claim', 'user', 'flagged_at', 'reason', 'is_resolved')
@@ -30,3 +46,10 @@ class ClaimNoteAdmin(admin.ModelAdmin):
     list_filter = ('created_at',)
     search_fields = ('claim__id', 'user__username', 'note')
     ordering = ('-created_at',)
+
+@admin.register(ReloadJob)
+class ReloadJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'mode', 'status', 'requested_by', 'created_at', 'finished_at', 'rows_loaded', 'rows_rejected')
+    list_filter = ('status', 'mode')
+    ordering = ('-created_at',)
+    readonly_fields = ('active_key',)
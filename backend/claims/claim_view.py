@@ -0,0 +1,104 @@
+"""
+The claim page, assembled from cached fragments.
+
+A claim's page is four fragments around its forms: the claim information
+with the financial summary, the line items, the flags and the notes. Each
+is rendered once and cached under its own versions, so a write re-renders
+only the fragment it changed:
+
+* the summary and the line items under the data version, which moves on
+  every reload;
+* the flags and the notes also under the claim's own flag or note version
+  (see claims.state), which moves on every save or delete of one of that
+  claim's flags or notes, whichever view made it.
+
+The flags and notes also vary by viewer, since their owners and
+superusers get edit and delete buttons. Nothing per-request is cached:
+the resolve buttons submit a form outside the fragments, which holds the
+CSRF token.
+
+A render costs two queries, the claim and the versions, plus one for each
+fragment that is not cached: the line items, the flags with their users
+or the notes with theirs.
+"""
+from django.core.cache import cache
+from django.shortcuts import get_object_or_404
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from .models import ClaimList
+from .state import CLAIM_FLAGS_VERSION_KEY, CLAIM_NOTES_VERSION_KEY, DATA_VERSION_KEY, get_states
+
+CLAIM_FRAGMENT_TIMEOUT = 3600
+
+FRAGMENT_TEMPLATES = {
+    'summary': 'claims/claim_summary.html',
+    'line_items': 'claims/claim_line_items.html',
+    'flags': 'claims/claim_flags.html',
+    'notes': 'claims/claim_notes.html',
+}
+
+
+def claim_totals(claim):
+    """The financial summary of a claim"""
+    total_billed = claim.billed_amount or 0
+    total_paid = claim.paid_amount or 0
+    return {
+        'total_billed': total_billed,
+        'total_paid': total_paid,
+        'total_allowed': total_paid,  # Since we don't have allowed amount in our model
+        'outstanding_balance': total_billed - total_paid,
+        'payment_rate': (total_paid / total_billed * 100) if total_billed > 0 else 0,
+    }
+
+
+def viewer_key(user):
+    """Whose buttons the flags and notes show: all of them, or the user's own"""
+    return 'all' if user.is_superuser else f'user{user.pk}'
+
+
+def fragment_keys(claim_id, user):
+    """``{fragment: cache key}`` for a claim's fragments at their current versions"""
+    flags_key = CLAIM_FLAGS_VERSION_KEY.format(claim_id)
+    notes_key = CLAIM_NOTES_VERSION_KEY.format(claim_id)
+    states = get_states(DATA_VERSION_KEY, flags_key, notes_key)
+    data = states[DATA_VERSION_KEY][1]
+    viewer = viewer_key(user)
+    return {
+        'summary': f'claim_fragment:summary:{claim_id}:{data}',
+        'line_items': f'claim_fragment:line_items:{claim_id}:{data}',
+        'flags': f'claim_fragment:flags:{claim_id}:{data}:{states[flags_key][1]}:{viewer}',
+        'notes': f'claim_fragment:notes:{claim_id}:{data}:{states[notes_key][1]}:{viewer}',
+    }
+
+
+def fragment_context(claim, user, names):
+    """The context of the fragments ``names``, reading only the rows they show"""
+    context = {'claim': claim, 'user': user, **claim_totals(claim)}
+    if 'line_items' in names:
+        context['claim_details'] = list(claim.details.select_related('denial_reason'))
+    if 'flags' in names:
+        context['flags'] = list(claim.flags.select_related('user').order_by('-flagged_at'))
+    if 'notes' in names:
+        context['notes'] = list(claim.notes.select_related('user').order_by('-created_at'))
+    return context
+
+
+def claim_fragments(claim, user):
+    """``{fragment: HTML}`` for a claim's page, rendering those not cached"""
+    keys = fragment_keys(claim.pk, user)
+    cached = cache.get_many(keys.values())
+    fragments = {name: cached[key] for name, key in keys.items() if key in cached}
+    missing = [name for name in keys if name not in fragments]
+    if missing:
+        context = fragment_context(claim, user, missing)
+        rendered = {name: render_to_string(FRAGMENT_TEMPLATES[name], context) for name in missing}
+        cache.set_many({keys[name]: html for name, html in rendered.items()}, CLAIM_FRAGMENT_TIMEOUT)
+        fragments.update(rendered)
+    return {name: mark_safe(html) for name, html in fragments.items()}
+
+
+def claim_view_context(claim_id, user):
+    """The context of ``claim_detail_partial.html`` for a claim, as ``user`` sees it"""
+    claim = get_object_or_404(ClaimList.objects.select_related('status', 'insurer'), id=claim_id)
+    return {'claim': claim, 'fragments': claim_fragments(claim, user)}
@@ -0,0 +1,123 @@
+"""
+CPT codes of the claim details, normalized.
+
+ClaimDetail.cpt_codes holds a detail's codes as one comma-separated (or
+list-like) string, so matching a code with ``icontains`` also matches
+codes that contain it, and nothing can use an index. ClaimDetailCPT holds
+one row per detail and code instead, indexed by code. It is rebuilt when
+the detail feed is loaded (see claims.signals): in full after a full load,
+and only for the details an incremental load changed otherwise.
+
+``cpt_filter`` matches details by exact code, and ``cpt_code_stats``
+aggregates the details and their claims by code.
+"""
+import re
+from collections import defaultdict
+from decimal import Decimal
+from itertools import islice
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Count, Max, Q
+
+from .models import ClaimDetail, ClaimDetailCPT, DenialReason, parse_cpt_codes
+from .state import data_version
+
+# Details re-split per statement, below SQLite's bound parameter limit
+REFRESH_CHUNK_SIZE = 500
+INSERT_BATCH_SIZE = 2000
+
+CPT_STATS_CACHE_TIMEOUT = 3600
+
+# Denial reasons that mean the detail was not denied; the feeds write N/A
+NOT_DENIED = ('N/A',)
+
+MATCH_ANY = 'any'
+MATCH_ALL = 'all'
+
+
+def cpt_links(details):
+    """Yield the ClaimDetailCPT rows of a queryset of details"""
+    for pk, raw_codes in details.values_list('pk', 'cpt_codes').iterator(chunk_size=INSERT_BATCH_SIZE):
+        for code in parse_cpt_codes(raw_codes):
+            yield ClaimDetailCPT(detail_id=pk, code=code)
+
+
+def _write_links(links, using):
+    while True:
+        batch = list(islice(links, INSERT_BATCH_SIZE))
+        if not batch:
+            return
+        ClaimDetailCPT.objects.using(using).bulk_create(batch)
+
+
+def refresh_cpt_codes(pks=None, using=DEFAULT_DB_ALIAS):
+    """Re-split the codes of the details with these primary keys, or of all of them"""
+    details = ClaimDetail.objects.using(using)
+    links = ClaimDetailCPT.objects.using(using)
+    # Readers see either the old or the new codes, never a mix
+    with transaction.atomic(using=using):
+        if pks is None:
+            links.all().delete()
+            _write_links(cpt_links(details.all()), using)
+            return
+        pks = list(pks)
+        for start in range(0, len(pks), REFRESH_CHUNK_SIZE):
+            chunk = pks[start:start + REFRESH_CHUNK_SIZE]
+            links.filter(detail_id__in=chunk).delete()
+            _write_links(cpt_links(details.filter(pk__in=chunk)), using)
+
+
+def parse_cpt_query(query):
+    """The codes typed in a CPT filter, separated by commas or spaces"""
+    return list(dict.fromkeys(code for code in re.split(r'[\s,;]+', query) if code))
+
+
+def cpt_filter(codes, match=MATCH_ANY):
+    """A Q for the details with any (or, with MATCH_ALL, every one) of ``codes``"""
+    def with_code(*matching):
+        return Q(pk__in=ClaimDetailCPT.objects.filter(code__in=matching).values('detail_id'))
+
+    if match == MATCH_ALL:
+        condition = Q()
+        for code in codes:
+            condition &= with_code(code)
+        return condition
+    return with_code(*codes)
+
+
+def compute_cpt_code_stats():
+    """Per code: detail count, denied details and the billed amount of their claims"""
+    not_denied = DenialReason.objects.filter(name__in=NOT_DENIED).values('pk')
+    denied = Q(detail__denial_reason__isnull=False) & ~Q(detail__denial_reason__in=not_denied)
+    links = ClaimDetailCPT.objects.exclude(detail__claim__is_test_insurer=True)
+    rows = links.values('code').annotate(
+        detail_count=Count('id'),
+        denied_count=Count('id', filter=denied),
+    ).order_by('code')
+
+    # Billed amounts are per claim, so they are summed over each code's
+    # claims rather than its rows: a claim with several details carrying
+    # the code is billed once
+    billed = defaultdict(Decimal)
+    claims = links.values_list('code', 'detail__claim_id').annotate(billed_amount=Max('detail__claim__billed_amount'))
+    for code, _, billed_amount in claims.order_by().iterator():
+        billed[code] += billed_amount or 0
+    return [
+        {
+            **row,
+            'billed_total': billed[row['code']],
+            'denial_rate': row['denied_count'] / row['detail_count'] * 100 if row['detail_count'] else 0,
+        }
+        for row in rows
+    ]
+
+
+def cpt_code_stats():
+    """``compute_cpt_code_stats``, computed at most once per data version"""
+    key = f'cpt_code_stats:{data_version()}'
+    stats = cache.get(key)
+    if stats is None:
+        stats = compute_cpt_code_stats()
+        cache.set(key, stats, CPT_STATS_CACHE_TIMEOUT)
+    return stats
@@ -1,92 +1,149 @@
 import os
 import time
 import hashlib
+from functools import partial
 from pathlib import Path
 from django.conf import settings
-from django.core.cache import cache
 from django.utils import timezone
+from .state import compare_and_set, get_state
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Files are hashed in chunks of this size, so memory use does not grow with them
+HASH_CHUNK_SIZE = 1024 * 1024
+
 class DataMonitor:
-    """Monitors CSV files for changes and triggers data updates"""
+    """
+    Monitors CSV files for changes and triggers data updates.
+
+    Files are compared by their stat fingerprint (size, mtime_ns, inode)
+    first, and only read and hashed when that fingerprint moves, so a poll
+    costs one stat() per file however large the files are.
+    """
     
     def __init__(self):
         self.data_folder = Path(settings.BASE_DIR.parent) / 'Data'
-        self.cache_key = 'csv_file_hashes'
+        self.state_key = 'csv_file_fingerprints'
         self.last_check = None
         
     def get_file_hash(self, file_path):
-        """Get MD5 hash of a file"""
+        """Get a BLAKE2b hash of a file, read in chunks"""
         try:
+            digest = hashlib.blake2b(digest_size=16)
             with open(file_path, 'rb') as f:
-                return hashlib.md5(f.read()).hexdigest()
+                for chunk in iter(partial(f.read, HASH_CHUNK_SIZE), b''):
+                    digest.update(chunk)
+            return digest.hexdigest()
         except Exception as e:
             logger.error(f"Error reading file {file_path}: {e}")
             return None
     
-    def get_all_csv_hashes(self):
-        """Get hashes of all CSV files in Data folder"""
-        hashes = {}
+    def get_all_csv_stats(self):
+        """Get the stat fingerprint of all CSV files in Data folder, without reading them"""
+        stats = {}
         if self.data_folder.exists():
             for csv_file in self.data_folder.glob('*.csv'):
-                file_hash = self.get_file_hash(csv_file)
-                if file_hash:
-                    hashes[str(csv_file)] = {
-                        'hash': file_hash,
-                        'modified': csv_file.stat().st_mtime,
-                        'size': csv_file.stat().st_size
-                    }
+                try:
+                    stat = csv_file.stat()
+                except OSError:
+                    # Removed between the glob and the stat
+                    continue
+                stats[str(csv_file)] = {
+                    'modified': stat.st_mtime,
+                    'mtime_ns': stat.st_mtime_ns,
+                    'size': stat.st_size,
+                    'inode': stat.st_ino,
+                }
+        return stats
+    
+    @staticmethod
+    def fingerprint(info):
+        """The stat values that must all match for a file to count as unchanged"""
+        return (info.get('size'), info.get('mtime_ns'), info.get('inode'))
+    
+    def get_all_csv_hashes(self, known=None):
+        """
+        Get fingerprints and hashes of all CSV files in Data folder. Files
+        whose fingerprint matches their entry in ``known`` keep its hash
+        instead of being read again.
+        """
+        known = known or {}
+        hashes = {}
+        for file_path, info in self.get_all_csv_stats().items():
+            previous = known.get(file_path)
+            if previous and previous.get('hash') and self.fingerprint(previous) == self.fingerprint(info):
+                info['hash'] = previous['hash']
+            else:
+                info['hash'] = self.get_file_hash(file_path)
+                if not info['hash']:
+                    continue
+            hashes[file_path] = info
         return hashes
     
     def check_for_changes(self):
-        """Check if any CSV files have changed"""
-        current_hashes = self.get_all_csv_hashes()
-        cached_hashes = cache.get(self.cache_key, {})
-        
-        changes_detected = []
-        
-        for file_path, current_info in current_hashes.items():
-            if file_path in cached_hashes:
-                cached_info = cached_hashes[file_path]
-                if (current_info['hash'] != cached_info['hash'] or 
-                    current_info['modified'] != cached_info['modified'] or
-                    current_info['size'] != cached_info['size']):
+        """
+        Check if any CSV files have changed. The last seen fingerprints are
+        shared by every worker, and only the worker that records a change
+        reports it, so a change is acted on once however many workers poll.
+        """
+        while True:
+            cached_hashes, version = get_state(self.state_key, {})
+            current_hashes = self.get_all_csv_hashes(known=cached_hashes)
+            if current_hashes == cached_hashes:
+                changes_detected = []
+                break
+            
+            changes_detected = []
+            
+            for file_path, current_info in current_hashes.items():
+                if file_path in cached_hashes:
+                    # A file that was touched or rewritten with the same
+                    # contents has a new fingerprint but the same hash
+                    if current_info['hash'] != cached_hashes[file_path].get('hash'):
+                        changes_detected.append(file_path)
+                else:
+                    # New file detected
                     changes_detected.append(file_path)
-                    logger.info(f"Change detected in {file_path}")
-            else:
-                # New file detected
-                changes_detected.append(file_path)
-                logger.info(f"New file detected: {file_path}")
-        
-        # Check for deleted files
-        for file_path in cached_hashes:
-            if file_path not in current_hashes:
-                changes_detected.append(file_path)
-                logger.info(f"File deleted: {file_path}")
-        
-        # Update cache with current hashes
-        cache.set(self.cache_key, current_hashes, timeout=3600)  # Cache for 1 hour
+            
+            # Check for deleted files
+            for file_path in cached_hashes:
+                if file_path not in current_hashes:
+                    changes_detected.append(file_path)
+            
+            # Record the current fingerprints and hashes, unless another
+            # worker got there first; then compare against what it stored
+            if compare_and_set(self.state_key, current_hashes, version):
+                for file_path in changes_detected:
+                    if file_path not in current_hashes:
+                        logger.info(f"File deleted: {file_path}")
+                    elif file_path in cached_hashes:
+                        logger.info(f"Change detected in {file_path}")
+                    else:
+                        logger.info(f"New file detected: {file_path}")
+                break
         
+        self.last_check = timezone.now()
         return changes_detected, current_hashes
     
-    def get_last_modified_time(self):
+    def get_last_modified_time(self, files=None):
         """Get the most recent modification time of any CSV file"""
-        hashes = self.get_all_csv_hashes()
-        if not hashes:
+        if files is None:
+            files = self.get_all_csv_stats()
+        if not files:
             return None
         
-        latest_time = max(info['modified'] for info in hashes.values())
+        latest_time = max(info['modified'] for info in files.values())
         return timezone.datetime.fromtimestamp(latest_time, tz=timezone.utc)
     
     def get_data_status(self):
         """Get current data status for frontend display"""
-        hashes = self.get_all_csv_hashes()
-        last_modified = self.get_last_modified_time()
+        # One scan serves the whole status, and it only needs stat()
+        files = self.get_all_csv_stats()
+        last_modified = self.get_last_modified_time(files)
         
         return {
-            'total_files': len(hashes),
+            'total_files': len(files),
             'last_modified': last_modified.isoformat() if last_modified else None,
             'files': [
                 {
@@ -94,7 +151,7 @@ class DataMonitor:
                     'size': info['size'],
                     'modified': timezone.datetime.fromtimestamp(info['modified'], tz=timezone.utc).isoformat()
                 }
-                for file_path, info in hashes.items()
+                for file_path, info in files.items()
             ]
         }
 
@@ -0,0 +1,164 @@
+"""
+Server-sent events for the dashboard.
+
+Open tabs subscribe to ``/dashboard/api/events/`` instead of polling for
+changes. Each process runs a single EventBroadcaster while it has
+subscribers: once a second it stats the CSV files (queueing a reload when
+they changed) and reads the data version and the latest reload job, then
+pushes whatever moved to every connected tab. The work is the same for
+one tab or hundreds, and a tab with nothing new to show costs nothing but
+its open connection.
+
+Events:
+
+* ``version``: the data version, bumped whenever a feed is loaded, with
+  the time of the last reload and the table counts.
+* ``reload``: the latest reload job, as reported by the job status API,
+  whenever its status or progress changes.
+
+Streaming needs the ASGI application. Under WSGI the endpoint answers with
+the current events and a ``retry`` delay, so EventSource falls back to
+reconnecting periodically rather than holding a worker.
+"""
+import asyncio
+import json
+import time
+import logging
+
+from asgiref.sync import sync_to_async
+
+from .data_monitor import data_monitor
+from .jobs import enqueue_reload
+from .models import ClaimDetail, ClaimList, ReloadJob
+from .state import DATA_VERSION_KEY, LAST_RELOAD_KEY, get_states
+
+logger = logging.getLogger(__name__)
+
+# How often the broadcaster checks the files and the reload state
+POLL_INTERVAL = 1.0
+
+# Comment lines keep idle connections open through proxies
+KEEPALIVE_SECONDS = 15
+
+# Streams are closed after this long and EventSource reconnects; Django 4.2
+# does not report client disconnects, so this bounds abandoned streams
+STREAM_SECONDS = 300
+
+# Reconnect delay for streaming clients, and for WSGI where each response
+# carries a single snapshot
+RECONNECT_MS = 1000
+WSGI_RECONNECT_MS = 30000
+
+
+def format_event(name, data):
+    """Encode one server-sent event"""
+    return f'event: {name}\ndata: {json.dumps(data)}\n\n'
+
+
+def collect_events(previous=None):
+    """
+    Return ``{event name: payload}`` for the events that differ from
+    ``previous``, queueing a reload first if the CSV files changed.
+    """
+    previous = previous or {}
+
+    changes, _ = data_monitor.check_for_changes()
+    if changes:
+        job, created = enqueue_reload(follow_up=True)
+        if created:
+            logger.info(f'Queued reload job {job.id} for {len(changes)} changed file(s)')
+
+    events = {}
+    states = get_states(DATA_VERSION_KEY, LAST_RELOAD_KEY)
+    version = states[DATA_VERSION_KEY][1]
+    if previous.get('version', {}).get('data_version') != version:
+        events['version'] = {
+            'data_version': version,
+            'last_reload': states[LAST_RELOAD_KEY][0],
+            'total_claims': ClaimList.objects.count(),
+            'total_claim_details': ClaimDetail.objects.count(),
+        }
+
+    job = ReloadJob.objects.order_by('-created_at', '-id').first()
+    if job is not None:
+        status = job.as_dict()
+        if previous.get('reload') != status:
+            events['reload'] = status
+
+    return events
+
+
+class EventBroadcaster:
+    """Polls shared state once per process and fans events out to every subscriber"""
+
+    def __init__(self, interval=POLL_INTERVAL):
+        self.interval = interval
+        self.subscribers = set()
+        self.latest = {}
+        self.task = None
+
+    def subscribe(self):
+        """Return a queue that receives the latest events, then every new one"""
+        queue = asyncio.Queue()
+        for name, data in self.latest.items():
+            queue.put_nowait((name, data))
+        self.subscribers.add(queue)
+
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self.run())
+        return queue
+
+    def unsubscribe(self, queue):
+        self.subscribers.discard(queue)
+
+    async def run(self):
+        """Poll while anyone is listening"""
+        try:
+            while self.subscribers:
+                try:
+                    events = await sync_to_async(collect_events)(self.latest)
+                except Exception:
+                    logger.exception('Error collecting dashboard events')
+                    events = {}
+
+                for name, data in events.items():
+                    self.latest[name] = data
+                    for queue in self.subscribers:
+                        queue.put_nowait((name, data))
+
+                await asyncio.sleep(self.interval)
+        finally:
+            # The next subscriber should not be primed with stale events
+            self.latest = {}
+
+    async def stream(self):
+        """Yield encoded events for one client until its stream expires"""
+        queue = self.subscribe()
+        deadline = time.monotonic() + STREAM_SECONDS
+        try:
+            yield f'retry: {RECONNECT_MS}\n\n'
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                try:
+                    name, data = await asyncio.wait_for(
+                        queue.get(), min(KEEPALIVE_SECONDS, remaining)
+                    )
+                except asyncio.TimeoutError:
+                    yield ': keepalive\n\n'
+                    continue
+                yield format_event(name, data)
+        finally:
+            self.unsubscribe(queue)
+
+
+def snapshot():
+    """The current events as a complete response body, for WSGI clients"""
+    body = f'retry: {WSGI_RECONNECT_MS}\n\n'
+    for name, data in collect_events().items():
+        body += format_event(name, data)
+    return body
+
+
+broadcaster = EventBroadcaster()
@@ -0,0 +1,104 @@
+"""
+CSV export of claims with their line items.
+
+An export is one query: the claims, LEFT JOINed to their details so that
+each detail is a row and a claim without details still gets one. The rows
+are read with ``iterator()`` (a server-side cursor on PostgreSQL, chunked
+fetches on SQLite) and written to a StreamingHttpResponse a chunk at a
+time, so memory use does not grow with the export and the header goes out
+before the query has finished. Under ASGI the chunks are pulled through an
+async iterator (see claims.streaming) so they are still sent one by one.
+"""
+import csv
+import io
+
+from .models import parse_cpt_codes
+from .streaming import streaming_response
+
+# Rows fetched from the database, and written to the response, at a time
+EXPORT_CHUNK_SIZE = 2000
+
+EXPORT_HEADER = [
+    'Claim ID',
+    'Patient Name',
+    'Insurer',
+    'Status',
+    'Discharge Date',
+    'Billed Amount',
+    'Paid Amount',
+    'Outstanding Balance',
+    'Payment Rate (%)',
+    'Detail ID',
+    'CPT Codes',
+    'Denial Reason',
+]
+
+EXPORT_FIELDS = [
+    'id',
+    'patient_name',
+    'insurer__name',
+    'status__name',
+    'discharge_date',
+    'billed_amount',
+    'paid_amount',
+    'details__id',
+    'details__cpt_codes',
+    'details__denial_reason__name',
+]
+
+
+def normalize_cpt_codes(raw_codes):
+    """CPT codes stored comma-separated or list-like, as ``a; b``"""
+    return '; '.join(parse_cpt_codes(raw_codes)) or '-'
+
+
+def export_row(values):
+    """A CSV row for one ``EXPORT_FIELDS`` tuple"""
+    (claim_id, patient_name, insurer_name, status, discharge_date,
+     billed_amount, paid_amount, detail_id, cpt_codes, denial_reason) = values
+    total_billed = float(billed_amount or 0)
+    total_paid = float(paid_amount or 0)
+    payment_rate = (total_paid / total_billed * 100) if total_billed > 0 else 0
+    return [
+        claim_id,
+        patient_name or '-',
+        insurer_name or '-',
+        status or '-',
+        discharge_date.strftime('%m/%d/%Y') if discharge_date else '-',
+        f"{total_billed:.2f}",
+        f"{total_paid:.2f}",
+        f"{total_billed - total_paid:.2f}",
+        f"{payment_rate:.1f}",
+        detail_id if detail_id is not None else '-',
+        normalize_cpt_codes(cpt_codes),
+        denial_reason or '-',
+    ]
+
+
+def export_lines(claims, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield the CSV export of a claim queryset, ``chunk_size`` rows at a time"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, quoting=csv.QUOTE_MINIMAL)
+
+    def flush():
+        data = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return data
+
+    writer.writerow(EXPORT_HEADER)
+    yield flush()
+
+    rows = claims.values_list(*EXPORT_FIELDS).order_by('id', 'details__id')
+    for count, values in enumerate(rows.iterator(chunk_size=chunk_size), start=1):
+        writer.writerow(export_row(values))
+        if count % chunk_size == 0:
+            yield flush()
+    yield flush()
+
+
+def export_response(request, claims, filename):
+    """A streaming CSV download of a claim queryset"""
+    response = streaming_response(request, export_lines(claims), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
@@ -0,0 +1,52 @@
+"""
+Filter facets for the list views: the distinct values of a column, with
+the number of rows in the current list that have each one.
+
+A facet is one grouped query over the list with every filter applied
+except its own, so each option shows how many rows choosing it would
+give. Facets over a lookup column (see claims.lookups) group by its
+integer key and name the groups afterwards from the small lookup table.
+Results are cached under the query and the data, flag and note versions
+(see claims.state). Re-rendering a list with the same filters
+therefore costs no query until something changes, on any worker.
+"""
+from django.core.cache import cache
+from django.db.models import Count, Q
+from django.db.models.constants import LOOKUP_SEP
+
+from .lookups import is_lookup, lookup_names
+from .state import queryset_cache_key
+
+FACET_CACHE_TIMEOUT = 3600
+
+
+def facet_counts(queryset, field, selected=''):
+    """
+    ``[{'value': ..., 'count': ...}]`` for each distinct non-empty value of
+    ``field`` in ``queryset``, by value. The ``selected`` value is listed
+    even when no row has it, so the dropdown keeps showing the choice.
+    """
+    model_field = queryset.model._meta.get_field(field) if LOOKUP_SEP not in field else None
+    lookup = model_field is not None and is_lookup(model_field)
+    empty = Q(**{f'{field}__isnull': True})
+    if not lookup:
+        empty |= Q(**{field: ''})
+    grouped = (
+        queryset.exclude(empty)
+        .values_list(field)
+        .annotate(count=Count('pk'))
+        .order_by(*([] if lookup else [field]))
+    )
+    key = queryset_cache_key(f'facet:{field}', grouped)
+    counts = cache.get(key)
+    if counts is None:
+        counts = list(grouped)
+        if lookup:
+            names = lookup_names(model_field.related_model, [value for value, _ in counts], using=queryset.db)
+            counts = sorted((names[value], count) for value, count in counts)
+        counts = [{'value': value, 'count': count} for value, count in counts]
+        cache.set(key, counts, FACET_CACHE_TIMEOUT)
+
+    if selected and all(facet['value'] != selected for facet in counts):
+        counts = sorted(counts + [{'value': selected, 'count': 0}], key=lambda facet: facet['value'])
+    return counts
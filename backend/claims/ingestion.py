@@ -0,0 +1,1197 @@
+"""
+Shared ingestion core for the claims feeds.
+
+Every loader (the load_claims_data and reload_claims_data commands, the
+reload jobs behind the force-reload API and the standalone database.py script) goes through
+``load_feed``, which combines three pieces:
+
+* a source that yields raw rows (CSVSource for the pipe-delimited files,
+  JSONSource for JSON arrays and NDJSON, ParquetSource for snapshots
+  written by claims.snapshots, all read incrementally),
+* a typed TableSchema that coerces those rows the same way in Python and
+  in SQL, and stores statuses, insurers and denial reasons as keys of
+  their lookup tables (see claims.lookups),
+* a batch writer chosen by the load mode.
+
+Rows are read lazily and written in fixed-size batches, so memory use is
+bounded by the batch size rather than the size of the feed. Rows that fail
+coercion are written to a Quarantine file instead of being dropped.
+
+Load modes:
+
+* ``replace`` clears the table and bulk loads the feed. PostgreSQL streams
+  CSV files with COPY FROM STDIN and coerces types in SQL; other backends
+  insert coerced tuples with executemany, optionally parsing newline-aligned
+  byte ranges of the file in a process pool while a single writer inserts
+  the results in file order.
+* ``append`` bulk loads without clearing; existing keys are left alone.
+* ``swap`` bulk loads into a ``<table>__shadow`` copy that is swapped into
+  place in one transaction, so readers keep seeing the previous data until
+  the new load is complete.
+* ``incremental`` applies the feed as a delta through a DiffWriter,
+  touching only rows that were added, changed or removed.
+"""
+import csv
+import io
+import json
+import os
+import re
+import time
+import logging
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from pathlib import Path
+import django
+from django.conf import settings
+from django.db import connections, models, transaction, DEFAULT_DB_ALIAS
+from django.db.models.constants import OnConflict
+from django.db.utils import NotSupportedError
+from django.utils import timezone
+from .lookups import LookupCache
+from .models import TEST_INSURER_MARKER, ClaimList, ClaimDetail, ClaimStatus, DenialReason, Insurer
+from .signals import feed_loaded, writing_feed
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 5000
+
+JSON_READ_SIZE = 64 * 1024
+JSON_EXTENSIONS = ('.json', '.jsonl', '.ndjson')
+PARQUET_EXTENSIONS = ('.parquet',)
+PARQUET_READ_ROWS = 64 * 1024
+
+DEFAULT_CHUNK_BYTES = 8 * 1024 * 1024
+MIN_CHUNK_BYTES = 64 * 1024
+
+SHADOW_SUFFIX = '__shadow'
+SEEN_SUFFIX = '__seen'
+
+# Deltas with more changed rows than this are reported as full reloads
+MAX_TRACKED_CHANGES = 50000
+
+MODE_REPLACE = 'replace'
+MODE_APPEND = 'append'
+MODE_SWAP = 'swap'
+MODE_INCREMENTAL = 'incremental'
+LOAD_MODES = (MODE_REPLACE, MODE_APPEND, MODE_SWAP, MODE_INCREMENTAL)
+
+
+def iter_csv_rows(path, delimiter='|'):
+    """Yield each row of a delimited file as a dict, one line at a time"""
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        yield from csv.DictReader(f, delimiter=delimiter)
+
+
+class CSVSource:
+    """Delimited text feed, read one line at a time"""
+
+    format = 'csv'
+
+    def __init__(self, path, delimiter='|'):
+        self.path = Path(path)
+        self.delimiter = delimiter
+
+    @property
+    def name(self):
+        return self.path.name
+
+    def exists(self):
+        return self.path.exists()
+
+    def __iter__(self):
+        return iter_csv_rows(self.path, self.delimiter)
+
+
+def iter_json_records(path, read_size=JSON_READ_SIZE):
+    """
+    Yield the objects of a JSON array or of newline-delimited JSON one at a
+    time, holding at most one object plus one read in memory.
+
+    Numbers are kept as their source text so decimals are not rounded
+    through float before the schema coerces them.
+    """
+    decoder = json.JSONDecoder(parse_float=str, parse_int=str)
+    whitespace = ' \t\r\n'
+    with open(path, 'r', encoding='utf-8') as f:
+        buf = f.read(read_size)
+        pos = 0
+        eof = not buf
+        in_array = None
+
+        while True:
+            # Skip whitespace, the separators between array items and the
+            # array brackets themselves
+            while pos < len(buf) and (buf[pos] in whitespace or (in_array and buf[pos] == ',')):
+                pos += 1
+            if pos < len(buf):
+                if in_array is None:
+                    in_array = buf[pos] == '['
+                    if in_array:
+                        pos += 1
+                        continue
+                if in_array and buf[pos] == ']':
+                    return
+                try:
+                    record, end = decoder.raw_decode(buf, pos)
+                except json.JSONDecodeError:
+                    # Most likely an object cut off by the end of the read
+                    if eof:
+                        raise
+                else:
+                    # A value ending exactly at the end of the buffer may be
+                    # a truncated number; read on before trusting it
+                    if end < len(buf) or eof:
+                        yield record
+                        pos = end
+                        continue
+            elif eof:
+                return
+
+            chunk = f.read(read_size)
+            eof = not chunk
+            buf = buf[pos:] + chunk
+            pos = 0
+
+
+class JSONSource:
+    """JSON array or NDJSON feed, decoded one object at a time"""
+
+    format = 'json'
+
+    def __init__(self, path):
+        self.path = Path(path)
+
+    @property
+    def name(self):
+        return self.path.name
+
+    def exists(self):
+        return self.path.exists()
+
+    def __iter__(self):
+        for record in iter_json_records(self.path):
+            if not isinstance(record, dict):
+                raise ValueError(f'{self.name} must contain JSON objects, found {type(record).__name__}')
+            yield record
+
+
+class ParquetSource:
+    """
+    Parquet feed, such as a snapshot table, read a row group at a time.
+    Values arrive already typed, so the schema has little left to coerce.
+    """
+
+    format = 'parquet'
+
+    def __init__(self, path):
+        self.path = Path(path)
+
+    @property
+    def name(self):
+        return self.path.name
+
+    def exists(self):
+        return self.path.exists()
+
+    def __iter__(self):
+        for batch in self.batches():
+            yield from batch.to_pylist()
+
+    def batches(self, columns=None):
+        from .snapshots import load_pyarrow
+
+        _, parquet = load_pyarrow()
+        return parquet.ParquetFile(self.path).iter_batches(batch_size=PARQUET_READ_ROWS, columns=columns)
+
+    def typed_values(self, schema):
+        """
+        ``schema.values`` tuples for every row, converted a column at a time,
+        or None when the file's column types are not the schema's and its
+        rows must be coerced one by one
+        """
+        from .snapshots import load_pyarrow
+
+        pa, parquet = load_pyarrow()
+        types = parquet.ParquetFile(self.path).schema_arrow
+        sources = list(dict.fromkeys(column.source for column in schema.columns))
+        if any(name not in types.names for name in sources):
+            return None
+        if not all(_arrow_matches(pa, column, types.field(column.source).type) for column in schema.columns):
+            return None
+
+        def values():
+            import pyarrow.compute as compute
+
+            for batch in self.batches(columns=sources):
+                arrays = {}
+                for name in sources:
+                    array = batch.column(name)
+                    if pa.types.is_dictionary(array.type):
+                        array = array.dictionary_decode()
+                    arrays[name] = array
+                yield from zip(*(_arrow_column(compute, column, arrays[column.source]) for column in schema.columns))
+
+        return values()
+
+
+def _arrow_matches(pa, column, arrow_type):
+    """Whether an Arrow column holds what ``column.parse`` would produce"""
+    if pa.types.is_dictionary(arrow_type):
+        arrow_type = arrow_type.value_type
+    if isinstance(column, ContainsColumn) or column.kind in ('text', 'lookup'):
+        return pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type)
+    if column.kind == 'int':
+        return pa.types.is_integer(arrow_type)
+    if column.kind == 'decimal':
+        return pa.types.is_decimal(arrow_type)
+    if column.kind == 'date':
+        return pa.types.is_date(arrow_type)
+    return False
+
+
+def _arrow_column(compute, column, array):
+    """A column's values as Python objects, with the defaults ``parse`` applies"""
+    if isinstance(column, ContainsColumn):
+        matches = compute.match_substring(array, column.marker, ignore_case=True)
+        return compute.fill_null(matches, False).to_pylist()
+    if column.kind == 'int':
+        return compute.fill_null(array, 0).to_pylist()
+    if column.kind == 'text':
+        return compute.fill_null(array, '').to_pylist()
+    return array.to_pylist()
+
+
+def open_source(path):
+    """Pick a source for a feed file by its extension"""
+    suffix = Path(path).suffix.lower()
+    if suffix in JSON_EXTENSIONS:
+        return JSONSource(path)
+    if suffix in PARQUET_EXTENSIONS:
+        return ParquetSource(path)
+    return CSVSource(path)
+
+
+def default_data_dir():
+    """Folder the claims feeds are read from"""
+    return Path(settings.BASE_DIR.parent) / 'Data'
+
+
+def default_quarantine_dir():
+    """Folder that receives the files of rows rejected during a load"""
+    return Path(getattr(settings, 'CLAIMS_QUARANTINE_DIR', Path(settings.BASE_DIR) / 'quarantine'))
+
+
+def claim_feeds(data_dir=None, format='csv'):
+    """
+    Return ``(label, source, schema)`` for each claims feed, in load order.
+
+    ``format`` selects the ``.csv``, ``.json`` or ``.parquet`` export of
+    each feed.
+    """
+    data_dir = Path(data_dir) if data_dir else default_data_dir()
+    return [
+        ('claim list', open_source(data_dir / f'claim_list_data.{format}'), CLAIM_LIST_SCHEMA),
+        ('claim detail', open_source(data_dir / f'claim_detail_data.{format}'), CLAIM_DETAIL_SCHEMA),
+    ]
+
+
+def batched(iterable, size):
+    """Yield lists of at most ``size`` items from ``iterable``"""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def parse_date(value):
+    """Parse a YYYY-MM-DD string, returning None for blank or invalid values"""
+    if not value:
+        return None
+    if isinstance(value, date):
+        return value
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except (ValueError, TypeError):
+        return None
+
+
+def parse_decimal(value):
+    """Parse a decimal string, returning None for blank or invalid values"""
+    if value in (None, ''):
+        return None
+    try:
+        return Decimal(value)
+    except (InvalidOperation, ValueError, TypeError):
+        return None
+
+
+class Column:
+    """
+    One typed column of a feed.
+
+    ``kind`` is one of ``int``, ``decimal``, ``date``, ``text`` or
+    ``lookup``. Ints default to 0 when blank and reject the row when
+    malformed; decimals and dates become NULL when blank or malformed; text
+    defaults to ''.
+    """
+
+    def __init__(self, name, kind):
+        self.name = name
+        self.kind = kind
+        # The feed column the value is read from
+        self.source = name
+
+    def parse(self, value):
+        """Coerce a raw string in Python"""
+        if self.kind == 'int':
+            return int(value or 0)
+        if self.kind == 'decimal':
+            return parse_decimal(value)
+        if self.kind == 'date':
+            return parse_date(value)
+        return value or ''
+
+    def sql(self, expr):
+        """Coerce a raw text column in SQL (PostgreSQL) with the same rules"""
+        if self.kind == 'int':
+            return f"COALESCE(NULLIF(trim({expr}), ''), '0')::bigint"
+        if self.kind == 'decimal':
+            return (
+                f"CASE WHEN trim({expr}) ~ '^[-+]?([0-9]+[.]?[0-9]*|[.][0-9]+)$' "
+                f"THEN trim({expr})::numeric END"
+            )
+        if self.kind == 'date':
+            # Validate the day against the length of the month so an
+            # impossible date becomes NULL instead of aborting the load. The
+            # CASEs are nested because AND does not short-circuit in SQL.
+            return (
+                f"CASE WHEN {expr} ~ '^[0-9]{{4}}-(0[1-9]|1[0-2])-(0[1-9]|[12][0-9]|3[01])$' "
+                f"THEN CASE WHEN substr({expr}, 9, 2)::int <= extract(day from "
+                f"date_trunc('month', (substr({expr}, 1, 8) || '01')::date) "
+                f"+ interval '1 month - 1 day') "
+                f"THEN {expr}::date END END"
+            )
+        return f"COALESCE({expr}, '')"
+
+    def sql_valid(self, expr):
+        """SQL predicate that is false for values ``parse`` would reject"""
+        if self.kind == 'int':
+            return f"({expr} IS NULL OR trim({expr}) ~ '^([-+]?[0-9]+)?$')"
+        return 'TRUE'
+
+
+class ContainsColumn(Column):
+    """
+    Boolean column derived from another feed column: true when that column
+    contains ``marker``, ignoring case, as ``icontains`` would match it.
+    """
+
+    def __init__(self, name, source, marker):
+        super().__init__(name, 'bool')
+        self.source = source
+        self.marker = marker.lower()
+
+    def parse(self, value):
+        return self.marker in (value or '').lower()
+
+    def sql(self, expr):
+        return f"COALESCE(strpos(lower({expr}), '{self.marker}') > 0, FALSE)"
+
+
+class LookupColumn(Column):
+    """
+    Key of a lookup table row (see claims.lookups), named by the feed
+    column ``source``. ``parse`` keeps the name, blank as None: it becomes
+    a key when the row is written, through the load's ``schema.resolver``,
+    so worker processes parsing a feed never write to the database.
+    """
+
+    def __init__(self, name, source, model):
+        super().__init__(name, 'lookup')
+        self.source = source
+        self.model = model
+
+    def parse(self, value):
+        return value or None
+
+    def sql(self, expr):
+        return f"(SELECT id FROM {self.model._meta.db_table} WHERE name = NULLIF({expr}, ''))"
+
+    def intern_sql(self, expr, stage):
+        """SQL adding the names in the staged column ``expr`` that are new"""
+        return (
+            f'INSERT INTO {self.model._meta.db_table} (name) '
+            f"SELECT DISTINCT {expr} FROM {stage} WHERE NULLIF({expr}, '') IS NOT NULL "
+            f'ON CONFLICT (name) DO NOTHING'
+        )
+
+
+class TableSchema:
+    """Typed mapping from a feed's columns onto a model's table"""
+
+    def __init__(self, model, columns):
+        self.model = model
+        self.columns = columns
+        self.names = [column.name for column in columns]
+
+    @property
+    def table(self):
+        return self.model._meta.db_table
+
+    def values(self, row):
+        """Coerce a raw row into a tuple ordered like ``names``"""
+        return tuple(column.parse(row.get(column.source)) for column in self.columns)
+
+    def resolver(self, using=DEFAULT_DB_ALIAS):
+        """
+        A function turning ``values`` tuples into the tuples stored, with
+        lookup names replaced by their keys. Use one per load: it caches
+        the keys it has seen.
+        """
+        lookups = [
+            (index, LookupCache(column.model, using))
+            for index, column in enumerate(self.columns) if isinstance(column, LookupColumn)
+        ]
+
+        def resolve(values):
+            if not lookups:
+                return values
+            values = list(values)
+            for index, cache in lookups:
+                values[index] = cache.key(values[index])
+            return tuple(values)
+
+        return resolve
+
+    def build(self, row, resolve=None):
+        """Build an unsaved model instance from a raw row"""
+        resolve = resolve or self.resolver()
+        return self.model(**dict(zip(self.names, resolve(self.values(row)))))
+
+
+CLAIM_LIST_SCHEMA = TableSchema(ClaimList, [
+    Column('id', 'int'),
+    Column('patient_name', 'text'),
+    Column('billed_amount', 'decimal'),
+    Column('paid_amount', 'decimal'),
+    LookupColumn('status_id', 'status', ClaimStatus),
+    LookupColumn('insurer_id', 'insurer_name', Insurer),
+    Column('discharge_date', 'date'),
+    ContainsColumn('is_test_insurer', 'insurer_name', TEST_INSURER_MARKER),
+])
+
+CLAIM_DETAIL_SCHEMA = TableSchema(ClaimDetail, [
+    Column('id', 'int'),
+    Column('claim_id', 'int'),
+    LookupColumn('denial_reason_id', 'denial_reason', DenialReason),
+    Column('cpt_codes', 'text'),
+])
+
+build_claim_list = CLAIM_LIST_SCHEMA.build
+build_claim_detail = CLAIM_DETAIL_SCHEMA.build
+
+# Worker processes look schemas up by table name rather than unpickling them
+SCHEMAS = {schema.table: schema for schema in (CLAIM_LIST_SCHEMA, CLAIM_DETAIL_SCHEMA)}
+
+
+class IngestStats:
+    """Running counters for a single ingestion run"""
+
+    def __init__(self):
+        self.rows_read = 0
+        self.rows_loaded = 0
+        self.rows_skipped = 0
+        self.batches = 0
+        # Filled in by incremental loads
+        self.inserted = 0
+        self.updated = 0
+        self.deleted = 0
+        self.unchanged = 0
+        self.started = time.monotonic()
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    @property
+    def rows_per_second(self):
+        elapsed = self.elapsed
+        return self.rows_loaded / elapsed if elapsed > 0 else 0.0
+
+
+def ingest(rows, build, model, batch_size=DEFAULT_BATCH_SIZE, on_batch=None, on_error=None,
+           write=None):
+    """
+    Build model instances from ``rows`` and bulk insert them in batches.
+
+    ``build`` turns a raw row into an unsaved instance and may raise to
+    reject the row. ``write(batch)`` stores one batch and defaults to an
+    ignore-conflicts bulk_create on ``model``. ``on_batch(stats)`` is called
+    after every batch is written and ``on_error(line_number, row, exc)`` for
+    every rejected row. Returns the final IngestStats.
+    """
+    if batch_size < 1:
+        raise ValueError('batch_size must be at least 1')
+
+    if write is None:
+        def write(batch):
+            model.objects.bulk_create(batch, ignore_conflicts=True)
+
+    stats = IngestStats()
+
+    def built():
+        for row in rows:
+            stats.rows_read += 1
+            try:
+                yield build(row)
+            except Exception as e:
+                stats.rows_skipped += 1
+                if on_error:
+                    on_error(stats.rows_read, row, e)
+
+    for batch in batched(built(), batch_size):
+        write(batch)
+        stats.rows_loaded += len(batch)
+        stats.batches += 1
+        if on_batch:
+            on_batch(stats)
+
+    logger.debug(
+        f'Ingested {stats.rows_loaded} {model._meta.db_table} rows '
+        f'({stats.rows_skipped} skipped) in {stats.elapsed:.2f}s'
+    )
+    return stats
+
+
+def bulk_load(source, schema, table=None, using=DEFAULT_DB_ALIAS, batch_size=DEFAULT_BATCH_SIZE,
+              on_batch=None, on_error=None, pool=None):
+    """
+    Load a source into ``table`` (the schema's table by default) using the
+    fastest bulk path the backend offers.
+
+    ``pool`` is an executor from ``parser_pool``; when given, CSV parsing
+    is spread over its worker processes. PostgreSQL ignores it because COPY
+    already does all coercion inside the database. Rows whose key already
+    exists are ignored, as with bulk_create. Returns IngestStats;
+    ``rows_skipped`` counts rows that were rejected or ignored.
+    """
+    connection = connections[using]
+    table = table or schema.table
+    if source.format == 'csv':
+        if connection.vendor == 'postgresql':
+            return _copy_load(connection, source, schema, table, on_batch, on_error)
+        if pool is not None:
+            return _parallel_load(connection, source, schema, table, using, batch_size,
+                                  on_batch, on_error, pool)
+    return _executemany_load(connection, source, schema, table, using, batch_size,
+                             on_batch, on_error)
+
+
+@contextmanager
+def parser_pool(workers):
+    """
+    Yield a process pool for parallel parsing, or None for ``workers`` <= 1.
+
+    Database connections are closed first so forked workers do not inherit
+    them; workers run django.setup() so they also start under ``spawn``.
+    """
+    if workers <= 1:
+        yield None
+        return
+    connections.close_all()
+    with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as pool:
+        pool.workers = workers
+        yield pool
+
+
+def byte_ranges(path, chunk_bytes):
+    """
+    Split the body of a file, after its header line, into byte ranges that
+    start and end on line boundaries. Assumes no field contains a newline,
+    which holds for the pipe-delimited claims feeds.
+    """
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        f.readline()
+        start = f.tell()
+        while start < size:
+            end = start + chunk_bytes
+            if end < size:
+                f.seek(end)
+                f.readline()
+                end = f.tell()
+            else:
+                end = size
+            yield start, end
+            start = end
+
+
+def parse_range(path, start, end, header, table, delimiter='|'):
+    """
+    Parse one byte range of a file in a worker process.
+
+    Returns ``(values, rejects, rows_read)`` where ``rejects`` holds
+    ``(index_in_range, row, exc)`` for every row that failed coercion.
+    """
+    schema = SCHEMAS[table]
+    with open(path, 'rb') as f:
+        f.seek(start)
+        text = f.read(end - start).decode('utf-8')
+
+    values, rejects, rows_read = [], [], 0
+    reader = csv.DictReader(io.StringIO(text, newline=''), fieldnames=header, delimiter=delimiter)
+    for index, row in enumerate(reader, start=1):
+        rows_read = index
+        try:
+            values.append(schema.values(row))
+        except Exception as e:
+            rejects.append((index, row, e))
+    return values, rejects, rows_read
+
+
+def _parallel_load(connection, source, schema, table, using, batch_size, on_batch, on_error,
+                   pool):
+    """Parse byte ranges in the pool and write their rows in file order"""
+    sql = _insert_sql(connection, table, schema.names)
+    resolve = schema.resolver(using)
+    stats = IngestStats()
+    path, delimiter = source.path, source.delimiter
+
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        header = next(csv.reader([f.readline()], delimiter=delimiter))
+
+    workers = getattr(pool, 'workers', os.cpu_count() or 1)
+    size = os.path.getsize(path)
+    chunk_bytes = max(MIN_CHUNK_BYTES, min(DEFAULT_CHUNK_BYTES, size // (workers * 4) + 1))
+
+    # Keep a bounded number of ranges in flight so parsed rows never pile
+    # up faster than the writer can drain them
+    ranges = byte_ranges(path, chunk_bytes)
+    pending = deque()
+
+    def submit_next():
+        for start, end in islice(ranges, 1):
+            pending.append(pool.submit(parse_range, str(path), start, end, header, schema.table, delimiter))
+
+    for _ in range(workers * 2):
+        submit_next()
+
+    while pending:
+        values, rejects, rows_read = pending.popleft().result()
+        submit_next()
+
+        for index, row, error in rejects:
+            stats.rows_skipped += 1
+            if on_error:
+                on_error(stats.rows_read + index, row, error)
+        stats.rows_read += rows_read
+
+        for batch in batched(map(resolve, values), batch_size):
+            with transaction.atomic(using=using, savepoint=False):
+                with connection.cursor() as cursor:
+                    cursor.executemany(sql, batch)
+            stats.rows_loaded += len(batch)
+            stats.batches += 1
+            if on_batch:
+                on_batch(stats)
+    return stats
+
+
+def _insert_sql(connection, table, names):
+    quote = connection.ops.quote_name
+    return (
+        f'{connection.ops.insert_statement(on_conflict=OnConflict.IGNORE)} {quote(table)} '
+        f'({", ".join(quote(name) for name in names)}) '
+        f'VALUES ({", ".join(["%s"] * len(names))}) '
+        f'{connection.ops.on_conflict_suffix_sql([], OnConflict.IGNORE, None, None)}'
+    )
+
+
+def _executemany_load(connection, source, schema, table, using, batch_size, on_batch, on_error):
+    """
+    Insert coerced tuples batch by batch, without building model instances.
+    Parquet sources whose columns already have the schema's types skip
+    coercion and are converted a column at a time.
+    """
+    sql = _insert_sql(connection, table, schema.names)
+    resolve = schema.resolver(using)
+    stats = IngestStats()
+
+    typed = source.typed_values(schema) if hasattr(source, 'typed_values') else None
+
+    def coerced():
+        if typed is not None:
+            for values in typed:
+                stats.rows_read += 1
+                yield resolve(values)
+            return
+        for row in source:
+            stats.rows_read += 1
+            try:
+                yield resolve(schema.values(row))
+            except Exception as e:
+                stats.rows_skipped += 1
+                if on_error:
+                    on_error(stats.rows_read, row, e)
+
+    for batch in batched(coerced(), batch_size):
+        with transaction.atomic(using=using, savepoint=False):
+            with connection.cursor() as cursor:
+                cursor.executemany(sql, batch)
+        stats.rows_loaded += len(batch)
+        stats.batches += 1
+        if on_batch:
+            on_batch(stats)
+    return stats
+
+
+def _copy_load(connection, source, schema, table, on_batch, on_error):
+    """
+    Stream the file into a temporary text table with COPY, then cast it in
+    SQL. The whole file is one batch, reported to ``on_batch`` once written.
+    """
+    quote = connection.ops.quote_name
+    stage = quote(f'{table}__copy')
+    stats = IngestStats()
+
+    with open(source.path, 'r', encoding='utf-8', newline='') as f:
+        header = next(csv.reader([f.readline()], delimiter=source.delimiter))
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {stage}')
+            # _line numbers the staged rows in file order for the quarantine
+            cursor.execute(
+                f'CREATE TEMPORARY TABLE {stage} (_line bigserial, '
+                f'{", ".join(f"{quote(name)} text" for name in header)})'
+            )
+            cursor.copy_expert(
+                f'COPY {stage} ({", ".join(quote(name) for name in header)}) '
+                f"FROM STDIN WITH (FORMAT csv, DELIMITER '{source.delimiter}')",
+                f,
+            )
+            cursor.execute(f'SELECT count(*) FROM {stage}')
+            stats.rows_read = cursor.fetchone()[0]
+
+            selected, conditions = [], []
+            for column in schema.columns:
+                expr = quote(column.source) if column.source in header else 'NULL::text'
+                if isinstance(column, LookupColumn):
+                    cursor.execute(column.intern_sql(expr, stage))
+                selected.append(column.sql(expr))
+                conditions.append((column.name, column.sql_valid(expr)))
+            valid = ' AND '.join(condition for _, condition in conditions)
+
+            if on_error:
+                checked = [(name, condition) for name, condition in conditions if condition != 'TRUE']
+                cursor.execute(
+                    f'SELECT _line, {", ".join(quote(name) for name in header)}, '
+                    f'{", ".join(f"NOT ({condition})" for _, condition in checked)} '
+                    f'FROM {stage} WHERE NOT ({valid}) ORDER BY _line'
+                )
+                for chunk in iter(lambda: cursor.fetchmany(1000), []):
+                    for values in chunk:
+                        row = dict(zip(header, values[1:len(header) + 1]))
+                        failed = [name for (name, _), bad in zip(checked, values[len(header) + 1:]) if bad]
+                        on_error(values[0], row, ValueError(f'invalid value for {", ".join(failed)}'))
+
+            cursor.execute(
+                f'INSERT INTO {quote(table)} ({", ".join(quote(name) for name in schema.names)}) '
+                f'SELECT {", ".join(selected)} FROM {stage} '
+                f'WHERE {valid} ON CONFLICT DO NOTHING'
+            )
+            stats.rows_loaded = cursor.rowcount
+            stats.rows_skipped = stats.rows_read - stats.rows_loaded
+            stats.batches = 1
+            cursor.execute(f'DROP TABLE {stage}')
+    if on_batch:
+        on_batch(stats)
+    return stats
+
+
+class ShadowTable:
+    """
+    Staging copy of a model's table that is swapped into place atomically.
+
+    On SQLite the shadow table is renamed over the live one. On PostgreSQL,
+    where other tables hold foreign keys to the live table by OID, the live
+    rows are replaced from the shadow inside a single transaction; MVCC keeps
+    readers on the old rows until it commits.
+    """
+
+    def __init__(self, model, using=DEFAULT_DB_ALIAS):
+        self.model = model
+        self.using = using
+        self.connection = connections[using]
+        self.table = model._meta.db_table
+        self.name = f'{self.table}{SHADOW_SUFFIX}'
+        self.fields = model._meta.concrete_fields
+        if self.connection.vendor not in ('sqlite', 'postgresql'):
+            raise NotSupportedError(f'Shadow table swaps are not supported on {self.connection.vendor}')
+
+    def quote(self, name):
+        return self.connection.ops.quote_name(name)
+
+    def create(self):
+        """(Re)create an empty shadow table with the live table's columns"""
+        self.drop()
+        with self.connection.cursor() as cursor:
+            if self.connection.vendor == 'sqlite':
+                cursor.execute(
+                    "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = %s",
+                    [self.table],
+                )
+                create_sql = cursor.fetchone()[0]
+                create_sql = re.sub(
+                    r'^CREATE TABLE\s+("?)' + re.escape(self.table) + r'\1',
+                    f'CREATE TABLE {self.quote(self.name)}',
+                    create_sql,
+                    count=1,
+                )
+                cursor.execute(create_sql)
+            else:
+                cursor.execute(
+                    f'CREATE UNLOGGED TABLE {self.quote(self.name)} '
+                    f'(LIKE {self.quote(self.table)} INCLUDING ALL)'
+                )
+
+    def drop(self):
+        """Drop the shadow table if it exists"""
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {self.quote(self.name)}')
+
+    def write(self, batch):
+        """Insert a batch of unsaved model instances into the shadow table"""
+        columns = ', '.join(self.quote(f.column) for f in self.fields)
+        placeholders = ', '.join(['%s'] * len(self.fields))
+        sql = (
+            f'{self.connection.ops.insert_statement(on_conflict=OnConflict.IGNORE)} '
+            f'{self.quote(self.name)} ({columns}) VALUES ({placeholders}) '
+            f'{self.connection.ops.on_conflict_suffix_sql(self.fields, OnConflict.IGNORE, None, None)}'
+        )
+        params = [
+            [f.get_db_prep_save(getattr(obj, f.attname), self.connection) for f in self.fields]
+            for obj in batch
+        ]
+        # One transaction per batch; in autocommit every row would commit
+        with transaction.atomic(using=self.using, savepoint=False):
+            with self.connection.cursor() as cursor:
+                cursor.executemany(sql, params)
+
+    def prune_orphans(self, cursor):
+        """Delete cascading related rows whose parent is missing from the shadow"""
+        pk_column = self.quote(self.model._meta.pk.column)
+        for rel in self.model._meta.related_objects:
+            if rel.many_to_many or rel.on_delete is not models.CASCADE:
+                continue
+            cursor.execute(
+                f'DELETE FROM {self.quote(rel.related_model._meta.db_table)} '
+                f'WHERE {self.quote(rel.field.column)} NOT IN '
+                f'(SELECT {pk_column} FROM {self.quote(self.name)})'
+            )
+
+    def swap(self):
+        """
+        Atomically replace the live table's contents with the shadow table.
+
+        Must not be called inside an atomic block: SQLite only allows foreign
+        key enforcement to be switched off outside a transaction, and it has
+        to be off so renaming the live table does not rewrite the foreign keys
+        that reference it.
+        """
+        if self.connection.vendor == 'sqlite':
+            self._swap_sqlite()
+        else:
+            self._swap_postgresql()
+        logger.debug(f'Swapped {self.name} into {self.table}')
+
+    def _swap_sqlite(self):
+        retired = self.quote(f'{self.table}__retired')
+        with self.connection.constraint_checks_disabled():
+            with transaction.atomic(using=self.using):
+                with self.connection.cursor() as cursor:
+                    cursor.execute(
+                        "SELECT sql FROM sqlite_master "
+                        "WHERE type = 'index' AND tbl_name = %s AND sql IS NOT NULL",
+                        [self.table],
+                    )
+                    index_sql = [row[0] for row in cursor.fetchall()]
+
+                    self.prune_orphans(cursor)
+                    cursor.execute('PRAGMA legacy_alter_table = ON')
+                    try:
+                        cursor.execute(f'DROP TABLE IF EXISTS {retired}')
+                        cursor.execute(f'ALTER TABLE {self.quote(self.table)} RENAME TO {retired}')
+                        cursor.execute(f'ALTER TABLE {self.quote(self.name)} RENAME TO {self.quote(self.table)}')
+                        cursor.execute(f'DROP TABLE {retired}')
+                    finally:
+                        cursor.execute('PRAGMA legacy_alter_table = OFF')
+                    for sql in index_sql:
+                        cursor.execute(sql)
+
+    def _swap_postgresql(self):
+        columns = ', '.join(self.quote(f.column) for f in self.fields)
+        with transaction.atomic(using=self.using):
+            with self.connection.cursor() as cursor:
+                self.prune_orphans(cursor)
+                cursor.execute(f'DELETE FROM {self.quote(self.table)}')
+                cursor.execute(
+                    f'INSERT INTO {self.quote(self.table)} ({columns}) '
+                    f'SELECT {columns} FROM {self.quote(self.name)}'
+                )
+                cursor.execute(f'DROP TABLE {self.quote(self.name)}')
+
+
+class DiffWriter:
+    """
+    Applies a feed to the live table as a delta.
+
+    Each batch is compared against the rows currently stored under the same
+    primary keys: new rows are bulk inserted, changed rows bulk updated and
+    identical rows left alone. Keys seen in the feed are recorded in a
+    temporary table so rows missing from the feed can be deleted at the end
+    without holding every key in memory. Call ``begin()`` before the first
+    batch and ``finish()`` after the last, ideally inside one transaction.
+
+    ``changes`` lists ``(old, new)`` field values, with the ``pk``, for
+    every row inserted (old is None), updated or deleted (new is None), so
+    derived data can be patched rather than rebuilt. It becomes None once the delta grows past
+    MAX_TRACKED_CHANGES rows, meaning "treat this as a full reload".
+    """
+
+    def __init__(self, model, using=DEFAULT_DB_ALIAS):
+        self.model = model
+        self.using = using
+        self.connection = connections[using]
+        self.pk = model._meta.pk
+        self.fields = [f for f in model._meta.concrete_fields if not f.primary_key]
+        self.seen_table = f'{model._meta.db_table}{SEEN_SUFFIX}'
+        self.inserted = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.deleted = 0
+        self.changes = []
+
+    def track(self, changes):
+        """Record ``(old, new)`` value pairs, giving up once there are too many"""
+        if self.changes is None:
+            return
+        self.changes.extend(changes)
+        if len(self.changes) > MAX_TRACKED_CHANGES:
+            self.changes = None
+
+    def quote(self, name):
+        return self.connection.ops.quote_name(name)
+
+    def begin(self):
+        """Create the temporary table that tracks keys present in the feed"""
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {self.quote(self.seen_table)}')
+            cursor.execute(
+                f'CREATE TEMPORARY TABLE {self.quote(self.seen_table)} '
+                f'({self.quote("id")} bigint PRIMARY KEY)'
+            )
+
+    def write(self, batch):
+        """Insert or update the rows of one batch that differ from the table"""
+        # Later rows win when a key repeats within the feed
+        incoming = {obj.pk: obj for obj in batch}
+        self.record_seen(incoming)
+
+        attnames = [f.attname for f in self.fields]
+        existing = {
+            row[0]: row[1:]
+            for row in self.model._default_manager.using(self.using)
+            .filter(pk__in=list(incoming))
+            .values_list('pk', *attnames)
+        }
+
+        to_create, to_update, changes = [], [], []
+        for pk, obj in incoming.items():
+            current = existing.get(pk)
+            values = tuple(getattr(obj, name) for name in attnames)
+            if current is None:
+                to_create.append(obj)
+                changes.append((None, {'pk': pk, **dict(zip(attnames, values))}))
+            elif current != values:
+                to_update.append(obj)
+                changes.append((
+                    {'pk': pk, **dict(zip(attnames, current))},
+                    {'pk': pk, **dict(zip(attnames, values))},
+                ))
+            else:
+                self.unchanged += 1
+        self.track(changes)
+
+        manager = self.model._default_manager.using(self.using)
+        if to_create:
+            manager.bulk_create(to_create, ignore_conflicts=True)
+            self.inserted += len(to_create)
+        if to_update:
+            manager.bulk_update(to_update, [f.name for f in self.fields])
+            self.updated += len(to_update)
+
+    def record_seen(self, incoming):
+        with transaction.atomic(using=self.using, savepoint=False), self.connection.cursor() as cursor:
+            cursor.executemany(
+                f'{self.connection.ops.insert_statement(on_conflict=OnConflict.IGNORE)} '
+                f'{self.quote(self.seen_table)} ({self.quote("id")}) VALUES (%s) '
+                f'{self.connection.ops.on_conflict_suffix_sql([], OnConflict.IGNORE, None, None)}',
+                [[pk] for pk in incoming],
+            )
+
+    def finish(self, delete_missing=True, batch_size=DEFAULT_BATCH_SIZE):
+        """Delete rows absent from the feed and drop the tracking table"""
+        if delete_missing:
+            pk_column = self.quote(self.pk.column)
+            with self.connection.cursor() as cursor:
+                cursor.execute(
+                    f'SELECT {pk_column} FROM {self.quote(self.model._meta.db_table)} '
+                    f'WHERE {pk_column} NOT IN (SELECT {self.quote("id")} FROM {self.quote(self.seen_table)})'
+                )
+                missing = [row[0] for row in cursor.fetchall()]
+            # Deleting through the ORM keeps on_delete cascades for flags and notes
+            attnames = [f.attname for f in self.fields]
+            for chunk in batched(missing, batch_size):
+                rows = self.model._default_manager.using(self.using).filter(pk__in=chunk)
+                if self.changes is not None:
+                    self.track([(old, None) for old in rows.values('pk', *attnames)])
+                rows.delete()
+            self.deleted += len(missing)
+
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {self.quote(self.seen_table)}')
+
+
+class Quarantine:
+    """
+    Pipe-delimited file collecting rows rejected during a load.
+
+    Each rejected row is written with its row number in the feed and the
+    error that rejected it. The file is only created once the first row is
+    rejected. Usable directly as an ``on_error`` callback.
+    """
+
+    def __init__(self, directory, name):
+        stamp = timezone.now().strftime('%Y%m%d-%H%M%S')
+        self.path = Path(directory) / f'{name}_{stamp}.csv'
+        self.count = 0
+        self._file = None
+        self._writer = None
+
+    def __call__(self, line, row, error):
+        self.add(line, row, error)
+
+    def add(self, line, row, error):
+        """Record one rejected row"""
+        # DictReader stores surplus fields under None
+        row = {key: value for key, value in row.items() if key is not None}
+        if self._writer is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = self.path.open('w', encoding='utf-8', newline='')
+            self._writer = csv.DictWriter(
+                self._file,
+                fieldnames=['row', 'error', *row],
+                delimiter='|',
+                extrasaction='ignore',
+            )
+            self._writer.writeheader()
+        self._writer.writerow({'row': line, 'error': str(error), **row})
+        self.count += 1
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def clear_table(model, using=DEFAULT_DB_ALIAS):
+    """
+    Delete every row of ``model`` with a single DELETE, without reading them
+    first. Rows that cascade from it, such as a claim's flags and notes, are
+    deleted through the ORM beforehand; with the whole table going, that is
+    all of them. Tables with other dependents are deleted through the ORM.
+    """
+    relations = model._meta.related_objects
+    with writing_feed(), transaction.atomic(using=using):
+        if any(relation.on_delete not in (models.CASCADE, models.DO_NOTHING) for relation in relations):
+            model._default_manager.using(using).all().delete()
+            return
+        for relation in relations:
+            if relation.on_delete is models.CASCADE:
+                relation.related_model._default_manager.using(using).all().delete()
+        model._default_manager.using(using).all()._raw_delete(using)
+
+
+def clear_feed(schema, using=DEFAULT_DB_ALIAS):
+    """
+    Empty the schema's table as a full load of an empty feed would, sending
+    ``signals.feed_loaded``. Returns IngestStats.
+    """
+    clear_table(schema.model, using=using)
+    stats = IngestStats()
+    feed_loaded.send(sender=schema.model, stats=stats, mode=MODE_REPLACE, using=using, changes=None)
+    return stats
+
+
+def load_feed(source, schema, mode=MODE_REPLACE, batch_size=DEFAULT_BATCH_SIZE, pool=None,
+              on_batch=None, on_error=None, using=DEFAULT_DB_ALIAS):
+    """
+    Load one source into the schema's table and return IngestStats.
+
+    ``mode`` is one of LOAD_MODES (see the module docstring). ``swap``
+    must not run inside an atomic block; ``incremental`` runs in its own
+    transaction and ignores ``pool``. Sends ``signals.feed_loaded`` once
+    the feed is written.
+    """
+    if mode not in LOAD_MODES:
+        raise ValueError(f'Unknown load mode: {mode}')
+    if batch_size < 1:
+        raise ValueError('batch_size must be at least 1')
+
+    model = schema.model
+
+    if mode == MODE_INCREMENTAL:
+        writer = DiffWriter(model, using=using)
+        # Deleted rows are refreshed with the rest once feed_loaded is sent
+        with writing_feed(), transaction.atomic(using=using):
+            writer.begin()
+            build = partial(schema.build, resolve=schema.resolver(using))
+            stats = ingest(source, build, model, batch_size=batch_size,
+                           on_batch=on_batch, on_error=on_error, write=writer.write)
+            writer.finish(batch_size=batch_size)
+        stats.inserted = writer.inserted
+        stats.updated = writer.updated
+        stats.deleted = writer.deleted
+        stats.unchanged = writer.unchanged
+        feed_loaded.send(sender=model, stats=stats, mode=mode, using=using, changes=writer.changes)
+        return stats
+
+    if mode == MODE_REPLACE:
+        clear_table(model, using=using)
+
+    shadow = ShadowTable(model, using=using) if mode == MODE_SWAP else None
+    if shadow:
+        shadow.create()
+    try:
+        stats = bulk_load(source, schema, table=shadow.name if shadow else None, using=using,
+                          batch_size=batch_size, on_batch=on_batch, on_error=on_error, pool=pool)
+        if shadow:
+            shadow.swap()
+    except Exception:
+        if shadow:
+            shadow.drop()
+        raise
+    feed_loaded.send(sender=model, stats=stats, mode=mode, using=using, changes=None)
+    return stats
@@ -0,0 +1,245 @@
+"""
+Background reload jobs.
+
+Reloading the claims feeds takes far longer than a web request should, so
+the force-reload API only queues a ReloadJob row and returns its id. The
+run_reload_jobs management command drains the queue, recording progress on
+the row after every batch so the status endpoint can report it.
+
+Reloads are single-flight: a job holds ReloadJob.active_key, a unique
+column, from the moment it is queued until it finishes. A second request
+fails to insert its own job and gets the one already in flight instead, so
+any number of browsers (or gunicorn workers) trigger at most one reload.
+
+While a job runs, a heartbeat thread keeps touching its row, and writes
+the progress each batch reports. The thread has its own database
+connection, so those writes are committed at once even while an
+incremental load holds its transaction open, and the loading connection
+never locks the job row (on SQLite, which has a single writer, they wait
+for the load to commit). A job whose row stops moving belongs to a worker
+that died, so its key can be taken over without running two reloads at
+once.
+"""
+import logging
+import threading
+from datetime import timedelta
+
+from django.db import IntegrityError, connections, transaction
+from django.utils import timezone
+
+from .ingestion import (
+    DEFAULT_BATCH_SIZE,
+    LOAD_MODES,
+    MODE_SWAP,
+    Quarantine,
+    claim_feeds,
+    default_quarantine_dir,
+    load_feed,
+)
+from .models import ClaimDetail, ClaimList, ReloadJob
+from .state import record_reload
+
+logger = logging.getLogger(__name__)
+
+# A running job whose row has not moved for this long is assumed to belong
+# to a worker that died, and no longer blocks new reloads
+STALE_AFTER = timedelta(minutes=15)
+
+# Seconds between heartbeats of a running job, well inside STALE_AFTER
+HEARTBEAT_INTERVAL = 60
+
+
+def enqueue_reload(user=None, mode=MODE_SWAP, follow_up=False):
+    """
+    Queue a reload, or join the one already queued or running; returns
+    ``(job, created)``. With ``follow_up``, for files that changed, a
+    running job is marked to queue another reload when it finishes, as it
+    may have read them before the change.
+    """
+    if mode not in LOAD_MODES:
+        raise ValueError(f'Unknown load mode: {mode}')
+    if user is not None and not user.is_authenticated:
+        user = None
+
+    while True:
+        try:
+            with transaction.atomic():
+                return ReloadJob.objects.create(mode=mode, requested_by=user), True
+        except IntegrityError:
+            job = ReloadJob.objects.filter(active_key=ReloadJob.ACTIVE_KEY).first()
+            if job is None:
+                # The active job finished between the insert and the lookup
+                continue
+            if not is_stale(job):
+                if follow_up and job.status == ReloadJob.RUNNING:
+                    marked = ReloadJob.objects.filter(pk=job.pk, status=ReloadJob.RUNNING).update(follow_up=True)
+                    if not marked:
+                        # It finished in the meantime, so queue a job of our own
+                        continue
+                return job, False
+            logger.warning(f'Reload job {job.id} stopped reporting progress; marking it failed')
+            finish_job(job, ReloadJob.FAILED, error='Worker stopped responding')
+
+
+def is_stale(job):
+    """Whether a running job's worker has stopped sending heartbeats"""
+    return job.status == ReloadJob.RUNNING and job.updated_at < timezone.now() - STALE_AFTER
+
+
+def claim_job(job=None):
+    """
+    Mark a queued job (by default the oldest) as running and return it, or
+    None if there is nothing to run. The status check and the update happen
+    in one UPDATE, so two workers can never claim the same job.
+    """
+    if job is not None:
+        return job if _mark_running(job) else None
+
+    while True:
+        job = ReloadJob.objects.filter(status=ReloadJob.QUEUED).order_by('created_at', 'id').first()
+        if job is None:
+            return None
+        if _mark_running(job):
+            return job
+
+
+def _mark_running(job):
+    now = timezone.now()
+    claimed = ReloadJob.objects.filter(pk=job.pk, status=ReloadJob.QUEUED).update(
+        status=ReloadJob.RUNNING, started_at=now, updated_at=now
+    )
+    if claimed:
+        job.refresh_from_db()
+    return bool(claimed)
+
+
+class Heartbeat:
+    """
+    Writes a running job's progress and touches its row every ``interval``
+    seconds, from a thread with its own connection, until stopped
+    """
+
+    def __init__(self, job, interval=HEARTBEAT_INTERVAL):
+        self.job = job
+        self.interval = interval
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name=f'reload-job-{job.pk}-heartbeat', daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.wake.set()
+        self.thread.join()
+
+    def report(self, **fields):
+        """Record progress on the job, to be written by the thread right away"""
+        for name, value in fields.items():
+            setattr(self.job, name, value)
+        with self.lock:
+            self.pending.update(fields)
+        self.wake.set()
+
+    def run(self):
+        try:
+            while True:
+                self.wake.wait(self.interval)
+                self.wake.clear()
+                self.write()
+                if self.stopped.is_set():
+                    return
+        finally:
+            # The thread's own connections
+            connections.close_all()
+
+    def write(self):
+        with self.lock:
+            fields, self.pending = self.pending, {}
+        try:
+            ReloadJob.objects.filter(pk=self.job.pk, status=ReloadJob.RUNNING).update(
+                updated_at=timezone.now(), **fields
+            )
+        except Exception:
+            logger.exception(f'Heartbeat of reload job {self.job.pk} failed')
+            with self.lock:
+                # Retried with the next heartbeat, unless newer values came in
+                self.pending = {**fields, **self.pending}
+
+
+def finish_job(job, status, error=None):
+    """
+    Record the outcome and final row counts, release the single-flight
+    key, and queue the follow-up reload if the files changed while it ran
+    """
+    job.status = status
+    job.error = error
+    job.active_key = None
+    job.current_feed = None
+    job.finished_at = timezone.now()
+    job.total_claims = ClaimList.objects.count()
+    job.total_claim_details = ClaimDetail.objects.count()
+    # follow_up is left out: another process may have just set it. The row
+    # counts are saved again in case the heartbeat's last write failed
+    job.save(update_fields=[
+        'status', 'error', 'active_key', 'current_feed', 'rows_loaded', 'rows_rejected', 'finished_at',
+        'total_claims', 'total_claim_details', 'updated_at',
+    ])
+
+    # Only a running job can be marked, so once it is saved as finished
+    # the flag cannot change any more
+    if ReloadJob.objects.filter(pk=job.pk, follow_up=True).exists():
+        job.follow_up = True
+        next_job, _ = enqueue_reload(job.requested_by, mode=job.mode)
+        logger.info(f'Queued reload job {next_job.id} for files changed while job {job.id} ran')
+    return job
+
+
+def run_job(job, batch_size=DEFAULT_BATCH_SIZE, pool=None, data_dir=None, quarantine_dir=None):
+    """Load every feed for a claimed job and return it once it has finished"""
+    quarantine_dir = quarantine_dir or default_quarantine_dir()
+    logger.debug(f'Running reload job {job.id} ({job.mode})')
+
+    try:
+        with Heartbeat(job) as heartbeat:
+            for label, source, schema in claim_feeds(data_dir):
+                if not source.exists():
+                    logger.warning(f'Reload job {job.id}: {source.path} not found, skipping {label}')
+                    continue
+
+                loaded, rejected = job.rows_loaded, job.rows_rejected
+                heartbeat.report(current_feed=label)
+
+                with Quarantine(quarantine_dir, schema.table) as quarantine:
+                    def on_batch(stats):
+                        heartbeat.report(
+                            rows_loaded=loaded + stats.rows_loaded,
+                            rows_rejected=rejected + quarantine.count,
+                        )
+
+                    stats = load_feed(
+                        source,
+                        schema,
+                        mode=job.mode,
+                        batch_size=batch_size,
+                        pool=pool,
+                        on_batch=on_batch,
+                        on_error=quarantine,
+                    )
+
+                heartbeat.report(
+                    rows_loaded=loaded + stats.rows_loaded,
+                    rows_rejected=rejected + quarantine.count,
+                )
+
+    except Exception as e:
+        logger.exception(f'Reload job {job.id} failed')
+        return finish_job(job, ReloadJob.FAILED, error=str(e))
+
+    record_reload()
+    logger.debug(f'Reload job {job.id} loaded {job.rows_loaded} rows')
+    return finish_job(job, ReloadJob.SUCCEEDED)
@@ -0,0 +1,151 @@
+"""
+Live search for the claim and claim detail lists.
+
+The search boxes send a request for every pause in typing, so the same
+few queries arrive again and again, often several at once, each one a
+slightly longer version of the last. Three things keep that cheap:
+
+* The results of a list (its page, count and filter options) are cached
+  for LIVE_SEARCH_TIMEOUT under the normalized query parameters and the
+  data, flag and note versions (see claims.state). Going back to an
+  earlier query, or another user running the same one, costs no query.
+* With a cache shared between workers (Redis, see REDIS_URL in the
+  settings), requests for results that another worker is computing wait
+  for them instead of running the same queries again (``coalesce``). A
+  per-process cache has nothing to wait for: under ASGI a process runs
+  its sync views one at a time, so it computes the results itself.
+* Every match is a substring match, so whatever matches "smith" also
+  matches "smit". The primary keys matching each query are cached when
+  there are at most NARROW_LIMIT of them, and a longer query is only
+  checked against the rows its longest cached prefix matched.
+
+Superseded requests are dropped by the browser (``hx-sync`` on the claim
+list, an AbortController on the detail list), so their responses are
+never rendered.
+"""
+import hashlib
+import time
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.utils.http import urlencode
+
+from .search import search
+from .state import cache_versions
+
+LIVE_SEARCH_TIMEOUT = 30
+
+# Longest a request waits for another computing the same results, and how
+# often it checks for them
+COALESCE_TIMEOUT = 10
+COALESCE_POLL_INTERVAL = 0.05
+
+# Largest match set kept for narrowing, below SQLite's bound parameter limit
+NARROW_LIMIT = 500
+
+
+def normalize_query(query):
+    """Searches ignore case and runs of whitespace, so equal queries share a key"""
+    return ' '.join(query.split()).lower()
+
+
+def live_params(params):
+    """The non-empty query parameters of a request, with the search normalized"""
+    live = {key: value for key, value in params.items() if value}
+    search_query = normalize_query(live.pop('search', ''))
+    if search_query:
+        live['search'] = search_query
+    return live
+
+
+def live_cache_key(prefix, versions, text):
+    return f'{prefix}:{versions}:{hashlib.md5(text.encode()).hexdigest()}'
+
+
+def cache_is_shared():
+    """Whether the default cache is shared with other processes"""
+    return not isinstance(caches['default'], (LocMemCache, DummyCache))
+
+
+def coalesce(key, compute, timeout):
+    """
+    The value cached under ``key``, or ``compute()`` cached for ``timeout``.
+    With a shared cache, concurrent callers missing the same key run
+    ``compute`` once between them; the others wait up to COALESCE_TIMEOUT
+    for its result.
+    """
+    value = cache.get(key)
+    if value is not None:
+        return value
+
+    if not cache_is_shared():
+        value = compute()
+        cache.set(key, value, timeout)
+        return value
+
+    lock = f'{key}:computing'
+    if cache.add(lock, True, COALESCE_TIMEOUT):
+        try:
+            value = compute()
+            cache.set(key, value, timeout)
+        finally:
+            cache.delete(lock)
+        return value
+
+    deadline = time.monotonic() + COALESCE_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(COALESCE_POLL_INTERVAL)
+        value = cache.get(key)
+        if value is not None:
+            return value
+        if cache.get(lock) is None:
+            # The computing request failed or its result was evicted
+            break
+    return compute()
+
+
+def live_results(name, params, compute):
+    """``compute()`` for the list ``name`` with these live params, shared while fresh"""
+    key = live_cache_key(f'live_search:{name}', cache_versions(), urlencode(sorted(params.items())))
+    return coalesce(key, compute, LIVE_SEARCH_TIMEOUT)
+
+
+def match_key(model, versions, query):
+    return live_cache_key(f'live_matches:{model._meta.label_lower}', versions, query)
+
+
+def matching_pks(model, query):
+    """
+    Primary keys of the rows of ``model`` matching ``query``, or None when
+    there are more than NARROW_LIMIT
+    """
+    versions = cache_versions()
+    key = match_key(model, versions, query)
+    cached = cache.get(key)
+    if cached is not None:
+        return None if cached is False else cached
+
+    rows = search(model.objects.all(), query).order_by()
+    for end in range(len(query) - 1, 0, -1):
+        candidates = cache.get(match_key(model, versions, query[:end]))
+        if candidates is not None:
+            if candidates is not False:
+                rows = rows.filter(pk__in=candidates)
+            break
+
+    pks = list(rows.values_list('pk', flat=True)[:NARROW_LIMIT + 1])
+    if len(pks) > NARROW_LIMIT:
+        # False rather than None, so a large match set is remembered as one
+        cache.set(key, False, LIVE_SEARCH_TIMEOUT)
+        return None
+    cache.set(key, pks, LIVE_SEARCH_TIMEOUT)
+    return pks
+
+
+def live_search(queryset, query):
+    """``search(queryset, query)``, only checking the rows that can still match"""
+    pks = matching_pks(queryset.model, query)
+    if pks is not None:
+        queryset = queryset.filter(pk__in=pks)
+    return search(queryset, query)
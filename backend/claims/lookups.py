@@ -0,0 +1,51 @@
+"""
+Interned values of the low-cardinality text columns.
+
+Claim status, insurer and denial reason repeat a handful of strings over
+every row. Each distinct value is stored once, in ClaimStatus, Insurer or
+DenialReason, and the claim tables hold its integer key: grouping and
+filtering compare integers, and the tables and their indexes are a
+fraction of the size.
+
+Loads resolve names to keys through a LookupCache. It reads the lookup
+table once, when the load starts, and inserts names it has not seen as
+they arrive, so a feed costs one query per new value rather than one per
+row. Lookup rows are never changed or deleted, so a cached key stays
+valid for the whole load.
+"""
+from django.db import DEFAULT_DB_ALIAS
+
+from .models import LookupValue
+
+
+def is_lookup(field):
+    """Whether a model field references a lookup table"""
+    return field.is_relation and issubclass(field.related_model, LookupValue)
+
+
+class LookupCache:
+    """Name to key mapping of one lookup table, for the duration of a load"""
+
+    def __init__(self, model, using=DEFAULT_DB_ALIAS):
+        self.model = model
+        self.using = using
+        self.keys = None
+
+    def key(self, name):
+        """The key of ``name``, interning it if it is new; None for a blank name"""
+        if not name:
+            return None
+        if self.keys is None:
+            self.keys = dict(self.model.objects.using(self.using).values_list('name', 'pk'))
+        key = self.keys.get(name)
+        if key is None:
+            key = self.keys[name] = self.model.intern(name, using=self.using).pk
+        return key
+
+
+def lookup_names(model, keys=None, using=DEFAULT_DB_ALIAS):
+    """``{key: name}`` for the rows of a lookup table with these keys, or all of them"""
+    rows = model.objects.using(using)
+    if keys is not None:
+        rows = rows.filter(pk__in=[key for key in keys if key is not None])
+    return dict(rows.values_list('pk', 'name'))
@@ -1,52 +1,66 @@
-from django.core.management.base import BaseCommand
-from django.core.cache import cache
-from django.utils import timezone
+from django.core.management.base import BaseCommand, CommandError
 from claims.data_monitor import data_monitor
-from claims.management.commands.load_claims_data import Command as LoadDataCommand
-import time
+from claims.ingestion import MODE_INCREMENTAL
+from claims.jobs import claim_job, enqueue_reload, run_job
+from claims.models import ReloadJob
+from claims.watcher import DEBOUNCE_SECONDS, POLL_INTERVAL, open_watcher, watch_changes
 import logging
 
 logger = logging.getLogger(__name__)
 
 class Command(BaseCommand):
-    help = 'Automatically monitor CSV files and reload data when changes are detected'
+    help = 'Watch the CSV files and reload data as soon as they change'
     
     def add_arguments(self, parser):
         parser.add_argument(
             '--interval',
-            type=int,
-            default=30,
-            help='Check interval in seconds (default: 30)'
+            type=float,
+            default=POLL_INTERVAL,
+            help='Polling interval in seconds when inotify is unavailable '
+                 f'(default: {POLL_INTERVAL:g})'
+        )
+        parser.add_argument(
+            '--debounce',
+            type=float,
+            default=DEBOUNCE_SECONDS,
+            help='Seconds without writes before a burst of changes is loaded '
+                 f'(default: {DEBOUNCE_SECONDS:g})'
         )
         parser.add_argument(
             '--continuous',
             action='store_true',
-            help='Run continuously (default: False)'
+            help='Keep watching the Data folder and reload as files change (default: False)'
         )
     
     def handle(self, *args, **options):
-        interval = options['interval']
-        continuous = options['continuous']
-        
-        self.stdout.write(
-            self.style.SUCCESS(
-                f'Starting CSV file monitoring with {interval}s interval...'
-            )
-        )
+        # Start watching before the baseline is taken, so no write between
+        # the two is missed
+        watcher = None
+        if options['continuous']:
+            watcher = open_watcher(data_monitor.data_folder, interval=options['interval'])
         
         # Initialize the data monitor
         data_monitor.check_for_changes()
         
-        if continuous:
+        if watcher:
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f'Watching {data_monitor.data_folder} for CSV changes ({watcher.kind})...'
+                )
+            )
             self.stdout.write('Running in continuous mode. Press Ctrl+C to stop.')
             try:
-                while True:
+                # Blocks until a burst of writes has finished, so an idle
+                # watcher uses no CPU
+                for names in watch_changes(data_monitor.data_folder,
+                                           debounce=options['debounce'], watcher=watcher):
+                    self.stdout.write(f'Files written: {", ".join(names)}')
                     self.check_and_reload()
-                    time.sleep(interval)
             except KeyboardInterrupt:
                 self.stdout.write('\nStopping monitoring...')
         else:
             # Run once
+            self.stdout.write(self.style.SUCCESS('Checking CSV files for changes...'))
             self.check_and_reload()
     
     def check_and_reload(self):
@@ -65,10 +79,8 @@ class Command(BaseCommand):
                 
                 # Reload data
                 self.stdout.write('Reloading data...')
-                self.reload_data()
-                
-                # Update cache timestamp
-                cache.set('last_data_reload', timezone.now().isoformat(), timeout=3600)
+                if not self.reload_data():
+                    return
                 
                 self.stdout.write(
                     self.style.SUCCESS('Data reload completed successfully!')
@@ -83,15 +95,29 @@ class Command(BaseCommand):
             logger.error(f'Error during data monitoring: {e}')
     
     def reload_data(self):
-        """Reload all claims data"""
-        try:
-            # Use the existing load_claims_data command
-            load_command = LoadDataCommand()
-            load_command.handle()
-            
-        except Exception as e:
+        """Reload all claims data, returning False if another reload is already running"""
+        # Go through the reload queue so this never overlaps a reload started
+        # from the web, applying only the rows that changed. A job that is
+        # queued but not yet picked up by a worker is run here instead.
+        job, _ = enqueue_reload(mode=MODE_INCREMENTAL, follow_up=True)
+        if claim_job(job) is None:
             self.stdout.write(
-                self.style.ERROR(f'Error reloading data: {e}')
+                self.style.WARNING(
+                    f'Reload job {job.id} is already running; the changes are reloaded once it finishes'
+                )
             )
-            logger.error(f'Error reloading data: {e}')
-            raise
+            return False
+
+        while job is not None:
+            run_job(job)
+            if job.status == ReloadJob.FAILED:
+                self.stdout.write(
+                    self.style.ERROR(f'Error reloading data: {job.error}')
+                )
+                logger.error(f'Error reloading data: {job.error}')
+                raise CommandError(f'Reload job {job.id} failed: {job.error}')
+
+            self.stdout.write(f'Reload job {job.id} loaded {job.rows_loaded} rows')
+            # Files that changed while it ran were queued as a follow-up job
+            job = claim_job() if job.follow_up else None
+        return True
@@ -0,0 +1,45 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand, CommandError
+from claims.snapshots import ROW_GROUP_SIZE, SNAPSHOT_TABLES, write_snapshot
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = ('Write claim_list, claim_detail, the flags and the notes as a Parquet snapshot, '
+            'which load_claims_data --format parquet reads back')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'output_dir',
+            type=str,
+            help='Folder the snapshot files are written to (created if missing)'
+        )
+        parser.add_argument(
+            '--tables',
+            nargs='+',
+            choices=list(SNAPSHOT_TABLES),
+            help='Tables to write (default: all of them)'
+        )
+        parser.add_argument(
+            '--row-group-size',
+            type=int,
+            default=ROW_GROUP_SIZE,
+            help=f'Rows per Parquet row group, and per read from the database (default: {ROW_GROUP_SIZE})'
+        )
+
+    def handle(self, *args, **options):
+        if options['row_group_size'] < 1:
+            raise CommandError('--row-group-size must be at least 1')
+        try:
+            written = write_snapshot(
+                options['output_dir'],
+                names=options.get('tables'),
+                row_group_size=options['row_group_size'],
+            )
+        except ImproperlyConfigured as e:
+            raise CommandError(str(e))
+
+        for name, (path, rows) in written.items():
+            self.stdout.write(f'Wrote {rows} {name} rows to {path}')
+        self.stdout.write(self.style.SUCCESS('Snapshot complete'))
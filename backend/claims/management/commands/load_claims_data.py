@@ -1,150 +1,169 @@
-from django.core.management.base import BaseCommand
-from django.db import connection
-from django.conf import settings
-from claims.models import ClaimList, ClaimDetail
-from decimal import Decimal
-from datetime import datetime
-from pathlib import Path
-import csv
+from django.core.management.base import BaseCommand, CommandError
+from claims.ingestion import (
+    DEFAULT_BATCH_SIZE,
+    MODE_INCREMENTAL,
+    MODE_REPLACE,
+    MODE_SWAP,
+    Quarantine,
+    claim_feeds,
+    clear_feed,
+    default_quarantine_dir,
+    load_feed,
+    parser_pool,
+)
+from claims.models import ClaimFlag, ClaimNote
 import logging
 
 logger = logging.getLogger(__name__)
 
 class Command(BaseCommand):
-    help = 'Load claims data from existing SQLite database into Django models'
+    help = 'Load claims data from the CSV (or JSON) files in the Data folder into Django models'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f'Number of rows parsed and inserted per batch (default: {DEFAULT_BATCH_SIZE})'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Number of processes used to parse large CSV files in parallel for full '
+                 'and --swap loads on SQLite (default: 1; PostgreSQL always uses COPY)'
+        )
+        parser.add_argument(
+            '--data-dir',
+            type=str,
+            help='Folder containing the claims feeds (default: the project Data folder)'
+        )
+        parser.add_argument(
+            '--format',
+            choices=['csv', 'json', 'parquet'],
+            default='csv',
+            help='Which export of the feeds to load: the pipe-delimited .csv files (default), '
+                 'the .json files, read as a JSON array or NDJSON, or the .parquet files '
+                 'of a snapshot written by export_snapshot'
+        )
+        parser.add_argument(
+            '--quarantine-dir',
+            type=str,
+            help='Folder that receives a file of rejected rows for each feed'
+        )
+        mode = parser.add_mutually_exclusive_group()
+        mode.add_argument(
+            '--swap',
+            action='store_true',
+            help='Load into staging tables and swap them into place atomically, '
+                 'so readers never see an empty or partially loaded table'
+        )
+        mode.add_argument(
+            '--incremental',
+            action='store_true',
+            help='Apply the files as a delta: insert new rows, update changed rows '
+                 'and delete rows that are no longer present'
+        )
 
     def handle(self, *args, **options):
+        # handle() is also called directly by the reload commands, so options
+        # may be empty
+        if options.get('swap') and options.get('incremental'):
+            raise CommandError('--swap and --incremental cannot be combined')
+        if options.get('swap'):
+            self.mode = MODE_SWAP
+        elif options.get('incremental'):
+            self.mode = MODE_INCREMENTAL
+        else:
+            self.mode = MODE_REPLACE
+        if (options.get('format') == 'parquet' and self.mode == MODE_REPLACE
+                and (ClaimFlag.objects.exists() or ClaimNote.objects.exists())):
+            # Snapshots are not loaded back with their flags and notes, and a
+            # full load would delete them with the claims
+            raise CommandError(
+                'A full load would delete the existing flags and notes, which are not loaded '
+                'from the snapshot; use --swap or --incremental'
+            )
+        self.batch_size = options.get('batch_size') or DEFAULT_BATCH_SIZE
+        self.quarantine_dir = options.get('quarantine_dir') or default_quarantine_dir()
+
+        # Incremental loads diff model instances batch by batch, so only full
+        # and swap loads parse in parallel
+        workers = 1 if self.mode == MODE_INCREMENTAL else (options.get('workers') or 1)
+
         self.stdout.write(self.style.SUCCESS('Starting to load claims data...'))
-        
+
         try:
-            # Load claim list data
-            self.load_claim_list_data()
-            
-            # Load claim detail data
-            self.load_claim_detail_data()
-            
+            with parser_pool(workers) as pool:
+                self.pool = pool
+                if pool:
+                    self.stdout.write(f'Parsing with {workers} worker processes')
+
+                feeds = claim_feeds(options.get('data_dir'), format=options.get('format') or 'csv')
+                for label, source, schema in feeds:
+                    self.load(label, source, schema)
+
             self.stdout.write(
                 self.style.SUCCESS('Successfully loaded all claims data!')
             )
-            
+
         except Exception as e:
             self.stdout.write(
                 self.style.ERROR(f'Error loading claims data: {str(e)}')
             )
 
-    def load_claim_list_data(self):
-        """Load claim list data from CSV files in the Data folder"""
-        self.stdout.write('Loading claim list data...')
-        
-        # Clear existing data
-        ClaimList.objects.all().delete()
-        
-        data_folder = Path(settings.BASE_DIR.parent) / 'Data'
-        csv_path = data_folder / 'claim_list_data.csv'
-        
-        if not csv_path.exists():
-            self.stdout.write(self.style.ERROR(f'CSV not found: {csv_path}'))
-            self.stdout.write(self.style.WARNING('Skipping claim list load'))
-            return
-        
-        claim_list_objects = []
-        with csv_path.open('r', encoding='utf-8') as f:
-            reader = csv.DictReader(f, delimiter='|')
-            rows = list(reader)
-            self.stdout.write(f'Found {len(rows)} rows in {csv_path.name}')
-            
-            for i, row in enumerate(rows):
-                try:
-                    id_val = int(row.get('id') or 0)
-                    patient_name = row.get('patient_name') or ''
-                    status = row.get('status') or ''
-                    insurer_name = row.get('insurer_name') or ''
-                    
-                    discharge_date_str = row.get('discharge_date')
-                    discharge_date_obj = None
-                    if discharge_date_str:
-                        try:
-                            discharge_date_obj = datetime.strptime(discharge_date_str, '%Y-%m-%d').date()
-                        except (ValueError, TypeError):
-                            discharge_date_obj = None
-                    
-                    billed_amount_str = row.get('billed_amount')
-                    billed_amount_decimal = None
-                    if billed_amount_str not in (None, ''):
-                        try:
-                            billed_amount_decimal = Decimal(billed_amount_str)
-                        except Exception:
-                            billed_amount_decimal = None
-                    
-                    paid_amount_str = row.get('paid_amount')
-                    paid_amount_decimal = None
-                    if paid_amount_str not in (None, ''):
-                        try:
-                            paid_amount_decimal = Decimal(paid_amount_str)
-                        except Exception:
-                            paid_amount_decimal = None
-                    
-                    claim_list_objects.append(ClaimList(
-                        id=id_val,
-                        patient_name=patient_name,
-                        billed_amount=billed_amount_decimal,
-                        paid_amount=paid_amount_decimal,
-                        status=status,
-                        insurer_name=insurer_name,
-                        discharge_date=discharge_date_obj,
-                    ))
-                except Exception as e:
-                    if i < 5:
-                        self.stdout.write(self.style.WARNING(f'Skipping row {i+1} due to error: {e}'))
-                    continue
-        
-        if claim_list_objects:
-            ClaimList.objects.bulk_create(claim_list_objects, ignore_conflicts=True)
-            self.stdout.write(self.style.SUCCESS(f'Loaded {len(claim_list_objects)} claim list records'))
-        else:
-            self.stdout.write(self.style.WARNING('No claim list objects to create'))
-
-    def load_claim_detail_data(self):
-        """Load claim detail data from CSV files in the Data folder"""
-        self.stdout.write('Loading claim detail data...')
-        
-        # Clear existing data
-        ClaimDetail.objects.all().delete()
-        
-        data_folder = Path(settings.BASE_DIR.parent) / 'Data'
-        csv_path = data_folder / 'claim_detail_data.csv'
-        
-        if not csv_path.exists():
-            self.stdout.write(self.style.ERROR(f'CSV not found: {csv_path}'))
-            self.stdout.write(self.style.WARNING('Skipping claim detail load'))
-            return
-        
-        claim_detail_objects = []
-        with csv_path.open('r', encoding='utf-8') as f:
-            reader = csv.DictReader(f, delimiter='|')
-            rows = list(reader)
-            self.stdout.write(f'Found {len(rows)} rows in {csv_path.name}')
-            
-            for i, row in enumerate(rows):
-                try:
-                    id_val = int(row.get('id') or 0)
-                    claim_id = int(row.get('claim_id') or 0)
-                    denial_reason = row.get('denial_reason') or ''
-                    cpt_codes = row.get('cpt_codes') or ''
-                    
-                    claim_detail_objects.append(ClaimDetail(
-                        id=id_val,
-                        claim_id=claim_id,
-                        denial_reason=denial_reason,
-                        cpt_codes=cpt_codes,
-                    ))
-                except Exception as e:
-                    if i < 5:
-                        self.stdout.write(self.style.WARNING(f'Skipping row {i+1} due to error: {e}'))
-                    continue
-        
-        if claim_detail_objects:
-            ClaimDetail.objects.bulk_create(claim_detail_objects, ignore_conflicts=True)
-            self.stdout.write(self.style.SUCCESS(f'Loaded {len(claim_detail_objects)} claim detail records'))
+    def load(self, label, source, schema):
+        """Load one feed, reporting throughput and rejected rows"""
+        self.stdout.write(f'Loading {label} data...')
+
+        if not source.exists():
+            # A full load still clears the table when its file is gone, as before
+            if self.mode == MODE_REPLACE:
+                clear_feed(schema)
+            self.stdout.write(self.style.ERROR(f'File not found: {source.path}'))
+            self.stdout.write(self.style.WARNING(f'Skipping {label} load'))
+            return None
+
+        self.stdout.write(f'Streaming {source.name} in batches of {self.batch_size}')
+
+        def on_batch(stats):
+            self.stdout.write(
+                f'  {stats.rows_loaded} rows loaded ({stats.rows_per_second:,.0f} rows/s)'
+            )
+
+        with Quarantine(self.quarantine_dir, schema.table) as quarantine:
+            def on_error(line, row, error):
+                quarantine.add(line, row, error)
+                if quarantine.count <= 5:
+                    self.stdout.write(self.style.WARNING(f'Rejected row {line}: {error}'))
+
+            stats = load_feed(
+                source,
+                schema,
+                mode=self.mode,
+                batch_size=self.batch_size,
+                pool=getattr(self, 'pool', None),
+                on_batch=on_batch,
+                on_error=on_error,
+            )
+
+        if self.mode == MODE_INCREMENTAL:
+            self.stdout.write(self.style.SUCCESS(
+                f'Applied {label} delta in {stats.elapsed:.2f}s: {stats.inserted} inserted, '
+                f'{stats.updated} updated, {stats.deleted} deleted, {stats.unchanged} unchanged'
+            ))
+        elif stats.rows_loaded:
+            if self.mode == MODE_SWAP:
+                self.stdout.write(f'Swapped staged {label} table into place')
+            self.stdout.write(self.style.SUCCESS(
+                f'Loaded {stats.rows_loaded} {label} records in {stats.elapsed:.2f}s '
+                f'({stats.rows_per_second:,.0f} rows/s)'
+            ))
         else:
-            self.stdout.write(self.style.WARNING('No claim detail objects to create'))
+            self.stdout.write(self.style.WARNING(f'No {label} objects to create'))
+
+        if quarantine.count:
+            self.stdout.write(self.style.WARNING(
+                f'{quarantine.count} rejected {label} rows written to {quarantine.path}'
+            ))
+        return stats
@@ -1,9 +1,18 @@
 from django.core.management.base import BaseCommand, CommandError
 from django.db import transaction
 from claims.models import ClaimList, ClaimDetail
-import csv
-import os
-from datetime import datetime
+from claims.ingestion import (
+    CLAIM_DETAIL_SCHEMA,
+    CLAIM_LIST_SCHEMA,
+    MODE_APPEND,
+    Quarantine,
+    clear_feed,
+    clear_table,
+    default_quarantine_dir,
+    load_feed,
+    open_source,
+    parser_pool,
+)
 
 class Command(BaseCommand):
     help = 'Reload claims data from CSV files with overwrite or append options'
@@ -18,89 +27,69 @@ class Command(BaseCommand):
         parser.add_argument(
             '--claim-list',
             type=str,
-            help='Path to claim list CSV file'
+            help='Path to claim list file (.csv, or .json/.ndjson)'
         )
         parser.add_argument(
             '--claim-detail',
             type=str,
-            help='Path to claim detail CSV file'
+            help='Path to claim detail file (.csv, or .json/.ndjson)'
+        )
+        parser.add_argument(
+            '--quarantine-dir',
+            type=str,
+            help='Folder that receives a file of rejected rows for each feed'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Number of processes used to parse large CSV files in parallel on SQLite '
+                 '(default: 1; PostgreSQL always uses COPY)'
         )
-
-    def parse_date(self, date_str):
-        """Parse date string to date object"""
-        if not date_str or date_str == 'nan':
-            return None
-        try:
-            return datetime.strptime(date_str, '%Y-%m-%d').date()
-        except:
-            return None
-
-    def parse_decimal(self, value):
-        """Parse decimal value safely"""
-        if not value or value == 'nan':
-            return 0
-        try:
-            return float(value)
-        except:
-            return 0
 
     def handle(self, *args, **options):
         mode = options['mode']
         claim_list_path = options['claim_list'] or 'Data/claim_list_data.csv'
         claim_detail_path = options['claim_detail'] or 'Data/claim_detail_data.csv'
+        quarantine_dir = options.get('quarantine_dir') or default_quarantine_dir()
+        workers = options.get('workers') or 1
 
         self.stdout.write(f"Starting data reload in {mode} mode...")
 
         try:
-            with transaction.atomic():
+            # The pool is started first: it closes the database connections
+            with parser_pool(workers) as pool, transaction.atomic():
+                if pool:
+                    self.stdout.write(f"Parsing with {workers} worker processes")
+
                 if mode == 'overwrite':
                     self.stdout.write("Deleting existing data...")
-                    ClaimList.objects.all().delete()
-                    ClaimDetail.objects.all().delete()
+                    # Refreshed as a whole once the feeds are loaded
+                    clear_table(ClaimList)
+                    clear_table(ClaimDetail)
                     self.stdout.write(self.style.SUCCESS("Existing data deleted"))
 
-                # Load claim list data
-                if os.path.exists(claim_list_path):
-                    self.stdout.write(f"Loading claim list data from {claim_list_path}...")
-                    claim_list_objects = []
-                    
-                    with open(claim_list_path, 'r', encoding='utf-8') as file:
-                        reader = csv.DictReader(file, delimiter='|')
-                        for row in reader:
-                            claim_list_objects.append(ClaimList(
-                                id=int(row['id']),
-                                patient_name=row['patient_name'] or '',
-                                billed_amount=self.parse_decimal(row['billed_amount']),
-                                paid_amount=self.parse_decimal(row['paid_amount']),
-                                status=row['status'] or '',
-                                insurer_name=row['insurer_name'] or '',
-                                discharge_date=self.parse_date(row['discharge_date'])
-                            ))
-                    
-                    ClaimList.objects.bulk_create(claim_list_objects, ignore_conflicts=True)
-                    self.stdout.write(self.style.SUCCESS(f"Loaded {len(claim_list_objects)} claim list records"))
-                else:
-                    self.stdout.write(self.style.WARNING(f"Claim list file not found: {claim_list_path}"))
+                feeds = [
+                    ('claim list', open_source(claim_list_path), CLAIM_LIST_SCHEMA),
+                    ('claim detail', open_source(claim_detail_path), CLAIM_DETAIL_SCHEMA),
+                ]
+                for label, source, schema in feeds:
+                    if not source.exists():
+                        self.stdout.write(self.style.WARNING(f"{label.capitalize()} file not found: {source.path}"))
+                        if mode == 'overwrite':
+                            # Its table was cleared above
+                            clear_feed(schema)
+                        continue
 
-                # Load claim detail data
-                if os.path.exists(claim_detail_path):
-                    self.stdout.write(f"Loading claim detail data from {claim_detail_path}...")
-                    claim_detail_objects = []
-                    
-                    with open(claim_detail_path, 'r', encoding='utf-8') as file:
-                        reader = csv.DictReader(file, delimiter='|')
-                        for row in reader:
-                            claim_detail_objects.append(ClaimDetail(
-                                id=int(row['id']),
-                                claim_id=int(row['claim_id']),
-                                denial_reason=row['denial_reason'] or '',
-                                cpt_codes=row['cpt_codes'] or ''
-                            ))
-                    
-                    ClaimDetail.objects.bulk_create(claim_detail_objects, ignore_conflicts=True)
-                    self.stdout.write(self.style.SUCCESS(f"Loaded {len(claim_detail_objects)} claim detail records"))
-                else:
-                    self.stdout.write(self.style.WARNING(f"Claim detail file not found: {claim_detail_path}"))
+                    self.stdout.write(f"Loading {label} data from {source.path}...")
+                    # Tables were already cleared above, so both modes append
+                    with Quarantine(quarantine_dir, schema.table) as quarantine:
+                        stats = load_feed(source, schema, mode=MODE_APPEND, pool=pool, on_error=quarantine)
+                    self.stdout.write(self.style.SUCCESS(f"Loaded {stats.rows_loaded} {label} records"))
+                    if quarantine.count:
+                        self.stdout.write(self.style.WARNING(
+                            f"{quarantine.count} rejected {label} rows written to {quarantine.path}"
+                        ))
 
                 self.stdout.write(self.style.SUCCESS("Data reload completed successfully"))
 
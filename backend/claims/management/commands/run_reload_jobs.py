@@ -0,0 +1,77 @@
+from django.core.management.base import BaseCommand
+from claims.ingestion import DEFAULT_BATCH_SIZE, MODE_INCREMENTAL, parser_pool
+from claims.jobs import claim_job, run_job
+from claims.models import ReloadJob
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+class Command(BaseCommand):
+    help = 'Run queued reload jobs, such as those started from the force-reload API'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=2,
+            help='Seconds to wait between checks of an empty queue (default: 2)'
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Run the jobs that are already queued, then exit'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f'Number of rows parsed and inserted per batch (default: {DEFAULT_BATCH_SIZE})'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Number of processes used to parse large CSV files for full and swap '
+                 'reloads (default: 1)'
+        )
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        self.workers = options['workers']
+
+        self.stdout.write(self.style.SUCCESS('Waiting for reload jobs...'))
+
+        try:
+            while True:
+                job = claim_job()
+                if job is not None:
+                    self.run(job)
+                elif options['once']:
+                    break
+                else:
+                    time.sleep(options['interval'])
+        except KeyboardInterrupt:
+            self.stdout.write('\nStopping reload worker...')
+
+    def run(self, job):
+        """Run one claimed job and report how it went"""
+        self.stdout.write(f'Running reload job {job.id} ({job.mode})...')
+
+        # Incremental reloads diff model instances batch by batch, so only
+        # full and swap reloads parse in parallel
+        workers = 1 if job.mode == MODE_INCREMENTAL else self.workers
+        with parser_pool(workers) as pool:
+            run_job(job, batch_size=self.batch_size, pool=pool)
+
+        if job.status == ReloadJob.SUCCEEDED:
+            self.stdout.write(self.style.SUCCESS(
+                f'Reload job {job.id} loaded {job.rows_loaded} rows '
+                f'({job.total_claims} claims, {job.total_claim_details} claim details)'
+            ))
+        else:
+            self.stdout.write(self.style.ERROR(f'Reload job {job.id} failed: {job.error}'))
+        if job.rows_rejected:
+            self.stdout.write(self.style.WARNING(
+                f'{job.rows_rejected} rejected rows written to the quarantine folder'
+            ))
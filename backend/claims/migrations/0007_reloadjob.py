@@ -0,0 +1,42 @@
+# Generated by Django 4.2.7 on 2026-10-18 03:42
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('claims', '0006_alter_claimflag_flagged_at_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReloadJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mode', models.CharField(default='swap', max_length=20)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('succeeded', 'Succeeded'), ('failed', 'Failed')], db_index=True, default='queued', max_length=20)),
+                ('active_key', models.CharField(blank=True, default='reload', max_length=20, null=True, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('current_feed', models.CharField(blank=True, max_length=100, null=True)),
+                ('rows_loaded', models.BigIntegerField(default=0)),
+                ('rows_rejected', models.BigIntegerField(default=0)),
+                ('total_claims', models.BigIntegerField(blank=True, null=True)),
+                ('total_claim_details', models.BigIntegerField(blank=True, null=True)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('requested_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reload_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Reload Job',
+                'verbose_name_plural': 'Reload Jobs',
+                'db_table': 'claim_reload_job',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.7 on 2026-10-18 03:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('claims', '0007_reloadjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonitorState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=100, unique=True)),
+                ('value', models.JSONField(default=dict)),
+                ('version', models.PositiveIntegerField(default=1)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Monitor State',
+                'verbose_name_plural': 'Monitor States',
+                'db_table': 'claim_monitor_state',
+            },
+        ),
+    ]
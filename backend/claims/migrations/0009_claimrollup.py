@@ -0,0 +1,70 @@
+# Generated by Django 4.2.7 on 2026-10-18 03:52
+
+from django.db import migrations, models
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncMonth
+
+
+def build_rollups(apps, schema_editor):
+    """Roll up the claims already loaded; later loads keep the rollups current"""
+    ClaimList = apps.get_model('claims', 'ClaimList')
+    ClaimRollup = apps.get_model('claims', 'ClaimRollup')
+    db_alias = schema_editor.connection.alias
+
+    underpaid = Q(billed_amount__gt=0, paid_amount__lt=F('billed_amount'))
+    groups = ClaimList.objects.using(db_alias).annotate(
+        month=TruncMonth('discharge_date')
+    ).values('month', 'insurer_name', 'status').annotate(
+        claim_count=Count('id'),
+        billed_total=Sum('billed_amount'),
+        paid_total=Sum('paid_amount'),
+        underpaid_count=Count('id', filter=underpaid),
+        underpayment_total=Sum(F('billed_amount') - F('paid_amount'), filter=underpaid),
+    ).order_by()
+
+    ClaimRollup.objects.using(db_alias).bulk_create([
+        ClaimRollup(
+            month=group['month'],
+            insurer_name=group['insurer_name'],
+            status=group['status'],
+            is_test_insurer='test' in (group['insurer_name'] or '').lower(),
+            claim_count=group['claim_count'],
+            billed_total=group['billed_total'] or 0,
+            paid_total=group['paid_total'] or 0,
+            underpaid_count=group['underpaid_count'],
+            underpayment_total=group['underpayment_total'] or 0,
+        )
+        for group in groups
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('claims', '0008_monitorstate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClaimRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(blank=True, null=True)),
+                ('insurer_name', models.CharField(blank=True, max_length=255, null=True)),
+                ('status', models.CharField(blank=True, max_length=100, null=True)),
+                ('is_test_insurer', models.BooleanField(default=False)),
+                ('claim_count', models.BigIntegerField(default=0)),
+                ('billed_total', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('paid_total', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+                ('underpaid_count', models.BigIntegerField(default=0)),
+                ('underpayment_total', models.DecimalField(decimal_places=2, default=0, max_digits=20)),
+            ],
+            options={
+                'verbose_name': 'Claim Rollup',
+                'verbose_name_plural': 'Claim Rollups',
+                'db_table': 'claim_rollup',
+                'indexes': [models.Index(fields=['is_test_insurer', 'month'], name='claim_rollup_test_month_idx')],
+            },
+        ),
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:05
+
+from django.db import migrations, models
+
+
+def flag_test_insurers(apps, schema_editor):
+    """Flag the claims already loaded; later loads set the flag as they go"""
+    ClaimList = apps.get_model('claims', 'ClaimList')
+    db_alias = schema_editor.connection.alias
+    ClaimList.objects.using(db_alias).filter(
+        insurer_name__icontains='test'
+    ).update(is_test_insurer=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('claims', '0009_claimrollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='claimlist',
+            name='is_test_insurer',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(flag_test_insurers, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='claimdetail',
+            index=models.Index(fields=['claim_id'], name='claim_detail_claim_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='claimlist',
+            index=models.Index(fields=['is_test_insurer', 'status'], name='claim_list_test_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='claimlist',
+            index=models.Index(fields=['insurer_name'], name='claim_list_insurer_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='claimlist',
+            index=models.Index(fields=['is_test_insurer', '-discharge_date'], name='claim_list_test_discharge_idx'),
+        ),
+    ]
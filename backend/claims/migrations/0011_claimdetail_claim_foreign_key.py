@@ -0,0 +1,46 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    """
+    Turn claim_id into a foreign key to ClaimList in place. The column keeps
+    its name, type and index; it only becomes nullable.
+    """
+
+    dependencies = [
+        ('claims', '0010_claimlist_is_test_insurer_and_indexes'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.AlterField(
+                    model_name='claimdetail',
+                    name='claim_id',
+                    field=models.BigIntegerField(null=True),
+                ),
+            ],
+            state_operations=[
+                migrations.RemoveIndex(
+                    model_name='claimdetail',
+                    name='claim_detail_claim_idx',
+                ),
+                migrations.RemoveField(
+                    model_name='claimdetail',
+                    name='claim_id',
+                ),
+                migrations.AddField(
+                    model_name='claimdetail',
+                    name='claim',
+                    field=models.ForeignKey(db_constraint=False, db_index=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='details', to='claims.claimlist'),
+                ),
+                migrations.AddIndex(
+                    model_name='claimdetail',
+                    index=models.Index(fields=['claim'], name='claim_detail_claim_idx'),
+                ),
+            ],
+        ),
+    ]
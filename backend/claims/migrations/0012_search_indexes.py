@@ -0,0 +1,62 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:40
+
+from django.db import migrations
+
+# (table, searched columns); see claims.search
+SEARCHED_COLUMNS = [
+    ('claim_list', ['id', 'patient_name', 'insurer_name']),
+    ('claim_detail', ['id', 'claim_id', 'denial_reason', 'cpt_codes']),
+    ('claim_note', ['note']),
+    ('claim_flag', ['reason']),
+]
+
+# Columns reached through icontains lookups that have no index of their own
+POSTGRESQL_EXTRA_COLUMNS = [('auth_user', ['username'])]
+
+
+def create_search_indexes(apps, schema_editor):
+    """Create and fill the FTS5 indexes on SQLite, or trigram indexes on PostgreSQL"""
+    connection = schema_editor.connection
+    quote = connection.ops.quote_name
+
+    if connection.vendor == 'sqlite':
+        for table, columns in SEARCHED_COLUMNS:
+            quoted = ', '.join(quote(column) for column in columns)
+            schema_editor.execute(
+                f"CREATE VIRTUAL TABLE {table}_search USING fts5({quoted}, tokenize='trigram')"
+            )
+            schema_editor.execute(
+                f'INSERT INTO {table}_search (rowid, {quoted}) SELECT "id", {quoted} FROM {quote(table)}'
+            )
+    elif connection.vendor == 'postgresql':
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for table, columns in SEARCHED_COLUMNS + POSTGRESQL_EXTRA_COLUMNS:
+            for column in columns:
+                # The expression icontains compiles to, so the lookup can use it
+                schema_editor.execute(
+                    f'CREATE INDEX IF NOT EXISTS {table}_{column}_trgm ON {quote(table)} '
+                    f'USING gin (UPPER({quote(column)}::text) gin_trgm_ops)'
+                )
+
+
+def drop_search_indexes(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        for table, _ in SEARCHED_COLUMNS:
+            schema_editor.execute(f'DROP TABLE IF EXISTS {table}_search')
+    elif connection.vendor == 'postgresql':
+        for table, columns in SEARCHED_COLUMNS + POSTGRESQL_EXTRA_COLUMNS:
+            for column in columns:
+                schema_editor.execute(f'DROP INDEX IF EXISTS {table}_{column}_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('claims', '0011_claimdetail_claim_foreign_key'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('claims', '0012_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='claimflag',
+            index=models.Index(fields=['-flagged_at', '-id'], name='claim_flag_flagged_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='claimnote',
+            index=models.Index(fields=['-created_at', '-id'], name='claim_note_created_at_idx'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:17
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def split_cpt_codes(apps, schema_editor):
+    """Split the codes of the details already loaded; later loads keep them in step"""
+    ClaimDetail = apps.get_model('claims', 'ClaimDetail')
+    ClaimDetailCPT = apps.get_model('claims', 'ClaimDetailCPT')
+    db_alias = schema_editor.connection.alias
+    links = []
+    for pk, raw_codes in ClaimDetail.objects.using(db_alias).values_list('pk', 'cpt_codes').iterator():
+        parts = (part.strip().strip("[]'\"").strip() for part in (raw_codes or '').split(','))
+        for code in dict.fromkeys(part for part in parts if part):
+            links.append(ClaimDetailCPT(detail_id=pk, code=code))
+    ClaimDetailCPT.objects.using(db_alias).bulk_create(links, batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('claims', '0013_list_ordering_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClaimDetailCPT',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=50)),
+                ('detail', models.ForeignKey(db_constraint=False, db_index=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='cpt_links', to='claims.claimdetail')),
+            ],
+            options={
+                'verbose_name': 'Claim Detail CPT Code',
+                'verbose_name_plural': 'Claim Detail CPT Codes',
+                'db_table': 'claim_detail_cpt',
+                'indexes': [models.Index(fields=['code', 'detail'], name='claim_detail_cpt_code_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='claimdetailcpt',
+            constraint=models.UniqueConstraint(fields=('detail', 'code'), name='claim_detail_cpt_unique'),
+        ),
+        migrations.RunPython(split_cpt_codes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,199 @@
+# Generated by Django 4.2.7 on 2026-10-18 09:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import OuterRef, Q, Subquery
+
+# lookup model: [(model, text field, key field)]; see claims.lookups
+INTERNED_COLUMNS = [
+    ('ClaimStatus', [('ClaimList', 'status', 'status_key'), ('ClaimRollup', 'status', 'status_key')]),
+    ('Insurer', [('ClaimList', 'insurer_name', 'insurer'), ('ClaimRollup', 'insurer_name', 'insurer')]),
+    ('DenialReason', [('ClaimDetail', 'denial_reason', 'denial_reason_key')]),
+]
+
+
+def intern_values(apps, schema_editor):
+    """Store each distinct name once and point the rows at it"""
+    using = schema_editor.connection.alias
+    for lookup_name, columns in INTERNED_COLUMNS:
+        lookup = apps.get_model('claims', lookup_name)
+        names = set()
+        for model_name, text, _ in columns:
+            rows = apps.get_model('claims', model_name).objects.using(using)
+            names.update(rows.exclude(Q(**{f'{text}__isnull': True}) | Q(**{text: ''}))
+                         .values_list(text, flat=True).distinct())
+        lookup.objects.using(using).bulk_create([lookup(name=name) for name in sorted(names)])
+        for model_name, text, key in columns:
+            apps.get_model('claims', model_name).objects.using(using).update(**{
+                key: Subquery(lookup.objects.using(using).filter(name=OuterRef(text)).values('pk')[:1]),
+            })
+
+
+def restore_values(apps, schema_editor):
+    """Copy the names back into the text columns"""
+    using = schema_editor.connection.alias
+    for lookup_name, columns in INTERNED_COLUMNS:
+        lookup = apps.get_model('claims', lookup_name)
+        for model_name, text, key in columns:
+            apps.get_model('claims', model_name).objects.using(using).update(**{
+                text: Subquery(lookup.objects.using(using).filter(pk=OuterRef(key)).values('name')[:1]),
+            })
+
+
+def create_claim_search(schema_editor, insurer_column):
+    """(Re)create the claim list's FTS5 index, naming the insurer column ``insurer_column``"""
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TABLE IF EXISTS claim_list_search')
+    schema_editor.execute(
+        f'CREATE VIRTUAL TABLE claim_list_search USING fts5("id", "patient_name", "{insurer_column}", '
+        f"tokenize='trigram')"
+    )
+    schema_editor.execute(
+        f'INSERT INTO claim_list_search (rowid, "id", "patient_name", "{insurer_column}") '
+        'SELECT "id", "id", "patient_name", (SELECT "name" FROM "claim_insurer" '
+        'WHERE "claim_insurer"."id" = "claim_list"."insurer_id") FROM "claim_list"'
+    )
+
+
+def index_insurers(apps, schema_editor):
+    create_claim_search(schema_editor, 'insurer')
+
+
+def unindex_insurers(apps, schema_editor):
+    create_claim_search(schema_editor, 'insurer_name')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('claims', '0014_claim_detail_cpt'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClaimStatus',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=500, unique=True)),
+            ],
+            options={
+                'verbose_name': 'Claim Status',
+                'verbose_name_plural': 'Claim Statuses',
+                'db_table': 'claim_status',
+                'ordering': ['name'],
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='DenialReason',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=500, unique=True)),
+            ],
+            options={
+                'verbose_name': 'Denial Reason',
+                'verbose_name_plural': 'Denial Reasons',
+                'db_table': 'claim_denial_reason',
+                'ordering': ['name'],
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='Insurer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=500, unique=True)),
+            ],
+            options={
+                'verbose_name': 'Insurer',
+                'verbose_name_plural': 'Insurers',
+                'db_table': 'claim_insurer',
+                'ordering': ['name'],
+                'abstract': False,
+            },
+        ),
+        migrations.AddField(
+            model_name='claimlist',
+            name='status_key',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='claims', to='claims.claimstatus'),
+        ),
+        migrations.AddField(
+            model_name='claimlist',
+            name='insurer',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='claims', to='claims.insurer'),
+        ),
+        migrations.AddField(
+            model_name='claimdetail',
+            name='denial_reason_key',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='details', to='claims.denialreason'),
+        ),
+        migrations.AddField(
+            model_name='claimrollup',
+            name='status_key',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, to='claims.claimstatus'),
+        ),
+        migrations.AddField(
+            model_name='claimrollup',
+            name='insurer',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.PROTECT, to='claims.insurer'),
+        ),
+        migrations.RunPython(intern_values, restore_values),
+        migrations.RemoveIndex(
+            model_name='claimlist',
+            name='claim_list_test_status_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='claimlist',
+            name='claim_list_insurer_idx',
+        ),
+        migrations.RemoveField(
+            model_name='claimlist',
+            name='status',
+        ),
+        migrations.RemoveField(
+            model_name='claimlist',
+            name='insurer_name',
+        ),
+        migrations.RemoveField(
+            model_name='claimdetail',
+            name='denial_reason',
+        ),
+        migrations.RemoveField(
+            model_name='claimrollup',
+            name='status',
+        ),
+        migrations.RemoveField(
+            model_name='claimrollup',
+            name='insurer_name',
+        ),
+        migrations.RenameField(
+            model_name='claimlist',
+            old_name='status_key',
+            new_name='status',
+        ),
+        migrations.RenameField(
+            model_name='claimdetail',
+            old_name='denial_reason_key',
+            new_name='denial_reason',
+        ),
+        migrations.RenameField(
+            model_name='claimrollup',
+            old_name='status_key',
+            new_name='status',
+        ),
+        migrations.AddIndex(
+            model_name='claimlist',
+            index=models.Index(fields=['is_test_insurer', 'status'], name='claim_list_test_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='claimlist',
+            index=models.Index(fields=['insurer'], name='claim_list_insurer_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='claimdetail',
+            index=models.Index(fields=['denial_reason'], name='claim_detail_denial_idx'),
+        ),
+        migrations.RunPython(index_insurers, unindex_insurers),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 11:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('claims', '0015_lookup_tables'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reloadjob',
+            name='follow_up',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -1,43 +1,163 @@
-from django.db import models
+from django.db import DEFAULT_DB_ALIAS, models
 from django.contrib.auth.models import User
 
+# Insurers whose name contains this (in any case) are test data, kept out of
+# the lists, filters and analytics
+TEST_INSURER_MARKER = 'test'
+
+
+def is_test_insurer(insurer_name):
+    """Whether claims from this insurer are test data"""
+    return TEST_INSURER_MARKER in (insurer_name or '').lower()
+
+
+def parse_cpt_codes(raw_codes):
+    """The distinct codes of a detail's cpt_codes, stored comma-separated or list-like"""
+    parts = (part.strip().strip("[]'\"").strip() for part in (raw_codes or '').split(','))
+    return list(dict.fromkeys(part for part in parts if part))
+
+class LookupValue(models.Model):
+    """
+    One distinct value of a low-cardinality text column, stored once and
+    referenced by its integer key (see claims.lookups). Rows are only ever
+    added, never changed or deleted.
+    """
+    name = models.CharField(max_length=500, unique=True)
+
+    class Meta:
+        abstract = True
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+    @classmethod
+    def intern(cls, name, using=DEFAULT_DB_ALIAS):
+        """The row for ``name``, created if needed, or None for a blank name"""
+        if not name:
+            return None
+        value, _ = cls.objects.using(using).get_or_create(name=name)
+        return value
+
+class ClaimStatus(LookupValue):
+    """A claim status, such as Paid or Denied"""
+
+    class Meta(LookupValue.Meta):
+        db_table = 'claim_status'
+        verbose_name = 'Claim Status'
+        verbose_name_plural = 'Claim Statuses'
+
+class Insurer(LookupValue):
+    """An insurer named by the claims"""
+
+    class Meta(LookupValue.Meta):
+        db_table = 'claim_insurer'
+        verbose_name = 'Insurer'
+        verbose_name_plural = 'Insurers'
+
+class DenialReason(LookupValue):
+    """A reason a claim detail was denied"""
+
+    class Meta(LookupValue.Meta):
+        db_table = 'claim_denial_reason'
+        verbose_name = 'Denial Reason'
+        verbose_name_plural = 'Denial Reasons'
+
 class ClaimList(models.Model):
     """Model for claim list data"""
     id = models.BigIntegerField(primary_key=True)
     patient_name = models.CharField(max_length=255, blank=True, null=True)
     billed_amount = models.DecimalField(max_digits=15, decimal_places=2, blank=True, null=True)
     paid_amount = models.DecimalField(max_digits=15, decimal_places=2, blank=True, null=True)
-    status = models.CharField(max_length=100, blank=True, null=True)
-    insurer_name = models.CharField(max_length=255, blank=True, null=True)
+    status = models.ForeignKey(
+        ClaimStatus, on_delete=models.PROTECT, db_index=False, blank=True, null=True, related_name='claims',
+    )
+    insurer = models.ForeignKey(
+        Insurer, on_delete=models.PROTECT, db_index=False, blank=True, null=True, related_name='claims',
+    )
     discharge_date = models.DateField(blank=True, null=True)
+    # Derived from the insurer's name when the feed is loaded
+    is_test_insurer = models.BooleanField(default=False)
 
     class Meta:
         db_table = 'claim_list'
         verbose_name = 'Claim List'
         verbose_name_plural = 'Claim Lists'
+        indexes = [
+            models.Index(fields=['is_test_insurer', 'status'], name='claim_list_test_status_idx'),
+            models.Index(fields=['insurer'], name='claim_list_insurer_idx'),
+            models.Index(fields=['is_test_insurer', '-discharge_date'], name='claim_list_test_discharge_idx'),
+        ]
 
     def __str__(self):
         return f"{self.id} - {self.patient_name}"
 
+    def save(self, *args, **kwargs):
+        self.is_test_insurer = is_test_insurer(self.insurer.name if self.insurer else None)
+        super().save(*args, **kwargs)
+
 class ClaimDetail(models.Model):
     """Model for claim detail data"""
     id = models.IntegerField(primary_key=True)
-    claim_id = models.BigIntegerField()
-    denial_reason = models.CharField(max_length=500, blank=True, null=True)
+    # Feeds may reference claims that are not loaded (yet), so there is no
+    # database constraint; null=True makes select_related use an outer join
+    # and keep such details. The column is still claim_id.
+    claim = models.ForeignKey(
+        ClaimList, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False,
+        null=True, related_name='details',
+    )
+    denial_reason = models.ForeignKey(
+        DenialReason, on_delete=models.PROTECT, db_index=False, blank=True, null=True, related_name='details',
+    )
     cpt_codes = models.CharField(max_length=500, blank=True, null=True)
 
     class Meta:
         db_table = 'claim_detail'
         verbose_name = 'Claim Detail'
         verbose_name_plural = 'Claim Details'
+        indexes = [
+            models.Index(fields=['claim'], name='claim_detail_claim_idx'),
+            models.Index(fields=['denial_reason'], name='claim_detail_denial_idx'),
+        ]
 
     def __str__(self):
         return f"{self.id} - Claim {self.claim_id}"
 
     @property
     def claim_list(self):
-        """Get the related claim list record"""
-        return ClaimList.objects.filter(id=self.claim_id).first()
+        """Get the related claim list record, or None if it is not loaded"""
+        try:
+            return self.claim
+        except ClaimList.DoesNotExist:
+            return None
+
+class ClaimDetailCPT(models.Model):
+    """
+    One CPT code of a claim detail, split out of ClaimDetail.cpt_codes when
+    the details are loaded (see claims.cpt), so details can be found by
+    exact code and codes aggregated through an index.
+    """
+    # Rebuilt after every load of the details, which may replace their
+    # table wholesale, so there is no database constraint
+    detail = models.ForeignKey(
+        ClaimDetail, on_delete=models.DO_NOTHING, db_constraint=False, db_index=False,
+        related_name='cpt_links',
+    )
+    code = models.CharField(max_length=50)
+
+    class Meta:
+        db_table = 'claim_detail_cpt'
+        verbose_name = 'Claim Detail CPT Code'
+        verbose_name_plural = 'Claim Detail CPT Codes'
+        constraints = [
+            models.UniqueConstraint(fields=['detail', 'code'], name='claim_detail_cpt_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['code', 'detail'], name='claim_detail_cpt_code_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.detail_id} - {self.code}"
 
 class ClaimFlag(models.Model):
     """Model for flagging claims for review"""
@@ -53,6 +173,9 @@ class ClaimFlag(models.Model):
         db_table = 'claim_flag'
         verbose_name = 'Claim Flag'
         verbose_name_plural = 'Claim Flags'
+        indexes = [
+            models.Index(fields=['-flagged_at', '-id'], name='claim_flag_flagged_at_idx'),
+        ]
 
     def __str__(self):
         return f"Flag {self.id} - Claim {self.claim.id}"
@@ -70,6 +193,128 @@ class ClaimNote(models.Model):
         verbose_name = 'Claim Note'
         verbose_name_plural = 'Claim Notes'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='claim_note_created_at_idx'),
+        ]
 
     def __str__(self):
         return f"Note {self.id} - Claim {self.claim.id}"
+
+class ReloadJob(models.Model):
+    """
+    A queued reload of the claims feeds, run by the run_reload_jobs worker.
+
+    Only one job may be queued or running at a time: active jobs hold the
+    unique active_key, which is cleared when they finish, so concurrent
+    requests for a reload share the job that is already in flight.
+    follow_up is set when the files change while a job runs, which may
+    have read them already; another job is queued when it finishes.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    ]
+    ACTIVE_KEY = 'reload'
+
+    mode = models.CharField(max_length=20, default='swap')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=QUEUED, db_index=True)
+    active_key = models.CharField(max_length=20, unique=True, blank=True, null=True, default=ACTIVE_KEY)
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='reload_jobs')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    current_feed = models.CharField(max_length=100, blank=True, null=True)
+    rows_loaded = models.BigIntegerField(default=0)
+    rows_rejected = models.BigIntegerField(default=0)
+    total_claims = models.BigIntegerField(blank=True, null=True)
+    total_claim_details = models.BigIntegerField(blank=True, null=True)
+    error = models.TextField(blank=True, null=True)
+    follow_up = models.BooleanField(default=False)
+
+    class Meta:
+        db_table = 'claim_reload_job'
+        verbose_name = 'Reload Job'
+        verbose_name_plural = 'Reload Jobs'
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Reload {self.id} - {self.status}"
+
+    @property
+    def is_active(self):
+        """Whether the job is still queued or running"""
+        return self.status in (self.QUEUED, self.RUNNING)
+
+    def as_dict(self):
+        """Status payload returned by the job status endpoint"""
+        def iso(value):
+            return value.isoformat() if value else None
+
+        return {
+            'job_id': self.id,
+            'mode': self.mode,
+            'status': self.status,
+            'current_feed': self.current_feed,
+            'rows_loaded': self.rows_loaded,
+            'rows_rejected': self.rows_rejected,
+            'total_claims': self.total_claims,
+            'total_claim_details': self.total_claim_details,
+            'error': self.error,
+            'created_at': iso(self.created_at),
+            'started_at': iso(self.started_at),
+            'finished_at': iso(self.finished_at),
+            'updated_at': iso(self.updated_at),
+        }
+
+class MonitorState(models.Model):
+    """
+    Shared state of the data monitor, such as the last seen file
+    fingerprints, kept in the database so every web worker sees the same
+    values. Updates go through a version number, see claims.state.
+    """
+    key = models.CharField(max_length=100, unique=True)
+    value = models.JSONField(default=dict)
+    version = models.PositiveIntegerField(default=1)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'claim_monitor_state'
+        verbose_name = 'Monitor State'
+        verbose_name_plural = 'Monitor States'
+
+    def __str__(self):
+        return f"{self.key} (v{self.version})"
+
+class ClaimRollup(models.Model):
+    """
+    Precomputed claim totals per discharge month, insurer and status, kept
+    up to date by the ingestion pipeline (see claims.rollups) so analytics
+    never scan claim_list.
+    """
+    month = models.DateField(blank=True, null=True)
+    insurer = models.ForeignKey(Insurer, on_delete=models.PROTECT, db_index=False, blank=True, null=True)
+    status = models.ForeignKey(ClaimStatus, on_delete=models.PROTECT, db_index=False, blank=True, null=True)
+    is_test_insurer = models.BooleanField(default=False)
+    claim_count = models.BigIntegerField(default=0)
+    billed_total = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+    paid_total = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+    underpaid_count = models.BigIntegerField(default=0)
+    underpayment_total = models.DecimalField(max_digits=20, decimal_places=2, default=0)
+
+    class Meta:
+        db_table = 'claim_rollup'
+        verbose_name = 'Claim Rollup'
+        verbose_name_plural = 'Claim Rollups'
+        indexes = [
+            models.Index(fields=['is_test_insurer', 'month'], name='claim_rollup_test_month_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.month} - {self.insurer} - {self.status}"
@@ -0,0 +1,192 @@
+"""
+Keyset (cursor) pagination for the list views.
+
+Django's Paginator counts the filtered queryset on every request and reads
+pages with OFFSET, so deep pages scan every row before them. KeysetPaginator
+seeks instead, from the sort key of the row at the edge of the page the
+user came from:
+
+    WHERE flagged_at <= :at AND (flagged_at < :at OR id < :id)
+    ORDER BY flagged_at DESC, id DESC LIMIT 26
+
+An index on the ordering serves that in the same time for any page. Links
+carry the key as an opaque ``after`` or ``before`` cursor, which also
+records the page number for display; First and Last need no key.
+
+The total is counted once per filter and data, flags and notes version
+(see claims.state) and cached, so paging through a list does not count it
+again.
+"""
+import base64
+import json
+import math
+
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils.http import urlencode
+
+from .state import queryset_cache_key
+
+PAGE_SIZE = 25
+COUNT_CACHE_TIMEOUT = 3600
+
+# Query parameters that select a page rather than filter the list
+PAGE_PARAMS = ('after', 'before', 'last', 'page')
+
+
+def encode_cursor(values, number):
+    # str() keeps datetimes to the microsecond, which DjangoJSONEncoder does not
+    data = json.dumps({'k': values, 'p': number}, default=str)
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return ``(values, number)``, or None for a malformed cursor"""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return list(data['k']), int(data['p'])
+    except (ValueError, TypeError, KeyError):
+        return None
+
+
+class KeysetPage:
+    """One page of a KeysetPaginator, with links to its neighbours"""
+
+    def __init__(self, paginator, object_list, number, has_previous, has_next):
+        self.paginator = paginator
+        self.object_list = object_list
+        self.number = number
+        self.has_previous = has_previous
+        self.has_next = has_next
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    @property
+    def has_other_pages(self):
+        return self.has_previous or self.has_next
+
+    def url(self, **page_params):
+        return '?' + urlencode({**self.paginator.params, **page_params})
+
+    @property
+    def first_url(self):
+        return self.url()
+
+    @property
+    def last_url(self):
+        return self.url(last=1)
+
+    @property
+    def previous_url(self):
+        if not self.object_list:
+            return self.first_url
+        key = self.paginator.key(self.object_list[0])
+        return self.url(before=encode_cursor(key, max(self.number - 1, 1)))
+
+    @property
+    def next_url(self):
+        if not self.object_list:
+            return self.last_url
+        key = self.paginator.key(self.object_list[-1])
+        return self.url(after=encode_cursor(key, self.number + 1))
+
+
+class KeysetPaginator:
+    """
+    Pages through ``queryset`` in ``ordering``, a sequence of field or
+    annotation names (``-`` for descending) that must end in a unique,
+    non-null key. ``params`` are the query parameters of the list's
+    filters, kept on every page link.
+    """
+
+    def __init__(self, queryset, ordering, per_page=PAGE_SIZE, params=None):
+        self.queryset = queryset
+        self.ordering = list(ordering)
+        self.fields = [name.lstrip('-') for name in self.ordering]
+        self.descending = [name.startswith('-') for name in self.ordering]
+        self.per_page = per_page
+        self.params = {
+            key: value for key, value in (params or {}).items()
+            if key not in PAGE_PARAMS and value
+        }
+        self._count = None
+
+    def __getstate__(self):
+        # Pages are cached (see claims.live_search) with their count and
+        # link parameters, but without the query they came from
+        state = self.__dict__.copy()
+        state['_count'] = self.count
+        state['queryset'] = None
+        return state
+
+    @property
+    def count(self):
+        """Number of rows in the list, cached until its data changes"""
+        if self._count is None:
+            key = queryset_cache_key('list_count', self.queryset.order_by())
+            self._count = cache.get(key)
+            if self._count is None:
+                self._count = self.queryset.count()
+                cache.set(key, self._count, COUNT_CACHE_TIMEOUT)
+        return self._count
+
+    @property
+    def num_pages(self):
+        return max(math.ceil(self.count / self.per_page), 1)
+
+    def key(self, obj):
+        return [getattr(obj, name) for name in self.fields]
+
+    def output_field(self, name):
+        annotation = self.queryset.query.annotations.get(name)
+        if annotation is not None:
+            return annotation.output_field
+        meta = self.queryset.model._meta
+        return meta.pk if name == 'pk' else meta.get_field(name)
+
+    def seek(self, values, backwards):
+        """A Q for the rows after the key ``values`` (before it if ``backwards``)"""
+        values = [self.output_field(name).to_python(value) for name, value in zip(self.fields, values)]
+        after = Q()
+        for position, (name, value) in enumerate(zip(self.fields, values)):
+            lookup = 'lt' if self.descending[position] != backwards else 'gt'
+            step = Q(**{f'{name}__{lookup}': value})
+            for previous, previous_value in zip(self.fields[:position], values[:position]):
+                step &= Q(**{previous: previous_value})
+            after |= step
+        # Bounds the leading column too, so the index scan starts at the key
+        bound = 'lte' if self.descending[0] != backwards else 'gte'
+        return Q(**{f'{self.fields[0]}__{bound}': values[0]}) & after
+
+    def page(self, params):
+        """The page selected by ``after``, ``before`` or ``last`` in ``params``"""
+        reverse = [name[1:] if name.startswith('-') else f'-{name}' for name in self.ordering]
+        after = decode_cursor(params.get('after', ''))
+        before = decode_cursor(params.get('before', ''))
+
+        if before is not None:
+            values, number = before
+            rows = list(self.queryset.filter(self.seek(values, True)).order_by(*reverse)[:self.per_page + 1])
+            has_previous = len(rows) > self.per_page
+            return KeysetPage(self, rows[:self.per_page][::-1], number, has_previous, True)
+
+        if params.get('last'):
+            # Only the remainder, so the pages line up with those paged forwards
+            size = self.count - (self.num_pages - 1) * self.per_page
+            rows = list(self.queryset.order_by(*reverse)[:max(size, 0)])[::-1]
+            return KeysetPage(self, rows, self.num_pages, self.num_pages > 1, False)
+
+        queryset = self.queryset.order_by(*self.ordering)
+        number = 1
+        if after is not None:
+            values, number = after
+            queryset = queryset.filter(self.seek(values, False))
+        rows = list(queryset[:self.per_page + 1])
+        return KeysetPage(self, rows[:self.per_page], number, after is not None, len(rows) > self.per_page)
@@ -0,0 +1,103 @@
+"""
+Materialized analytics rollups.
+
+ClaimRollup holds one row per (discharge month, insurer, status) with the
+claim count and billed, paid and underpayment totals. The analytics pages
+and the dashboard aggregate these few hundred rows instead of scanning
+claim_list, and the month is computed with TruncMonth, so the same code
+runs on SQLite and PostgreSQL.
+
+Rollups are refreshed when a claim list feed is loaded (see
+claims.signals): a full load rebuilds them with one grouped query, and an
+incremental load rebuilds only the months its delta touched. A claim saved
+or deleted on its own, as in the admin, rebuilds the months it left and
+entered.
+"""
+from datetime import date
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncMonth
+
+from .models import ClaimList, ClaimRollup
+
+
+def month_of(value):
+    """The first day of the month of a date, or None"""
+    return value.replace(day=1) if value else None
+
+
+def next_month(month):
+    return date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def touched_months(changes):
+    """The months affected by a list of ``(old, new)`` claim values"""
+    months = set()
+    for old, new in changes:
+        for values in (old, new):
+            if values is not None:
+                months.add(month_of(values.get('discharge_date')))
+    return months
+
+
+def refresh_rollups(months=None, using=DEFAULT_DB_ALIAS):
+    """
+    Rebuild the rollups for ``months`` (first days of months, None standing
+    for claims without a discharge date), or all of them when ``months`` is
+    None. Returns the number of rollup rows written.
+    """
+    claims = ClaimList.objects.using(using)
+    rollups = ClaimRollup.objects.using(using)
+
+    if months is not None:
+        if not months:
+            return 0
+        dated = [month for month in months if month is not None]
+        claim_filter = Q(discharge_date__isnull=True) if None in months else Q(pk__in=[])
+        for month in dated:
+            claim_filter |= Q(discharge_date__gte=month, discharge_date__lt=next_month(month))
+        rollup_filter = Q(month__in=dated)
+        if None in months:
+            rollup_filter |= Q(month__isnull=True)
+        claims = claims.filter(claim_filter)
+        rollups = rollups.filter(rollup_filter)
+
+    underpaid = Q(billed_amount__gt=0, paid_amount__lt=F('billed_amount'))
+    # Insurer and status are lookup keys, so this groups by integers; every
+    # claim of an insurer has the same is_test_insurer
+    groups = claims.annotate(month=TruncMonth('discharge_date')).values(
+        'month', 'insurer', 'status', 'is_test_insurer'
+    ).annotate(
+        claim_count=Count('id'),
+        billed_total=Sum('billed_amount'),
+        paid_total=Sum('paid_amount'),
+        underpaid_count=Count('id', filter=underpaid),
+        underpayment_total=Sum(F('billed_amount') - F('paid_amount'), filter=underpaid),
+    ).order_by()
+
+    rows = [
+        ClaimRollup(
+            month=group['month'],
+            insurer_id=group['insurer'],
+            status_id=group['status'],
+            is_test_insurer=group['is_test_insurer'],
+            claim_count=group['claim_count'],
+            billed_total=group['billed_total'] or 0,
+            paid_total=group['paid_total'] or 0,
+            underpaid_count=group['underpaid_count'],
+            underpayment_total=group['underpayment_total'] or 0,
+        )
+        for group in groups
+    ]
+
+    # Readers see either the old or the new rollups, never a mix
+    with transaction.atomic(using=using):
+        rollups.delete()
+        ClaimRollup.objects.using(using).bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def analytics_rollups():
+    """Rollups of the real insurers, for the analytics views"""
+    return ClaimRollup.objects.filter(is_test_insurer=False)
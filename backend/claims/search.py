@@ -0,0 +1,211 @@
+"""
+Indexed search for the claim, claim detail, note and flag lists.
+
+Every list searches through ``search(queryset, query)``. It keeps the
+substring matching the views had with ``icontains``, but the matches come
+from an index instead of a scan of the table:
+
+* On SQLite each searched table has an FTS5 index using the trigram
+  tokenizer, with the row's primary key as its rowid. Any substring of
+  three or more characters is then an index lookup. The indexes are filled
+  when a feed is loaded (see claims.signals) and kept in step on every
+  note and flag write, and on claims and details saved outside a load. Insurers and denial reasons are indexed by name,
+  read from their lookup tables (see claims.lookups).
+* On PostgreSQL the searched columns have pg_trgm GIN indexes on the
+  expressions ``icontains`` compiles to, so the lookups themselves become
+  index scans and there is nothing to keep in sync.
+
+Claims and details are ranked, by bm25 on SQLite and by trigram similarity
+on PostgreSQL. Notes and flags match on their own text or on their claim's
+id and patient name, and keep their newest-first order. Queries shorter
+than a trigram, and other databases, fall back to ``icontains``.
+"""
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import F, FloatField, Func, Q, TextField, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast, Greatest
+
+from .lookups import is_lookup
+from .models import ClaimDetail, ClaimFlag, ClaimList, ClaimNote
+
+# The trigram tokenizer cannot match anything shorter
+MIN_INDEXED_LENGTH = 3
+
+# Rows re-indexed per statement, below SQLite's bound parameter limit
+UPDATE_CHUNK_SIZE = 500
+
+# Order of ranked results
+RANKED_ORDERING = ('search_rank', 'pk')
+
+
+class SearchIndex:
+    """Substring index over some text columns of a model's table"""
+
+    def __init__(self, model, columns):
+        self.model = model
+        self.columns = columns
+
+    @property
+    def table(self):
+        return f'{self.model._meta.db_table}_search'
+
+    def lookups(self, columns=None):
+        """
+        The ORM lookup path of each column, following foreign keys to their
+        key, or to the name for lookup tables (see claims.lookups)
+        """
+        paths = []
+        for column in columns or self.columns:
+            field = self.model._meta.get_field(column)
+            if is_lookup(field):
+                paths.append(f'{field.name}__name')
+            elif field.is_relation:
+                paths.append(f'{field.name}__{field.target_field.name}')
+            else:
+                paths.append(field.name)
+        return paths
+
+    def expressions(self, using=DEFAULT_DB_ALIAS):
+        """The SQL each column is indexed from, selecting a lookup table's names"""
+        quote = connections[using].ops.quote_name
+        table = quote(self.model._meta.db_table)
+        expressions = []
+        for column in self.columns:
+            field = self.model._meta.get_field(column)
+            if is_lookup(field):
+                target = field.related_model._meta
+                expressions.append(
+                    f'(SELECT {quote("name")} FROM {quote(target.db_table)} '
+                    f'WHERE {quote(target.pk.column)} = {table}.{quote(field.column)})'
+                )
+            else:
+                expressions.append(f'{table}.{quote(field.column)}')
+        return expressions
+
+    def uses_fts(self, query, using=DEFAULT_DB_ALIAS):
+        return connections[using].vendor == 'sqlite' and len(query) >= MIN_INDEXED_LENGTH
+
+    def fts_query(self, query, columns=None):
+        """An FTS5 query for ``query`` as a substring of ``columns`` (default: all)"""
+        phrase = '"' + query.replace('"', '""') + '"'
+        if columns:
+            return '{' + ' '.join(columns) + '} : ' + phrase
+        return phrase
+
+    def matching(self, query, columns=None, using=DEFAULT_DB_ALIAS):
+        """A Q for the rows with ``query`` in any of ``columns``"""
+        if self.uses_fts(query, using):
+            return Q(pk__in=RawSQL(
+                f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s',
+                [self.fts_query(query, columns)],
+            ))
+        match = Q()
+        for path in self.lookups(columns):
+            match |= Q(**{f'{path}__icontains': query})
+        return match
+
+    def ranked(self, queryset, query):
+        """
+        Filter ``queryset`` to matching rows, annotated with a ``search_rank``
+        that is lower for better matches and ordered by RANKED_ORDERING.
+        """
+        using = queryset.db
+        if self.uses_fts(query, using):
+            quote = connections[using].ops.quote_name
+            queryset = queryset.extra(
+                tables=[self.table],
+                where=[
+                    f'{self.table}.rowid = {quote(self.model._meta.db_table)}.{quote(self.model._meta.pk.column)}',
+                    f'{self.table} MATCH %s',
+                ],
+                params=[self.fts_query(query)],
+            )
+            # bm25 scores, as FTS5 reports them, are negative and lower is better
+            rank = RawSQL(f'{self.table}.rank', [], output_field=FloatField())
+        else:
+            queryset = queryset.filter(self.matching(query, using=using))
+            if connections[using].vendor == 'postgresql':
+                similarities = [
+                    Func(Cast(F(path), TextField()), Value(query), function='similarity',
+                         output_field=FloatField())
+                    for path in self.lookups()
+                ]
+                rank = -Greatest(*similarities) if len(similarities) > 1 else -similarities[0]
+            else:
+                rank = Value(0.0, output_field=FloatField())
+        return queryset.annotate(search_rank=rank).order_by(*RANKED_ORDERING)
+
+    def rebuild(self, using=DEFAULT_DB_ALIAS):
+        """Re-index every row"""
+        if connections[using].vendor != 'sqlite':
+            return
+        with transaction.atomic(using=using):
+            with connections[using].cursor() as cursor:
+                cursor.execute(f'DELETE FROM {self.table}')
+                cursor.execute(self._insert_sql(using))
+
+    def update(self, pks, using=DEFAULT_DB_ALIAS):
+        """Re-index the rows with these primary keys, dropping those that no longer exist"""
+        if connections[using].vendor != 'sqlite':
+            return
+        pks = list(pks)
+        with transaction.atomic(using=using):
+            with connections[using].cursor() as cursor:
+                for start in range(0, len(pks), UPDATE_CHUNK_SIZE):
+                    chunk = pks[start:start + UPDATE_CHUNK_SIZE]
+                    placeholders = ', '.join(['%s'] * len(chunk))
+                    cursor.execute(f'DELETE FROM {self.table} WHERE rowid IN ({placeholders})', chunk)
+                    cursor.execute(self._insert_sql(using, f'IN ({placeholders})'), chunk)
+
+    def _insert_sql(self, using, pk_condition=None):
+        quote = connections[using].ops.quote_name
+        pk = quote(self.model._meta.pk.column)
+        columns = ', '.join(quote(column) for column in self.columns)
+        sql = (
+            f'INSERT INTO {self.table} (rowid, {columns}) '
+            f'SELECT {pk}, {", ".join(self.expressions(using))} FROM {quote(self.model._meta.db_table)}'
+        )
+        if pk_condition:
+            sql += f' WHERE {pk} {pk_condition}'
+        return sql
+
+
+CLAIM_INDEX = SearchIndex(ClaimList, ['id', 'patient_name', 'insurer'])
+DETAIL_INDEX = SearchIndex(ClaimDetail, ['id', 'claim_id', 'denial_reason', 'cpt_codes'])
+NOTE_INDEX = SearchIndex(ClaimNote, ['note'])
+FLAG_INDEX = SearchIndex(ClaimFlag, ['reason'])
+
+INDEXES = {index.model: index for index in (CLAIM_INDEX, DETAIL_INDEX, NOTE_INDEX, FLAG_INDEX)}
+
+# Claim columns that notes and flags can also be found by
+CLAIM_REFERENCE_COLUMNS = ['id', 'patient_name']
+
+
+def search(queryset, query):
+    """
+    Filter a queryset of claims, claim details, notes or flags to the rows
+    matching ``query``. Claims and details come back best match first.
+    """
+    model = queryset.model
+    if model in (ClaimList, ClaimDetail):
+        return INDEXES[model].ranked(queryset, query)
+
+    using = queryset.db
+    by_claim = ClaimList.objects.using(using).filter(
+        CLAIM_INDEX.matching(query, CLAIM_REFERENCE_COLUMNS, using=using)
+    ).values('pk')
+    match = INDEXES[model].matching(query, using=using) | Q(claim__in=by_claim)
+    if model is ClaimNote:
+        match |= Q(user__username__icontains=query)
+    return queryset.filter(match)
+
+
+def refresh_search(model, pks=None, using=DEFAULT_DB_ALIAS):
+    """Re-index the rows of ``model`` with these primary keys, or all of them"""
+    index = INDEXES.get(model)
+    if index is None:
+        return
+    if pks is None:
+        index.rebuild(using=using)
+    else:
+        index.update(pks, using=using)
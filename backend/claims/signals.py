@@ -0,0 +1,127 @@
+"""
+Signals for keeping derived data in step with the claims tables.
+
+``feed_loaded`` is sent by ``ingestion.load_feed`` after every feed has
+been written, whatever the load mode, with ``sender`` set to the model and
+``stats``, ``mode``, ``using`` and ``changes`` as keyword arguments.
+``changes`` is the DiffWriter's list of ``(old, new)`` values for an
+incremental load, or None when the whole table may have changed. Anything
+derived from the claims data hooks in here instead of into each loader.
+
+Claims and details saved or deleted one at a time, as the admin does, get
+the same refresh for just their rows from the post_save and post_delete
+receivers below. A feed load holds those back with ``writing_feed()``, as
+its rows are refreshed together once ``feed_loaded`` is sent.
+"""
+import threading
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import Signal, receiver
+
+from .cpt import refresh_cpt_codes
+from .models import ClaimDetail, ClaimFlag, ClaimList, ClaimNote
+from .rollups import month_of, refresh_rollups, touched_months
+from .search import refresh_search
+from .state import (
+    CLAIM_FLAGS_VERSION_KEY, CLAIM_NOTES_VERSION_KEY, DATA_VERSION_KEY, FLAGS_VERSION_KEY, NOTES_VERSION_KEY,
+    bump,
+)
+
+feed_loaded = Signal()
+
+_feed = threading.local()
+
+
+@contextmanager
+def writing_feed():
+    """Hold back this thread's per-row claim and detail receivers"""
+    writing = getattr(_feed, 'writing', False)
+    _feed.writing = True
+    try:
+        yield
+    finally:
+        _feed.writing = writing
+
+
+def is_writing_feed():
+    return getattr(_feed, 'writing', False)
+
+
+def stored_months(model, pk, using):
+    """The discharge month a claim has in the database, as a set"""
+    dates = model._default_manager.using(using).filter(pk=pk).values_list('discharge_date', flat=True)
+    return {month_of(value) for value in dates}
+
+
+@receiver(feed_loaded)
+def claims_data_changed(sender, changes=None, using=DEFAULT_DB_ALIAS, **kwargs):
+    """Bring derived tables up to date, then mark everything cached as stale"""
+    # Derived tables first, so nothing is cached under the new version
+    # from the old rollups
+    if sender is ClaimList:
+        refresh_rollups(None if changes is None else touched_months(changes), using=using)
+    pks = None if changes is None else {(new or old)['pk'] for old, new in changes}
+    if sender is ClaimDetail:
+        refresh_cpt_codes(pks, using=using)
+    refresh_search(sender, pks, using=using)
+    bump(DATA_VERSION_KEY)
+
+
+@receiver(pre_save, sender=ClaimList)
+@receiver(pre_delete, sender=ClaimList)
+def remember_claim_month(sender, instance, using=DEFAULT_DB_ALIAS, **kwargs):
+    """Note the month a claim is leaving, whose rollups change too"""
+    if not is_writing_feed():
+        instance._rollup_months = stored_months(sender, instance.pk, using)
+
+
+@receiver(post_save, sender=ClaimList)
+@receiver(post_delete, sender=ClaimList)
+def claim_changed(sender, instance, using=DEFAULT_DB_ALIAS, **kwargs):
+    """Refresh the rollups and index entry of a claim saved or deleted outside a load"""
+    if is_writing_feed():
+        return
+    months = getattr(instance, '_rollup_months', set()) | stored_months(sender, instance.pk, using)
+    refresh_rollups(months, using=using)
+    refresh_search(sender, [instance.pk], using=using)
+    bump(DATA_VERSION_KEY)
+
+
+@receiver(post_save, sender=ClaimDetail)
+@receiver(post_delete, sender=ClaimDetail)
+def detail_changed(sender, instance, using=DEFAULT_DB_ALIAS, **kwargs):
+    """Refresh the CPT codes and index entry of a detail saved or deleted outside a load"""
+    if is_writing_feed():
+        return
+    refresh_cpt_codes([instance.pk], using=using)
+    refresh_search(sender, [instance.pk], using=using)
+    bump(DATA_VERSION_KEY)
+
+
+@receiver(post_save, sender=ClaimFlag)
+@receiver(post_delete, sender=ClaimFlag)
+@receiver(post_save, sender=ClaimNote)
+@receiver(post_delete, sender=ClaimNote)
+def reindex_for_search(sender, instance, using=DEFAULT_DB_ALIAS, **kwargs):
+    """Keep a note's or flag's search index entry in step with it"""
+    # Connected before the version bumps below, so nothing is cached under
+    # a new version from the old index
+    refresh_search(sender, [instance.pk], using=using)
+
+
+@receiver(post_save, sender=ClaimFlag)
+@receiver(post_delete, sender=ClaimFlag)
+def bump_flags_version(sender, instance, **kwargs):
+    """Mark everything cached for the previous flags as stale"""
+    bump(FLAGS_VERSION_KEY)
+    bump(CLAIM_FLAGS_VERSION_KEY.format(instance.claim_id))
+
+
+@receiver(post_save, sender=ClaimNote)
+@receiver(post_delete, sender=ClaimNote)
+def bump_notes_version(sender, instance, **kwargs):
+    """Mark everything cached for the previous notes as stale"""
+    bump(NOTES_VERSION_KEY)
+    bump(CLAIM_NOTES_VERSION_KEY.format(instance.claim_id))
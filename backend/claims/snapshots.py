@@ -0,0 +1,214 @@
+"""
+Columnar snapshots of the claims tables.
+
+Analytics re-reading the data as CSV spend most of their time parsing
+text. A snapshot writes claim_list, claim_detail, the flags and the notes
+as Parquet files instead: amounts as decimals, dates and timestamps as
+such, the low-cardinality text columns (status, insurer, denial reason,
+usernames) dictionary-encoded, and zstd-compressed row groups.
+
+Rows are read with ``iterator()`` and written a row group at a time, so a
+snapshot of any size runs in the memory of one row group. The claim list
+and detail files are named like the feeds (``claim_list_data.parquet``)
+and load back through ``ingestion.ParquetSource``, e.g. with
+``load_claims_data --format parquet --data-dir <snapshot>``.
+
+Only the claims are loaded back. Flags and notes have no feed, and a
+full (replace) load deletes them along with the claims, so
+``load_claims_data --format parquet`` refuses one while any exist:
+``--swap`` and ``--incremental`` keep those of the claims that remain.
+
+pyarrow is in requirements.txt, but only snapshots import it:
+``load_pyarrow`` raises ImproperlyConfigured where it is not installed,
+and the rest of the app runs without it.
+"""
+from pathlib import Path
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS
+
+from .models import ClaimDetail, ClaimFlag, ClaimList, ClaimNote
+
+ROW_GROUP_SIZE = 64 * 1024
+COMPRESSION = 'zstd'
+SNAPSHOT_EXTENSION = '.parquet'
+
+
+def load_pyarrow():
+    """Return the ``pyarrow`` and ``pyarrow.parquet`` modules"""
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImproperlyConfigured('Parquet snapshots need pyarrow: pip install pyarrow') from e
+    return pyarrow, pyarrow.parquet
+
+
+class SnapshotTable:
+    """
+    The columns of one table in a snapshot. Each column is
+    ``(name, lookup, kind)``, where ``lookup`` is the ORM path its values
+    are read from and ``kind`` is one of ``int``, ``decimal``, ``date``,
+    ``datetime``, ``bool``, ``text`` or ``category`` (dictionary-encoded
+    text).
+    """
+
+    def __init__(self, name, model, filename, columns):
+        self.name = name
+        self.model = model
+        self.filename = filename
+        self.columns = columns
+
+    def arrow_type(self, pa, lookup, kind):
+        if kind == 'int':
+            return pa.int64()
+        if kind == 'decimal':
+            field = self.model._meta.get_field(lookup)
+            return pa.decimal128(field.max_digits, field.decimal_places)
+        if kind == 'date':
+            return pa.date32()
+        if kind == 'datetime':
+            return pa.timestamp('us', tz='UTC')
+        if kind == 'bool':
+            return pa.bool_()
+        if kind == 'category':
+            return pa.dictionary(pa.int32(), pa.string())
+        return pa.string()
+
+    def arrow_schema(self, pa):
+        return pa.schema([
+            (name, self.arrow_type(pa, lookup, kind)) for name, lookup, kind in self.columns
+        ])
+
+    def rows(self, using=DEFAULT_DB_ALIAS):
+        lookups = [lookup for _, lookup, _ in self.columns]
+        return self.model.objects.using(using).values_list(*lookups).order_by('pk')
+
+    def write(self, sink, row_group_size=ROW_GROUP_SIZE, using=DEFAULT_DB_ALIAS):
+        """
+        Write the table to ``sink`` (a path or a writable file object) as
+        Parquet, yielding the number of rows written after each row group
+        """
+        pa, parquet = load_pyarrow()
+        schema = self.arrow_schema(pa)
+        categories = [name for name, _, kind in self.columns if kind == 'category']
+        writer = parquet.ParquetWriter(sink, schema, compression=COMPRESSION, use_dictionary=categories)
+        written = 0
+        try:
+            batch = []
+            for row in self.rows(using).iterator(chunk_size=row_group_size):
+                batch.append(row)
+                if len(batch) == row_group_size:
+                    writer.write_batch(self.record_batch(pa, schema, batch))
+                    written += len(batch)
+                    batch = []
+                    yield written
+            if batch:
+                writer.write_batch(self.record_batch(pa, schema, batch))
+                written += len(batch)
+        finally:
+            writer.close()
+        yield written
+
+    def record_batch(self, pa, schema, rows):
+        columns = list(zip(*rows)) if rows else [[] for _ in self.columns]
+        return pa.RecordBatch.from_arrays(
+            [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+            schema=schema,
+        )
+
+
+SNAPSHOT_TABLES = {table.name: table for table in [
+    SnapshotTable('claim_list', ClaimList, 'claim_list_data', [
+        ('id', 'id', 'int'),
+        ('patient_name', 'patient_name', 'text'),
+        ('billed_amount', 'billed_amount', 'decimal'),
+        ('paid_amount', 'paid_amount', 'decimal'),
+        ('status', 'status__name', 'category'),
+        ('insurer_name', 'insurer__name', 'category'),
+        ('discharge_date', 'discharge_date', 'date'),
+        ('is_test_insurer', 'is_test_insurer', 'bool'),
+    ]),
+    SnapshotTable('claim_detail', ClaimDetail, 'claim_detail_data', [
+        ('id', 'id', 'int'),
+        ('claim_id', 'claim_id', 'int'),
+        ('denial_reason', 'denial_reason__name', 'category'),
+        ('cpt_codes', 'cpt_codes', 'text'),
+    ]),
+    SnapshotTable('claim_flag', ClaimFlag, 'claim_flag_data', [
+        ('id', 'id', 'int'),
+        ('claim_id', 'claim_id', 'int'),
+        ('user', 'user__username', 'category'),
+        ('flagged_at', 'flagged_at', 'datetime'),
+        ('reason', 'reason', 'text'),
+        ('is_resolved', 'is_resolved', 'bool'),
+        ('resolved_at', 'resolved_at', 'datetime'),
+        ('resolved_by', 'resolved_by__username', 'category'),
+    ]),
+    SnapshotTable('claim_note', ClaimNote, 'claim_note_data', [
+        ('id', 'id', 'int'),
+        ('claim_id', 'claim_id', 'int'),
+        ('user', 'user__username', 'category'),
+        ('note', 'note', 'text'),
+        ('created_at', 'created_at', 'datetime'),
+        ('updated_at', 'updated_at', 'datetime'),
+    ]),
+]}
+
+
+class ChunkSink:
+    """Write-only file object whose contents are taken a chunk at a time"""
+
+    closed = False
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def iter_parquet(table, row_group_size=ROW_GROUP_SIZE, using=DEFAULT_DB_ALIAS):
+    """Yield a table's Parquet file in pieces, one row group at a time"""
+    sink = ChunkSink()
+    for _ in table.write(sink, row_group_size=row_group_size, using=using):
+        yield sink.drain()
+
+
+def write_snapshot(directory, names=None, row_group_size=ROW_GROUP_SIZE, using=DEFAULT_DB_ALIAS):
+    """
+    Write the snapshot files of the tables ``names`` (default: all) into
+    ``directory``. Returns ``{name: (path, rows)}``.
+    """
+    load_pyarrow()
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    written = {}
+    for name in names or SNAPSHOT_TABLES:
+        table = SNAPSHOT_TABLES[name]
+        path = directory / f'{table.filename}{SNAPSHOT_EXTENSION}'
+        # Written under a temporary name so a reader never sees half a file
+        partial = path.with_name(path.name + '.partial')
+        rows = 0
+        for rows in table.write(str(partial), row_group_size=row_group_size, using=using):
+            pass
+        partial.replace(path)
+        written[name] = (path, rows)
+    return written
@@ -0,0 +1,112 @@
+"""
+Cluster-wide state shared by every web worker and management command.
+
+Values live in the MonitorState table rather than the per-process cache,
+and each carries a version. ``compare_and_set`` only writes when the
+version is still the one that was read, so when several workers notice the
+same change exactly one of them records it (and acts on it).
+"""
+import hashlib
+
+from django.core.exceptions import EmptyResultSet
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import MonitorState
+
+LAST_RELOAD_KEY = 'last_data_reload'
+
+# Keys whose version changes whenever the claims data, the flags or the
+# notes change, for keying caches of anything derived from them
+DATA_VERSION_KEY = 'data_version'
+FLAGS_VERSION_KEY = 'flags_version'
+NOTES_VERSION_KEY = 'notes_version'
+
+# Per-claim versions of the flags and notes, formatted with the claim id,
+# for caching one claim's fragments (see claims.claim_view)
+CLAIM_FLAGS_VERSION_KEY = 'flags_version:{}'
+CLAIM_NOTES_VERSION_KEY = 'notes_version:{}'
+
+
+def get_state(key, default=None):
+    """Return ``(value, version)`` for a key; the version of a missing key is 0"""
+    row = MonitorState.objects.filter(key=key).values_list('value', 'version').first()
+    if row is None:
+        return default, 0
+    return row
+
+
+def get_states(*keys):
+    """Return ``{key: (value, version)}`` for several keys in one query"""
+    states = {key: (None, 0) for key in keys}
+    for key, value, version in MonitorState.objects.filter(key__in=keys).values_list('key', 'value', 'version'):
+        states[key] = (value, version)
+    return states
+
+
+def compare_and_set(key, value, version):
+    """
+    Store ``value`` if the key is still at ``version`` (0 meaning it does not
+    exist yet) and return whether it was stored.
+    """
+    if version == 0:
+        try:
+            with transaction.atomic():
+                MonitorState.objects.create(key=key, value=value)
+        except IntegrityError:
+            return False
+        return True
+
+    updated = MonitorState.objects.filter(key=key, version=version).update(
+        value=value, version=F('version') + 1, updated_at=timezone.now()
+    )
+    return updated == 1
+
+
+def set_state(key, value):
+    """Store ``value`` whatever its current version"""
+    while True:
+        _, version = get_state(key)
+        if compare_and_set(key, value, version):
+            return
+
+
+def bump(key):
+    """Move a key to a new version, recording when it moved"""
+    set_state(key, timezone.now().isoformat())
+
+
+def cache_versions():
+    """The data, flag and note versions as one string, for cache keys"""
+    states = get_states(DATA_VERSION_KEY, FLAGS_VERSION_KEY, NOTES_VERSION_KEY)
+    return ':'.join(str(version) for _, version in states.values())
+
+
+def queryset_cache_key(prefix, queryset):
+    """
+    Cache key for something derived from ``queryset``, which changes with
+    the query and whenever the claims data, flags or notes change
+    """
+    try:
+        sql, params = queryset.query.sql_with_params()
+    except EmptyResultSet:
+        # The query matches nothing, whatever else it says
+        sql, params = '', ()
+    digest = hashlib.md5(f'{sql}:{params}'.encode()).hexdigest()
+    return f'{prefix}:{cache_versions()}:{digest}'
+
+
+def data_version():
+    """A number that goes up whenever the claims data changes"""
+    return get_state(DATA_VERSION_KEY)[1]
+
+
+def record_reload(when=None):
+    """Record when the claims data was last reloaded"""
+    set_state(LAST_RELOAD_KEY, (when or timezone.now()).isoformat())
+
+
+def last_reload():
+    """When the claims data was last reloaded, as an ISO string, or None"""
+    return get_state(LAST_RELOAD_KEY)[0]
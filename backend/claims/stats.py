@@ -0,0 +1,97 @@
+"""
+Dashboard statistics.
+
+The claim metrics come from one grouped pass over the analytics rollups
+(see claims.rollups): grouping by status and insurer keys yields the
+per-group counts and amounts, from which the totals and both breakdowns
+are summed in Python and named from the lookup tables. Flag counts are one conditional aggregate over claim_flag.
+
+The result is cached under the current data and flag versions (see
+claims.state), which move on every reload and every flag change, so the
+dashboard costs one small version lookup per request until something
+changes.
+"""
+from collections import Counter
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import Count, Q, Sum
+
+from .lookups import lookup_names
+from .models import ClaimFlag, ClaimList, ClaimStatus, Insurer
+from .rollups import analytics_rollups
+from .state import DATA_VERSION_KEY, FLAGS_VERSION_KEY, get_states
+
+DASHBOARD_CACHE_TIMEOUT = 3600
+RECENT_CLAIMS = 10
+
+
+def dashboard_cache_key():
+    """Cache key for the statistics of the current data and flags"""
+    states = get_states(DATA_VERSION_KEY, FLAGS_VERSION_KEY)
+    return f'dashboard_stats:{states[DATA_VERSION_KEY][1]}:{states[FLAGS_VERSION_KEY][1]}'
+
+
+def dashboard_stats():
+    """Dashboard statistics, computed at most once per data and flag version"""
+    key = dashboard_cache_key()
+    stats = cache.get(key)
+    if stats is None:
+        stats = compute_dashboard_stats()
+        cache.set(key, stats, DASHBOARD_CACHE_TIMEOUT)
+    return stats
+
+
+def compute_dashboard_stats():
+    """Compute the dashboard statistics (excluding test insurers) from the database"""
+    claims = ClaimList.objects.filter(is_test_insurer=False)
+    groups = analytics_rollups().values('status', 'insurer').annotate(
+        count=Sum('claim_count'),
+        billed=Sum('billed_total'),
+        paid=Sum('paid_total'),
+        underpaid_count=Sum('underpaid_count'),
+        underpayment=Sum('underpayment_total'),
+    ).order_by()
+
+    total_claims = 0
+    total_billed = Decimal(0)
+    total_paid = Decimal(0)
+    underpaid_count = 0
+    underpayment = Decimal(0)
+    by_status = Counter()
+    by_insurer = Counter()
+    for group in groups:
+        total_claims += group['count']
+        total_billed += group['billed'] or 0
+        total_paid += group['paid'] or 0
+        underpaid_count += group['underpaid_count']
+        underpayment += group['underpayment'] or 0
+        by_status[group['status']] += group['count']
+        by_insurer[group['insurer']] += group['count']
+
+    flags = ClaimFlag.objects.aggregate(
+        total_flagged=Count('id', filter=Q(is_resolved=False)),
+        resolved_flags=Count('id', filter=Q(is_resolved=True)),
+    )
+
+    def breakdown(counts, field, model):
+        names = lookup_names(model, counts)
+        # Largest first, then by name so ties keep a stable order
+        named = [(names.get(key), count) for key, count in counts.items()]
+        ordered = sorted(named, key=lambda item: (-item[1], item[0] or ''))
+        return [{field: name, 'count': count} for name, count in ordered]
+
+    return {
+        'total_claims': total_claims,
+        'total_billed': total_billed,
+        'total_paid': total_paid,
+        'average_claim': total_billed / total_claims if total_claims > 0 else 0,
+        'total_flagged': flags['total_flagged'],
+        'resolved_flags': flags['resolved_flags'],
+        'avg_underpayment': underpayment / underpaid_count if underpaid_count > 0 else 0,
+        'claims_by_status': breakdown(by_status, 'status', ClaimStatus),
+        'claims_by_insurer': breakdown(by_insurer, 'insurer_name', Insurer),
+        'recent_claims': list(
+            claims.select_related('status', 'insurer').order_by('-discharge_date')[:RECENT_CLAIMS]
+        ),
+    }
@@ -0,0 +1,42 @@
+"""
+Streamed downloads that stay streamed under ASGI.
+
+The exports are StreamingHttpResponses over sync generators that read the
+database a chunk at a time. Under WSGI Django sends each chunk as it is
+produced, but under ASGI Django 4.2 reads a sync iterator with
+``sync_to_async(list)`` before sending anything, so the whole download
+would be built in memory first. ``streaming_response`` therefore hands an
+ASGI request an async iterator instead, which pulls one chunk at a time
+through ``sync_to_async``, like the events stream in claims.views. Every
+chunk is produced in the same thread, so a server-side cursor stays
+usable across them.
+"""
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+
+_DONE = object()
+
+
+async def iterate_async(chunks):
+    """Yield the items of a sync iterator, fetching each through sync_to_async"""
+    chunks = iter(chunks)
+    next_chunk = sync_to_async(next)
+    try:
+        while True:
+            chunk = await next_chunk(chunks, _DONE)
+            if chunk is _DONE:
+                return
+            yield chunk
+    finally:
+        # Release the cursor when the client disconnects early
+        close = getattr(chunks, 'close', None)
+        if close is not None:
+            await sync_to_async(close)()
+
+
+def streaming_response(request, chunks, **kwargs):
+    """A StreamingHttpResponse of ``chunks``, streamed under WSGI and ASGI alike"""
+    if isinstance(request, ASGIRequest):
+        chunks = iterate_async(chunks)
+    return StreamingHttpResponse(chunks, **kwargs)
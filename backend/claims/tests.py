@@ -1,9 +1,92 @@
-from django.test import TestCase
+import asyncio
+import csv
+import importlib.util
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import date
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock, skipUnless
+
+from asgiref.sync import async_to_sync
 from django.contrib.auth.models import User
-from django.core.exceptions import ValidationError
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import AsyncRequestFactory, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import views
+from .claim_view import claim_view_context
+from .cpt import MATCH_ALL, cpt_code_stats, cpt_filter, parse_cpt_query
+from .data_monitor import DataMonitor
+from .events import RECONNECT_MS, EventBroadcaster, collect_events
+from .export import export_lines, export_response
+from .facets import facet_counts
 from .forms import UserSignUpForm
+from .ingestion import (
+    CLAIM_DETAIL_SCHEMA, CLAIM_LIST_SCHEMA, CSVSource, DiffWriter, JSONSource, ParquetSource, Quarantine,
+    ShadowTable, batched, build_claim_list, bulk_load, byte_ranges, ingest, iter_csv_rows, iter_json_records,
+    load_feed, open_source,
+)
+from .jobs import STALE_AFTER, Heartbeat, claim_job, enqueue_reload, finish_job, is_stale, run_job
+from .live_search import coalesce, live_params, live_search, match_key
+from .models import (
+    ClaimDetail, ClaimDetailCPT, ClaimFlag, ClaimList, ClaimNote, ClaimRollup, ClaimStatus, DenialReason,
+    Insurer, ReloadJob, parse_cpt_codes,
+)
+from .pagination import KeysetPaginator
+from .rollups import refresh_rollups
+from .search import refresh_search, search
+from .snapshots import SNAPSHOT_TABLES, write_snapshot
+from .state import DATA_VERSION_KEY, cache_versions, compare_and_set, get_state, last_reload
+from .stats import compute_dashboard_stats, dashboard_stats
+from .watcher import InotifyWatcher, PollingWatcher, watch_changes
+
+
+class TempFileMixin:
+    """Feed files and directories that are removed after the test"""
+
+    # Written as the first line of each write_csv file, when set
+    header = None
+
+    def write_file(self, suffix, text):
+        handle, path = tempfile.mkstemp(suffix=suffix)
+        with os.fdopen(handle, 'w', encoding='utf-8') as f:
+            f.write(text)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def write_csv(self, lines):
+        if self.header:
+            lines = [self.header, *lines]
+        return self.write_file('.csv', '\n'.join(lines) + '\n')
+
+    def write_ndjson(self, records):
+        return self.write_file('.ndjson', ''.join(json.dumps(record) + '\n' for record in records))
+
+    def make_directory(self):
+        directory = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, directory)
+        return directory
+
+
+class CacheResetMixin:
+    """Starts and ends each test with an empty cache"""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.addCleanup(cache.clear)
 
-# Create your tests here.
 
 class UserSignUpFormTest(TestCase):
     """Test cases for UserSignUpForm"""
@@ -90,3 +173,1325 @@ class UserSignUpFormTest(TestCase):
         self.assertEqual(user.username, 'testuser')
         self.assertEqual(user.email, 'test@example.com')
         self.assertTrue(user.check_password('testpass123'))
+
+
+class StreamingIngestionTest(TempFileMixin, TestCase):
+    """Test cases for the batched CSV ingestion pipeline"""
+
+    def test_batched_yields_fixed_size_chunks(self):
+        """Test that batched splits an iterable into bounded lists"""
+        self.assertEqual(list(batched(range(5), 2)), [[0, 1], [2, 3], [4]])
+
+    def test_ingest_loads_rows_in_batches(self):
+        """Test that every valid row is inserted and batches are reported"""
+        path = self.write_csv([
+            'id|patient_name|billed_amount|paid_amount|status|insurer_name|discharge_date',
+            '1|Ann|100.00|50.00|Paid|Aetna|2024-01-02',
+            '2|Bob|200.00||Denied|Cigna|',
+            '3|Cal|bad|10|Paid|Aetna|not-a-date',
+        ])
+        batches = []
+        stats = ingest(iter_csv_rows(path), build_claim_list, ClaimList,
+                       batch_size=2, on_batch=lambda s: batches.append(s.rows_loaded))
+
+        self.assertEqual(stats.rows_loaded, 3)
+        self.assertEqual(batches, [2, 3])
+        self.assertEqual(ClaimList.objects.count(), 3)
+        self.assertIsNone(ClaimList.objects.get(id=3).billed_amount)
+        self.assertIsNone(ClaimList.objects.get(id=3).discharge_date)
+
+    def test_ingest_skips_rows_that_fail_to_build(self):
+        """Test that rows with an invalid id are reported and skipped"""
+        path = self.write_csv([
+            'id|patient_name|billed_amount|paid_amount|status|insurer_name|discharge_date',
+            'abc|Ann|1|1|Paid|Aetna|2024-01-02',
+            '2|Bob|1|1|Paid|Aetna|2024-01-02',
+        ])
+        errors = []
+        stats = ingest(iter_csv_rows(path), build_claim_list, ClaimList,
+                       on_error=lambda line, row, e: errors.append(line))
+
+        self.assertEqual(stats.rows_skipped, 1)
+        self.assertEqual(errors, [1])
+        self.assertEqual(list(ClaimList.objects.values_list('id', flat=True)), [2])
+
+    def test_bulk_load_inserts_coerced_rows(self):
+        """Test that the backend fast path loads typed values and rejects bad keys"""
+        path = self.write_csv([
+            'id|patient_name|billed_amount|paid_amount|status|insurer_name|discharge_date',
+            '1|Ann|100.50|50|Paid|Aetna|2024-01-02',
+            'x|Bob|1|1|Paid|Aetna|2024-01-02',
+            '3|Cal|bad||Denied||2024-02-30',
+        ])
+        stats = bulk_load(CSVSource(path), CLAIM_LIST_SCHEMA, batch_size=1)
+
+        self.assertEqual((stats.rows_read, stats.rows_loaded, stats.rows_skipped), (3, 2, 1))
+        ann = ClaimList.objects.get(id=1)
+        self.assertEqual(str(ann.billed_amount), '100.50')
+        self.assertEqual(ann.discharge_date.isoformat(), '2024-01-02')
+        cal = ClaimList.objects.get(id=3)
+        self.assertIsNone(cal.billed_amount)
+        self.assertIsNone(cal.discharge_date)
+        self.assertIsNone(cal.insurer)
+
+    def test_byte_ranges_split_on_line_boundaries(self):
+        """Test that every range holds whole lines and the ranges cover the body"""
+        lines = ['id|patient_name'] + [f'{i}|Patient {i}' for i in range(1, 200)]
+        path = self.write_csv(lines)
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        ranges = list(byte_ranges(path, 100))
+        self.assertGreater(len(ranges), 1)
+        self.assertEqual(ranges[0][0], len(lines[0]) + 1)
+        self.assertEqual(ranges[-1][1], len(data))
+        for (start, end), (next_start, _) in zip(ranges, ranges[1:]):
+            self.assertEqual(end, next_start)
+            self.assertEqual(data[end - 1:end], b'\n')
+
+    def test_pooled_load_writes_rows_in_file_order(self):
+        """Test that ranges parsed by a pool are all written and errors keep their line"""
+        lines = ['id|patient_name|billed_amount|paid_amount|status|insurer_name|discharge_date']
+        lines += [f'{i}|Patient {i}|10|5|Paid|Aetna|2024-01-02' for i in range(1, 3001)]
+        lines[1500] = 'oops|Broken|1|1|Paid|Aetna|2024-01-02'
+        path = self.write_csv(lines)
+        errors = []
+
+        with ThreadPoolExecutor(max_workers=3) as pool:
+            pool.workers = 3
+            stats = bulk_load(CSVSource(path), CLAIM_LIST_SCHEMA, pool=pool, batch_size=500,
+                              on_error=lambda line, row, e: errors.append(line))
+
+        self.assertEqual((stats.rows_read, stats.rows_loaded), (3000, 2999))
+        self.assertEqual(errors, [1500])
+        self.assertEqual(ClaimList.objects.count(), 2999)
+
+
+class ShadowTableSwapTest(TransactionTestCase):
+    """Test cases for staging a reload in a shadow table"""
+
+    def test_swap_replaces_rows_and_keeps_flags_on_surviving_claims(self):
+        """Test that the swap publishes the staged rows and prunes orphaned flags"""
+        user = User.objects.create_user(username='reviewer', password='testpass123')
+        kept = ClaimList.objects.create(id=1, patient_name='Old Ann')
+        dropped = ClaimList.objects.create(id=2, patient_name='Old Bob')
+        ClaimFlag.objects.create(claim=kept, user=user, flagged_at=timezone.now())
+        ClaimFlag.objects.create(claim=dropped, user=user, flagged_at=timezone.now())
+
+        shadow = ShadowTable(ClaimList)
+        shadow.create()
+        shadow.write([ClaimList(id=1, patient_name='New Ann'), ClaimList(id=3, patient_name='New Cal')])
+
+        # Nothing is visible until the swap
+        self.assertEqual(ClaimList.objects.get(id=1).patient_name, 'Old Ann')
+
+        shadow.swap()
+
+        self.assertEqual(sorted(ClaimList.objects.values_list('id', flat=True)), [1, 3])
+        self.assertEqual(ClaimList.objects.get(id=1).patient_name, 'New Ann')
+        self.assertEqual(list(ClaimFlag.objects.values_list('claim_id', flat=True)), [1])
+
+        # Foreign keys still point at the live table after the rename
+        ClaimFlag.objects.create(claim_id=3, user=user, flagged_at=timezone.now())
+        self.assertEqual(ClaimList.objects.get(id=3).flags.count(), 1)
+
+
+class DiffWriterTest(TestCase):
+    """Test cases for applying a feed as a delta"""
+
+    def test_only_changed_rows_are_written(self):
+        """Test that inserts, updates and deletes are derived from the diff"""
+        ClaimList.objects.create(id=1, patient_name='Ann', status=ClaimStatus.intern('Paid'), insurer=Insurer.intern('Aetna'))
+        ClaimList.objects.create(id=2, patient_name='Bob', status=ClaimStatus.intern('Paid'), insurer=Insurer.intern('Aetna'))
+        ClaimList.objects.create(id=3, patient_name='Cal', status=ClaimStatus.intern('Paid'), insurer=Insurer.intern('Aetna'))
+
+        writer = DiffWriter(ClaimList)
+        writer.begin()
+        writer.write([
+            ClaimList(id=1, patient_name='Ann', status=ClaimStatus.intern('Paid'), insurer=Insurer.intern('Aetna')),
+            ClaimList(id=2, patient_name='Bob', status=ClaimStatus.intern('Denied'), insurer=Insurer.intern('Aetna')),
+            ClaimList(id=4, patient_name='Dee', status=ClaimStatus.intern('Paid'), insurer=Insurer.intern('Cigna')),
+        ])
+        writer.finish()
+
+        self.assertEqual((writer.inserted, writer.updated, writer.deleted, writer.unchanged), (1, 1, 1, 1))
+        self.assertEqual(sorted(ClaimList.objects.values_list('id', flat=True)), [1, 2, 4])
+        self.assertEqual(ClaimList.objects.get(id=2).status.name, 'Denied')
+
+
+class LoadFeedTest(TempFileMixin, TestCase):
+    """Test cases for the shared load_feed entry point"""
+
+    def test_replace_mode_clears_existing_rows(self):
+        """Test that a replace load leaves only the rows of the feed"""
+        ClaimDetail.objects.create(id=99, claim_id=1)
+        path = self.write_csv(['id|claim_id|denial_reason|cpt_codes', '1|30001|Late filing|99204'])
+
+        stats = load_feed(CSVSource(path), CLAIM_DETAIL_SCHEMA)
+
+        self.assertEqual(stats.rows_loaded, 1)
+        self.assertEqual(list(ClaimDetail.objects.values_list('id', flat=True)), [1])
+
+    def test_append_mode_keeps_existing_rows(self):
+        """Test that an append load ignores keys that already exist"""
+        ClaimDetail.objects.create(id=1, claim_id=1, denial_reason=DenialReason.intern('Original'))
+        path = self.write_csv([
+            'id|claim_id|denial_reason|cpt_codes',
+            '1|30001|Replacement|99204',
+            '2|30002||',
+        ])
+
+        load_feed(CSVSource(path), CLAIM_DETAIL_SCHEMA, mode='append')
+
+        self.assertEqual(ClaimDetail.objects.count(), 2)
+        self.assertEqual(ClaimDetail.objects.get(id=1).denial_reason.name, 'Original')
+
+    def test_rejected_rows_are_quarantined(self):
+        """Test that rows failing coercion are written to the quarantine file"""
+        path = self.write_csv([
+            'id|claim_id|denial_reason|cpt_codes',
+            '1|30001|Late filing|99204',
+            '2|not-a-claim|Late filing|99204',
+        ])
+        directory = self.make_directory()
+
+        with Quarantine(directory, 'claim_detail') as quarantine:
+            stats = load_feed(CSVSource(path), CLAIM_DETAIL_SCHEMA, on_error=quarantine)
+
+        self.assertEqual((stats.rows_loaded, quarantine.count), (1, 1))
+        with quarantine.path.open(encoding='utf-8') as f:
+            rejected = list(csv.DictReader(f, delimiter='|'))
+        self.assertEqual(rejected[0]['row'], '2')
+        self.assertEqual(rejected[0]['claim_id'], 'not-a-claim')
+        self.assertIn('invalid literal', rejected[0]['error'])
+
+    def test_test_insurers_are_flagged_on_load(self):
+        """Test that every load mode derives is_test_insurer from the insurer name"""
+        path = self.write_csv([
+            'id|patient_name|billed_amount|paid_amount|status|insurer_name|discharge_date',
+            '1|Ann|100|50|Paid|Aetna|2024-01-02',
+            '2|Bob|100|50|Paid|ACME TEST Health|2024-01-02',
+            '3|Cal|100|50|Paid||2024-01-02',
+        ])
+
+        for mode in ('replace', 'incremental'):
+            load_feed(CSVSource(path), CLAIM_LIST_SCHEMA, mode=mode)
+            self.assertEqual(
+                list(ClaimList.objects.filter(is_test_insurer=True).values_list('id', flat=True)), [2]
+            )
+
+        ClaimList.objects.filter(id=2).update(is_test_insurer=False)
+        ClaimList.objects.get(id=2).save()
+        self.assertTrue(ClaimList.objects.get(id=2).is_test_insurer)
+
+    def test_unknown_mode_is_rejected(self):
+        """Test that load_feed refuses modes it does not implement"""
+        with self.assertRaises(ValueError):
+            load_feed(CSVSource('missing.csv'), CLAIM_DETAIL_SCHEMA, mode='merge')
+
+    def test_reload_command_parses_with_workers(self):
+        """Test that reload_claims_data hands a pool of --workers to its loads"""
+        @contextmanager
+        def thread_pool(workers):
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                pool.workers = workers
+                pools.append(pool)
+                yield pool
+
+        pools = []
+        path = self.write_csv(['id|patient_name|billed_amount|paid_amount|status|insurer_name|discharge_date'] +
+                              [f'{i}|Patient {i}|10|5|Paid|Aetna|2024-01-02' for i in range(1, 1001)])
+        with mock.patch('claims.management.commands.reload_claims_data.parser_pool', thread_pool):
+            call_command('reload_claims_data', claim_list=path, claim_detail=path + '.missing', workers=2,
+                         quarantine_dir=self.make_directory(), stdout=io.StringIO())
+
+        self.assertEqual([pool.workers for pool in pools], [2])
+        self.assertEqual(ClaimList.objects.count(), 1000)
+
+
+class JSONSourceTest(TempFileMixin, TestCase):
+    """Test cases for the incremental JSON and NDJSON reader"""
+
+    def test_array_is_decoded_across_small_reads(self):
+        """Test that objects split between reads are still decoded whole"""
+        path = self.write_file('.json', '[\n  {"id": 1, "billed_amount": 10.10},\n  {"id": 2, "note": "a, ]"}\n]\n')
+        records = list(iter_json_records(path, read_size=3))
+        self.assertEqual(records, [
+            {'id': '1', 'billed_amount': '10.10'},
+            {'id': '2', 'note': 'a, ]'},
+        ])
+
+    def test_ndjson_is_decoded_line_by_line(self):
+        """Test that newline-delimited objects are yielded in order"""
+        path = self.write_file('.ndjson', '{"id": 1}\n{"id": 2}\n\n{"id": 3}')
+        self.assertEqual([r['id'] for r in iter_json_records(path, read_size=4)], ['1', '2', '3'])
+
+    def test_truncated_file_raises(self):
+        """Test that an incomplete trailing object is reported, not dropped"""
+        path = self.write_file('.json', '[{"id": 1}, {"id": ')
+        with self.assertRaises(json.JSONDecodeError):
+            list(iter_json_records(path, read_size=4))
+
+    def test_json_feed_loads_with_exact_decimals(self):
+        """Test that a JSON feed loads through load_feed without float rounding"""
+        path = self.write_file('.json', json.dumps([
+            {'id': 1, 'patient_name': 'Ann', 'billed_amount': 639787.37, 'paid_amount': None,
+             'status': 'Paid', 'insurer_name': 'Aetna', 'discharge_date': '2022-12-19'},
+        ]))
+        source = open_source(path)
+        self.assertIsInstance(source, JSONSource)
+
+        stats = load_feed(source, CLAIM_LIST_SCHEMA)
+
+        self.assertEqual(stats.rows_loaded, 1)
+        claim = ClaimList.objects.get(id=1)
+        self.assertEqual(str(claim.billed_amount), '639787.37')
+        self.assertIsNone(claim.paid_amount)
+
+
+class ReloadJobTest(TempFileMixin, TestCase):
+    """Test cases for the background reload queue"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='reviewer', password='testpass123')
+        self.client.force_login(self.user)
+
+    def test_concurrent_requests_share_one_job(self):
+        """Test that a reload is only queued once while one is in flight"""
+        first, created = enqueue_reload(self.user)
+        second, joined = enqueue_reload()
+
+        self.assertTrue(created)
+        self.assertFalse(joined)
+        self.assertEqual(first.id, second.id)
+
+        finish_job(first, ReloadJob.SUCCEEDED)
+        third, created = enqueue_reload()
+        self.assertTrue(created)
+        self.assertNotEqual(third.id, first.id)
+
+    def test_job_is_claimed_once(self):
+        """Test that a queued job can only be claimed by one worker"""
+        job, _ = enqueue_reload()
+
+        self.assertEqual(claim_job().id, job.id)
+        self.assertIsNone(claim_job())
+        self.assertIsNone(claim_job(job))
+        self.assertEqual(ReloadJob.objects.get(id=job.id).status, ReloadJob.RUNNING)
+
+    def test_changes_during_a_run_queue_a_follow_up(self):
+        """Test that files changing under a running job get a reload of their own once it finishes"""
+        job = claim_job(enqueue_reload(mode='incremental')[0])
+        self.assertEqual(enqueue_reload(), (job, False))
+        finish_job(job, ReloadJob.SUCCEEDED)
+        self.assertFalse(ReloadJob.objects.filter(status=ReloadJob.QUEUED).exists())
+
+        job = claim_job(enqueue_reload(mode='incremental')[0])
+        self.assertEqual(enqueue_reload(follow_up=True), (job, False))
+        finish_job(job, ReloadJob.SUCCEEDED)
+        follow_up = ReloadJob.objects.get(status=ReloadJob.QUEUED)
+        self.assertEqual((follow_up.mode, follow_up.active_key), ('incremental', ReloadJob.ACTIVE_KEY))
+        self.assertTrue(job.follow_up)
+
+    def test_force_reload_returns_job_to_poll(self):
+        """Test that the force-reload API queues a job and the status API reports it"""
+        response = self.client.post(reverse('claims:api_force_reload'))
+        self.assertEqual(response.status_code, 202)
+        job_id = response.json()['job_id']
+
+        again = self.client.post(reverse('claims:api_force_reload')).json()
+        self.assertEqual(again['job_id'], job_id)
+        self.assertFalse(again['created'])
+
+        status = self.client.get(again['status_url']).json()
+        self.assertEqual((status['job_id'], status['status']), (job_id, ReloadJob.QUEUED))
+        self.assertEqual(self.client.get(reverse('claims:api_reload_job', args=[job_id + 1])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('claims:api_force_reload')).status_code, 405)
+
+
+class ReloadJobHeartbeatTest(TempFileMixin, TransactionTestCase):
+    """Test cases for the heartbeat thread that writes a running job's progress"""
+
+    def test_run_job_records_progress_and_counts(self):
+        """Test that running a job loads the feeds and reports its row counts"""
+        directory = self.make_directory()
+        with open(os.path.join(directory, 'claim_list_data.csv'), 'w', encoding='utf-8') as f:
+            f.write('id|patient_name|billed_amount|paid_amount|status|insurer_name|discharge_date\n')
+            f.write('30001|Ann|100.00|50.00|Paid|Aetna|2024-01-02\n')
+            f.write('bad|Bob|1|1|Paid|Aetna|2024-01-02\n')
+        with open(os.path.join(directory, 'claim_detail_data.csv'), 'w', encoding='utf-8') as f:
+            f.write('id|claim_id|denial_reason|cpt_codes\n1|30001||99204\n')
+
+        job = claim_job(enqueue_reload(mode='incremental')[0])
+        # The in-memory test database refuses the heartbeat's writes during
+        # the load instead of waiting for it; they are retried
+        with CaptureQueriesContext(connection) as queries, mock.patch('claims.jobs.logger'):
+            run_job(job, data_dir=directory, quarantine_dir=directory)
+        # Progress goes through the heartbeat's connection; the loading one
+        # only records the outcome, after the loads have committed
+        updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE "claim_reload_job"')]
+        self.assertEqual(len(updates), 1)
+
+        job = ReloadJob.objects.get(id=job.id)
+        self.assertEqual(job.status, ReloadJob.SUCCEEDED)
+        self.assertEqual((job.rows_loaded, job.rows_rejected), (2, 1))
+        self.assertEqual((job.total_claims, job.total_claim_details), (1, 1))
+        self.assertIsNone(job.active_key)
+        self.assertIsNotNone(last_reload())
+
+    def test_progress_is_written_while_the_job_runs(self):
+        """Test that reported progress reaches the row before the job finishes"""
+        job = claim_job(enqueue_reload()[0])
+        with Heartbeat(job) as heartbeat:
+            heartbeat.report(current_feed='claim list', rows_loaded=500)
+            deadline = time.monotonic() + 5
+            while ReloadJob.objects.get(pk=job.pk).rows_loaded != 500 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            self.assertEqual(ReloadJob.objects.get(pk=job.pk).current_feed, 'claim list')
+        self.assertEqual(job.rows_loaded, 500)
+
+    def test_heartbeat_keeps_a_silent_job_fresh(self):
+        """Test that a job reporting no progress is kept alive by its heartbeat"""
+        job = claim_job(enqueue_reload()[0])
+        ReloadJob.objects.filter(pk=job.pk).update(updated_at=timezone.now() - STALE_AFTER * 2)
+        self.assertTrue(is_stale(ReloadJob.objects.get(pk=job.pk)))
+
+        with Heartbeat(job, interval=0.01):
+            deadline = time.monotonic() + 5
+            while is_stale(ReloadJob.objects.get(pk=job.pk)) and time.monotonic() < deadline:
+                time.sleep(0.01)
+        self.assertFalse(is_stale(ReloadJob.objects.get(pk=job.pk)))
+        self.assertEqual(enqueue_reload()[0].pk, job.pk)
+
+
+class DataMonitorTest(TempFileMixin, TestCase):
+    """Test cases for stat-based change detection"""
+
+    def setUp(self):
+        self.directory = self.make_directory()
+        self.csv_file = self.directory / 'claim_list_data.csv'
+        self.csv_file.write_text('id|patient_name\n1|Ann\n', encoding='utf-8')
+        self.monitor = DataMonitor()
+        self.monitor.data_folder = self.directory
+
+    def test_unchanged_files_are_not_read(self):
+        """Test that files are only hashed when their stat fingerprint changes"""
+        self.assertEqual(self.monitor.check_for_changes()[0], [str(self.csv_file)])
+
+        with mock.patch.object(self.monitor, 'get_file_hash', wraps=self.monitor.get_file_hash) as get_file_hash:
+            self.assertEqual(self.monitor.check_for_changes()[0], [])
+            self.monitor.get_data_status()
+            get_file_hash.assert_not_called()
+
+            # Touching the file changes its fingerprint but not its contents
+            stat = self.csv_file.stat()
+            os.utime(self.csv_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+            self.assertEqual(self.monitor.check_for_changes()[0], [])
+            self.assertEqual(get_file_hash.call_count, 1)
+
+    def test_content_changes_and_deletions_are_reported(self):
+        """Test that rewritten and deleted files are reported as changed"""
+        self.monitor.check_for_changes()
+
+        self.csv_file.write_text('id|patient_name\n1|Bobby\n', encoding='utf-8')
+        self.assertEqual(self.monitor.check_for_changes()[0], [str(self.csv_file)])
+
+        self.csv_file.unlink()
+        self.assertEqual(self.monitor.check_for_changes()[0], [str(self.csv_file)])
+        self.assertEqual(self.monitor.get_data_status()['total_files'], 0)
+
+    def test_each_change_is_reported_by_one_worker(self):
+        """Test that workers share the fingerprints, so only one reports a change"""
+        other_worker = DataMonitor()
+        other_worker.data_folder = self.directory
+
+        self.assertEqual(self.monitor.check_for_changes()[0], [str(self.csv_file)])
+        self.assertEqual(other_worker.check_for_changes()[0], [])
+
+    def test_compare_and_set_rejects_stale_versions(self):
+        """Test that a write based on an outdated read is refused"""
+        self.assertEqual(get_state('fingerprints'), (None, 0))
+        self.assertTrue(compare_and_set('fingerprints', {'a': 1}, 0))
+        self.assertFalse(compare_and_set('fingerprints', {'a': 2}, 0))
+
+        value, version = get_state('fingerprints')
+        self.assertTrue(compare_and_set('fingerprints', {'a': 3}, version))
+        self.assertFalse(compare_and_set('fingerprints', {'a': 4}, version))
+        self.assertEqual(get_state('fingerprints'), ({'a': 3}, version + 1))
+
+
+class FileWatcherTest(TempFileMixin, TestCase):
+    """Test cases for the event-driven Data folder watcher"""
+
+    def setUp(self):
+        self.directory = self.make_directory()
+
+    def test_batches_wait_for_completed_writes(self):
+        """Test that a burst is only released once every file in it is closed"""
+        class ScriptedWatcher:
+            def __init__(self, batches):
+                self.batches = list(batches)
+
+            def read(self, timeout=None):
+                return self.batches.pop(0)
+
+            def close(self):
+                pass
+
+        watcher = ScriptedWatcher([
+            [('claim_list_data.csv', False)],
+            [('claim_detail_data.csv', True), ('notes.txt', True)],
+            [('claim_list_data.csv', True)],
+        ])
+        changes = watch_changes(self.directory, debounce=0, watcher=watcher)
+
+        self.assertEqual(next(changes), ['claim_detail_data.csv', 'claim_list_data.csv'])
+        self.assertEqual(watcher.batches, [])
+
+    def test_inotify_reports_closed_files(self):
+        """Test that inotify reports a file as complete once its writer closes it"""
+        try:
+            watcher = InotifyWatcher(self.directory)
+        except (AttributeError, OSError):
+            self.skipTest('inotify is not available')
+        self.addCleanup(watcher.close)
+
+        with open(self.directory / 'claim_list_data.csv', 'w', encoding='utf-8') as f:
+            f.write('id|patient_name\n')
+
+        events = []
+        while not any(complete for _, complete in events):
+            batch = watcher.read(timeout=1)
+            self.assertTrue(batch, 'no inotify event within a second')
+            events += batch
+        self.assertEqual({name for name, _ in events}, {'claim_list_data.csv'})
+
+    def test_polling_waits_for_a_quiet_poll(self):
+        """Test that the polling fallback reports a file complete once it stops changing"""
+        watcher = PollingWatcher(self.directory, interval=0)
+        (self.directory / 'claim_list_data.csv').write_text('id|patient_name\n', encoding='utf-8')
+
+        self.assertEqual(watcher.read(), [('claim_list_data.csv', False)])
+        self.assertEqual(watcher.read(), [('claim_list_data.csv', True)])
+        self.assertEqual(watcher.read(), [])
+
+
+class DashboardEventsTest(TestCase):
+    """Test cases for the server-sent events endpoint"""
+
+    def test_wsgi_clients_get_a_snapshot(self):
+        """Test that a WSGI request gets the current events and a reconnect delay"""
+        self.assertEqual(self.client.get(reverse('claims:api_events')).status_code, 302)
+
+        self.client.force_login(User.objects.create_user(username='reviewer', password='testpass123'))
+        with mock.patch('claims.events.data_monitor.check_for_changes', return_value=([], {})):
+            response = self.client.get(reverse('claims:api_events'))
+
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = response.content.decode()
+        self.assertTrue(body.startswith('retry: 30000'))
+        self.assertIn('event: version\ndata: {"data_version": 0', body)
+
+    def test_changed_files_queue_one_reload(self):
+        """Test that the event collector queues a reload for changed files and only reports new events"""
+        with mock.patch('claims.events.data_monitor.check_for_changes', return_value=(['claim_list_data.csv'], {})):
+            events = collect_events()
+            collect_events()
+        self.assertEqual(ReloadJob.objects.count(), 1)
+        self.assertEqual(events['reload']['status'], ReloadJob.QUEUED)
+
+        with mock.patch('claims.events.data_monitor.check_for_changes', return_value=([], {})):
+            self.assertEqual(collect_events(events), {})
+
+    def test_change_check_queues_the_reload(self):
+        """Test that the check-changes endpoint queues a reload for the change it records"""
+        self.client.force_login(User.objects.create_user(username='reviewer', password='testpass123'))
+        with mock.patch('claims.views.data_monitor.check_for_changes', return_value=(['claim_list_data.csv'], {})):
+            response = self.client.get(reverse('claims:api_check_changes')).json()
+        job = ReloadJob.objects.get()
+        self.assertEqual((response['changes_detected'], response['job_id']), (True, job.id))
+        self.assertEqual(job.status, ReloadJob.QUEUED)
+
+        with mock.patch('claims.views.data_monitor.check_for_changes', return_value=([], {})):
+            self.assertNotIn('job_id', self.client.get(reverse('claims:api_check_changes')).json())
+        self.assertEqual(ReloadJob.objects.count(), 1)
+
+    def test_broadcaster_streams_to_subscribers(self):
+        """Test that one poll is fanned out to a streaming client"""
+        version = {'version': {'data_version': 3}}
+
+        async def first_event():
+            stream = EventBroadcaster(interval=0.01).stream()
+            try:
+                self.assertEqual(await stream.__anext__(), f'retry: {RECONNECT_MS}\n\n')
+                return await stream.__anext__()
+            finally:
+                await stream.aclose()
+
+        with mock.patch('claims.events.collect_events', return_value=version):
+            event = asyncio.run(first_event())
+
+        self.assertEqual(event, 'event: version\ndata: {"data_version": 3}\n\n')
+
+
+class DashboardStatsTest(CacheResetMixin, TempFileMixin, TestCase):
+    """Test cases for the cached dashboard statistics"""
+
+    def setUp(self):
+        super().setUp()
+        ClaimList.objects.create(id=1, status=ClaimStatus.intern('Paid'), insurer=Insurer.intern('Aetna'), billed_amount=Decimal('100.00'), paid_amount=Decimal('60.00'))
+        ClaimList.objects.create(id=2, status=ClaimStatus.intern('Denied'), insurer=Insurer.intern('Aetna'), billed_amount=Decimal('50.00'), paid_amount=Decimal('0.00'))
+        ClaimList.objects.create(id=3, status=ClaimStatus.intern('Paid'), insurer=Insurer.intern('Cigna'), billed_amount=Decimal('30.00'), paid_amount=Decimal('30.00'))
+        ClaimList.objects.create(id=4, status=ClaimStatus.intern('Paid'), insurer=Insurer.intern('Test Insurer'), billed_amount=Decimal('999.00'), paid_amount=Decimal('1.00'))
+        refresh_rollups()
+        self.user = User.objects.create_user(username='reviewer', password='testpass123')
+
+    def test_metrics_exclude_test_insurers(self):
+        """Test that one grouped pass gives the same figures as the per-metric queries"""
+        stats = compute_dashboard_stats()
+
+        self.assertEqual(stats['total_claims'], 3)
+        self.assertEqual(stats['total_billed'], Decimal('180.00'))
+        self.assertEqual(stats['total_paid'], Decimal('90.00'))
+        self.assertEqual(stats['average_claim'], Decimal('60.00'))
+        self.assertEqual(stats['avg_underpayment'], Decimal('45.00'))
+        self.assertEqual(stats['claims_by_status'], [{'status': 'Paid', 'count': 2}, {'status': 'Denied', 'count': 1}])
+        self.assertEqual(stats['claims_by_insurer'], [{'insurer_name': 'Aetna', 'count': 2}, {'insurer_name': 'Cigna', 'count': 1}])
+        self.assertEqual([claim.id for claim in stats['recent_claims']], [1, 2, 3])
+
+    def test_cache_follows_flag_and_data_versions(self):
+        """Test that the cached statistics are replaced after flag changes and loads"""
+        self.assertEqual(dashboard_stats()['total_flagged'], 0)
+        with self.assertNumQueries(1):
+            dashboard_stats()
+
+        flag = ClaimFlag.objects.create(claim_id=1, user=self.user, flagged_at=timezone.now())
+        self.assertEqual(dashboard_stats()['total_flagged'], 1)
+        flag.delete()
+        self.assertEqual(dashboard_stats()['total_flagged'], 0)
+
+        load_feed(JSONSource(self.write_ndjson([{'id': 5, 'status': 'Paid', 'insurer_name': 'Cigna', 'billed_amount': '10.00'}])), CLAIM_LIST_SCHEMA, mode='append')
+        self.assertEqual(dashboard_stats()['total_claims'], 4)
+
+
+class ClaimRollupTest(TempFileMixin, TestCase):
+    """Test cases for the analytics rollups maintained on ingest"""
+
+    header = 'id|patient_name|billed_amount|paid_amount|status|insurer_name|discharge_date'
+
+    def rollup(self, month, status):
+        return ClaimRollup.objects.get(month=month, status__name=status)
+
+    def test_full_load_builds_rollups(self):
+        """Test that a load rolls claims up by month, insurer and status"""
+        load_feed(CSVSource(self.write_csv([
+            '1|Ann|100.00|60.00|Paid|Aetna|2024-01-05',
+            '2|Bob|50.00|50.00|Paid|Aetna|2024-01-20',
+            '3|Cal|70.00|0.00|Denied|Test Co|2024-02-01',
+            '4|Dee|10.00||Paid|Aetna|',
+        ])), CLAIM_LIST_SCHEMA)
+
+        january = self.rollup(date(2024, 1, 1), 'Paid')
+        self.assertEqual((january.claim_count, january.billed_total, january.paid_total), (2, Decimal('150.00'), Decimal('110.00')))
+        self.assertEqual((january.underpaid_count, january.underpayment_total), (1, Decimal('40.00')))
+        self.assertTrue(self.rollup(date(2024, 2, 1), 'Denied').is_test_insurer)
+        self.assertEqual(ClaimRollup.objects.get(month__isnull=True).claim_count, 1)
+
+    def test_incremental_load_only_rebuilds_touched_months(self):
+        """Test that a delta refreshes the months it changed and leaves the rest alone"""
+        lines = ['1|Ann|100.00|60.00|Paid|Aetna|2024-01-05', '2|Bob|50.00|50.00|Paid|Aetna|2024-02-20']
+        load_feed(CSVSource(self.write_csv(lines)), CLAIM_LIST_SCHEMA)
+        february = self.rollup(date(2024, 2, 1), 'Paid')
+
+        # Claim 1 moves from January to March
+        lines[0] = '1|Ann|100.00|60.00|Paid|Aetna|2024-03-05'
+        load_feed(CSVSource(self.write_csv(lines)), CLAIM_LIST_SCHEMA, mode='incremental')
+
+        self.assertFalse(ClaimRollup.objects.filter(month=date(2024, 1, 1)).exists())
+        self.assertEqual(self.rollup(date(2024, 3, 1), 'Paid').claim_count, 1)
+        self.assertEqual(self.rollup(date(2024, 2, 1), 'Paid').pk, february.pk)
+
+    def test_analytics_reads_rollups(self):
+        """Test that the analytics view and chart API are served from the rollups"""
+        load_feed(CSVSource(self.write_csv([
+            '1|Ann|100.00|60.00|Paid|Aetna|2024-01-05',
+            '2|Bob|50.00|0.00|Denied|Cigna|2024-01-20',
+            '3|Cal|70.00|0.00|Denied|Test Co|2024-02-01',
+        ])), CLAIM_LIST_SCHEMA)
+        self.client.force_login(User.objects.create_user(username='reviewer', password='testpass123'))
+
+        response = self.client.get(reverse('claims:analytics'))
+        self.assertEqual(response.context['total_claims'], 2)
+        self.assertEqual(response.context['claims_by_month'][0]['month'], '2024-01-01')
+        self.assertEqual(response.context['insurer_data'][0]['insurer_name'], 'Aetna')
+
+        data = self.client.get(reverse('claims:api_claims_data')).json()['data']
+        self.assertEqual(data, [{'status': 'Denied', 'count': 1}, {'status': 'Paid', 'count': 1}])
+
+
+class ClaimEditTest(TempFileMixin, TestCase):
+    """Test cases for claims and details saved or deleted one at a time"""
+
+    def claim_months(self):
+        return {rollup.month: rollup.claim_count for rollup in ClaimRollup.objects.all()}
+
+    def test_edits_refresh_rollups_index_and_codes(self):
+        """Test that saves and deletes outside a load keep the derived tables current"""
+        version = get_state(DATA_VERSION_KEY)[1]
+        claim = ClaimList.objects.create(id=1, patient_name='Ann Smith', status=ClaimStatus.intern('Paid'),
+                                         billed_amount=Decimal('100.00'), discharge_date=date(2024, 1, 5))
+        self.assertEqual(self.claim_months(), {date(2024, 1, 1): 1})
+        self.assertEqual([row.pk for row in search(ClaimList.objects.all(), 'smith')], [1])
+        self.assertGreater(get_state(DATA_VERSION_KEY)[1], version)
+
+        claim.patient_name = 'Ann Jones'
+        claim.discharge_date = date(2024, 3, 2)
+        claim.save()
+        self.assertEqual(self.claim_months(), {date(2024, 3, 1): 1})
+        self.assertEqual([row.pk for row in search(ClaimList.objects.all(), 'jones')], [1])
+        self.assertEqual(list(search(ClaimList.objects.all(), 'smith')), [])
+
+        detail = ClaimDetail.objects.create(id=10, claim=claim, cpt_codes='99204,82947')
+        self.assertEqual(set(ClaimDetailCPT.objects.values_list('code', flat=True)), {'99204', '82947'})
+        detail.cpt_codes = '99213'
+        detail.save()
+        self.assertEqual(set(ClaimDetailCPT.objects.values_list('code', flat=True)), {'99213'})
+        self.assertEqual([row.pk for row in search(ClaimDetail.objects.all(), '99213')], [10])
+
+        detail.delete()
+        self.assertFalse(ClaimDetailCPT.objects.exists())
+        self.assertEqual(list(search(ClaimDetail.objects.all(), '99213')), [])
+        claim.delete()
+        self.assertEqual(self.claim_months(), {})
+        self.assertEqual(list(search(ClaimList.objects.all(), 'jones')), [])
+
+    def test_loads_refresh_once(self):
+        """Test that rows a load deletes are not refreshed one at a time"""
+        ClaimList.objects.create(id=1, patient_name='Ann', discharge_date=date(2024, 1, 5))
+        ClaimList.objects.create(id=2, patient_name='Bob', discharge_date=date(2024, 2, 5))
+        path = self.write_csv([
+            'id|patient_name|billed_amount|paid_amount|status|insurer_name|discharge_date',
+            '3|Cal|1|1|Paid|Aetna|2024-03-05',
+        ])
+        for mode in ('incremental', 'replace'):
+            with self.subTest(mode=mode), mock.patch('claims.signals.refresh_rollups') as refresh:
+                load_feed(CSVSource(path), CLAIM_LIST_SCHEMA, mode=mode)
+                self.assertEqual(refresh.call_count, 1)
+        self.assertEqual(list(ClaimList.objects.values_list('id', flat=True)), [3])
+
+    def test_full_loads_clear_tables_without_reading_them(self):
+        """Test that a full load empties the table with one DELETE, along with what cascades from it"""
+        claim = ClaimList.objects.create(id=1, patient_name='Ann')
+        ClaimFlag.objects.create(claim=claim, user=User.objects.create_user(username='reviewer'),
+                                 flagged_at=timezone.now())
+        for pk in (10, 11):
+            ClaimDetail.objects.create(id=pk, claim=claim, cpt_codes='99204')
+
+        path = self.write_csv(['id|claim_id|denial_reason|cpt_codes', '12|1||82947'])
+        with CaptureQueriesContext(connection) as queries:
+            load_feed(CSVSource(path), CLAIM_DETAIL_SCHEMA)
+        deletes = [query['sql'] for query in queries if query['sql'].startswith('DELETE FROM "claim_detail"')]
+        self.assertEqual(deletes, ['DELETE FROM "claim_detail"'])
+        self.assertEqual(set(ClaimDetailCPT.objects.values_list('detail_id', 'code')), {(12, '82947')})
+
+        path = self.write_csv([
+            'id|patient_name|billed_amount|paid_amount|status|insurer_name|discharge_date',
+            '1|Ann|1|1|Paid|Aetna|2024-01-05',
+        ])
+        load_feed(CSVSource(path), CLAIM_LIST_SCHEMA)
+        self.assertEqual((ClaimList.objects.count(), ClaimFlag.objects.count()), (1, 0))
+
+    def test_missing_feed_clears_its_table_once(self):
+        """Test that a full load without a detail file empties the details and refreshes once"""
+        claim = ClaimList.objects.create(id=1, patient_name='Ann')
+        for pk in (10, 11):
+            ClaimDetail.objects.create(id=pk, claim=claim, cpt_codes='99204')
+        directory = self.make_directory()
+        (directory / 'claim_list_data.csv').write_text(
+            'id|patient_name|billed_amount|paid_amount|status|insurer_name|discharge_date\n'
+            '1|Ann|1|1|Paid|Aetna|2024-01-05\n', encoding='utf-8')
+
+        version = get_state(DATA_VERSION_KEY)[1]
+        call_command('load_claims_data', data_dir=directory, stdout=io.StringIO())
+        self.assertFalse(ClaimDetail.objects.exists())
+        self.assertFalse(ClaimDetailCPT.objects.exists())
+        self.assertEqual(list(search(ClaimDetail.objects.all(), '99204')), [])
+        # One bump per feed
+        self.assertEqual(get_state(DATA_VERSION_KEY)[1], version + 2)
+
+
+class ClaimDetailRelationTest(TestCase):
+    """Test cases for the claim detail to claim list relation"""
+
+    def setUp(self):
+        ClaimList.objects.create(id=1, patient_name='Ann', status=ClaimStatus.intern('Paid'), insurer=Insurer.intern('Aetna'))
+        ClaimList.objects.create(id=2, patient_name='Bob', status=ClaimStatus.intern('Denied'), insurer=Insurer.intern('Cigna'))
+        for detail_id, claim_id in ((1, 1), (2, 1), (3, 2), (4, 99)):
+            ClaimDetail.objects.create(id=detail_id, claim_id=claim_id, denial_reason=DenialReason.intern('Late filing'))
+
+    def test_details_join_their_claims(self):
+        """Test that details load their claims in one query and keep unknown claims"""
+        with self.assertNumQueries(1):
+            details = list(ClaimDetail.objects.select_related('claim').order_by('id'))
+            self.assertEqual([d.claim.patient_name if d.claim else None for d in details],
+                             ['Ann', 'Ann', 'Bob', None])
+        self.assertIsNone(details[3].claim_list)
+        self.assertEqual(ClaimDetail.objects.get(id=3).claim_list.patient_name, 'Bob')
+
+        with self.assertNumQueries(2):
+            claims = list(ClaimList.objects.prefetch_related('details').order_by('id'))
+            self.assertEqual([c.details.count() for c in claims], [2, 1])
+
+    def test_details_list_shows_claim_attributes(self):
+        """Test that the claim details list renders each claim's patient and insurer"""
+        self.client.force_login(User.objects.create_user(username='reviewer', password='testpass123'))
+
+        response = self.client.get(reverse('claims:claim_details_list'), {'search': '99'})
+        self.assertEqual([d.id for d in response.context['page_obj']], [4])
+
+        response = self.client.get(reverse('claims:claim_details_list_htmx'))
+        self.assertContains(response, 'Bob &middot; Cigna &middot; Denied')
+
+
+class SearchTest(TempFileMixin, TestCase):
+    """Test cases for the indexed search shared by the list views"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='reviewer', password='testpass123')
+        self.ann = ClaimList.objects.create(id=30001, patient_name='Ann Smith', insurer=Insurer.intern('Aetna'))
+        self.bob = ClaimList.objects.create(id=30002, patient_name='Bob Jones', insurer=Insurer.intern('Smithfield Health'))
+        ClaimDetail.objects.create(id=1, claim_id=30001, denial_reason=DenialReason.intern('Late filing'), cpt_codes='99204')
+        refresh_search(ClaimList)
+        refresh_search(ClaimDetail)
+
+    def ids(self, queryset):
+        return [row.pk for row in queryset]
+
+    def test_claims_are_ranked_substring_matches(self):
+        """Test that any substring matches, case-insensitively, best match first"""
+        self.assertEqual(self.ids(search(ClaimList.objects.all(), 'smith')), [30001, 30002])
+        self.assertEqual(self.ids(search(ClaimList.objects.all(), '0002')), [30002])
+        self.assertEqual(self.ids(search(ClaimList.objects.filter(insurer__name='Aetna'), 'SMI')), [30001])
+        # Too short for the index: icontains instead
+        self.assertEqual(self.ids(search(ClaimList.objects.all(), 'bo')), [30002])
+        self.assertEqual(self.ids(search(ClaimDetail.objects.all(), '9920')), [1])
+
+    def test_loads_notes_and_flags_keep_the_index_current(self):
+        """Test that feed loads and note and flag writes are searchable at once"""
+        path = self.write_csv([
+            'id|patient_name|billed_amount|paid_amount|status|insurer_name|discharge_date',
+            '30001|Ann Smith|1|1|Paid|Aetna|2024-01-02',
+            '30003|Cal Smithers|1|1|Paid|Cigna|2024-01-02',
+        ])
+        load_feed(CSVSource(path), CLAIM_LIST_SCHEMA, mode='incremental')
+        self.assertEqual(self.ids(search(ClaimList.objects.all(), 'smith')), [30001, 30003])
+
+        note = ClaimNote.objects.create(claim=self.ann, user=self.user, note='Called the payer',
+                                        created_at=timezone.now())
+        flag = ClaimFlag.objects.create(claim=self.ann, user=self.user, reason='Underpaid',
+                                        flagged_at=timezone.now())
+        self.assertEqual(self.ids(search(ClaimNote.objects.all(), 'payer')), [note.pk])
+        self.assertEqual(self.ids(search(ClaimNote.objects.all(), 'ann smi')), [note.pk])
+        self.assertEqual(self.ids(search(ClaimNote.objects.all(), 'review')), [note.pk])
+        self.assertEqual(self.ids(search(ClaimFlag.objects.all(), 'underpaid')), [flag.pk])
+
+        flag.reason = 'Duplicate'
+        flag.save()
+        self.assertEqual(self.ids(search(ClaimFlag.objects.all(), 'underpaid')), [])
+        note.delete()
+        self.assertEqual(self.ids(search(ClaimNote.objects.all(), 'payer')), [])
+
+
+class KeysetPaginationTest(CacheResetMixin, TestCase):
+    """Test cases for cursor pagination of the list views"""
+
+    def setUp(self):
+        super().setUp()
+        user = User.objects.create_user(username='reviewer', password='testpass123')
+        claim = ClaimList.objects.create(id=1, patient_name='Ann')
+        # Ties on flagged_at are broken by id
+        times = [timezone.now() - timezone.timedelta(minutes=i // 3) for i in range(60)]
+        self.flags = [ClaimFlag.objects.create(claim=claim, user=user, flagged_at=at) for at in times]
+        self.expected = [f.pk for f in sorted(self.flags, key=lambda f: (f.flagged_at, f.pk), reverse=True)]
+
+    def paginator(self, params=None):
+        return KeysetPaginator(ClaimFlag.objects.all(), ('-flagged_at', '-id'), per_page=25, params=params)
+
+    def follow(self, url):
+        return dict(part.split('=', 1) for part in url.lstrip('?').split('&') if part)
+
+    def test_pages_follow_cursors_both_ways(self):
+        """Test that next and previous links walk every row once, in order"""
+        page = self.paginator({'user': 'reviewer'}).page({})
+        seen, numbers = [f.pk for f in page], [page.number]
+        while page.has_next:
+            self.assertIn('user=reviewer', page.next_url)
+            params = self.follow(page.next_url)
+            page = self.paginator(params).page(params)
+            seen += [f.pk for f in page]
+            numbers.append(page.number)
+        self.assertEqual(seen, self.expected)
+        self.assertEqual(numbers, [1, 2, 3])
+
+        page = self.paginator().page(self.follow(page.previous_url))
+        self.assertEqual([f.pk for f in page], self.expected[25:50])
+        self.assertEqual((page.number, page.has_previous, page.has_next), (2, True, True))
+
+        last = self.paginator().page({'last': '1'})
+        self.assertEqual([f.pk for f in last], self.expected[50:])
+        self.assertEqual((last.number, last.has_next), (3, False))
+
+    def test_total_is_counted_once_per_version(self):
+        """Test that the count is cached until the flags change"""
+        self.assertEqual(self.paginator().count, 60)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.paginator().count, 60)
+
+        self.flags[0].delete()
+        self.assertEqual(self.paginator().count, 59)
+
+
+class FacetTest(CacheResetMixin, TestCase):
+    """Test cases for the filter options and their counts"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='reviewer', password='testpass123')
+        rows = [
+            (1, 'Paid', 'Aetna'), (2, 'Paid', 'Aetna'), (3, 'Denied', 'Aetna'),
+            (4, 'Denied', 'Cigna'), (5, 'Paid', 'Test Insurer'), (6, '', 'Cigna'),
+        ]
+        for pk, status, insurer in rows:
+            ClaimList.objects.create(id=pk, patient_name=f'Patient {pk}', status=ClaimStatus.intern(status), insurer=Insurer.intern(insurer))
+
+    def test_counts_follow_the_queryset(self):
+        """Test that each value is counted under the filter, without empty values"""
+        self.assertEqual(facet_counts(ClaimList.objects.all(), 'status'), [
+            {'value': 'Denied', 'count': 2}, {'value': 'Paid', 'count': 3},
+        ])
+        self.assertEqual(facet_counts(ClaimList.objects.filter(insurer__name='Cigna'), 'status', 'Paid'), [
+            {'value': 'Denied', 'count': 1}, {'value': 'Paid', 'count': 0},
+        ])
+
+    def test_counts_are_cached_until_the_data_changes(self):
+        """Test that a repeated facet costs only the version lookup"""
+        self.assertEqual(len(facet_counts(ClaimList.objects.all(), 'insurer')), 3)
+        with self.assertNumQueries(1):
+            self.assertEqual(len(facet_counts(ClaimList.objects.all(), 'insurer')), 3)
+
+        ClaimFlag.objects.create(claim_id=1, user=self.user, flagged_at=timezone.now())
+        ClaimFlag.objects.create(claim_id=2, user=self.user, flagged_at=timezone.now())
+        flags = ClaimFlag.objects.all()
+        self.assertEqual(facet_counts(flags, 'user__username'), [{'value': 'reviewer', 'count': 2}])
+        ClaimFlag.objects.filter(claim_id=2).delete()
+        self.assertEqual(facet_counts(flags, 'user__username'), [{'value': 'reviewer', 'count': 1}])
+
+    def test_claim_list_counts_options_under_the_other_filters(self):
+        """Test that the list's options count the rows each would select"""
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('claims:claim_list_htmx'), {'policy': 'Aetna', 'status': 'Paid'})
+        self.assertEqual(response.context['statuses'], [
+            {'value': 'Denied', 'count': 1}, {'value': 'Paid', 'count': 2},
+        ])
+        # Test insurers are left out of the policies
+        self.assertEqual(response.context['policies'], [{'value': 'Aetna', 'count': 2}])
+        self.assertContains(response, 'hx-swap-oob')
+
+
+class LiveSearchTest(CacheResetMixin, TestCase):
+    """Test cases for the cached, coalesced live search of the lists"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='reviewer', password='testpass123')
+        ClaimList.objects.create(id=30001, patient_name='Ann Smith', insurer=Insurer.intern('Aetna'))
+        ClaimList.objects.create(id=30002, patient_name='Bob Smithers', insurer=Insurer.intern('Cigna'))
+        refresh_search(ClaimList)
+
+    def test_equal_queries_share_results(self):
+        """Test that case and spacing do not change the cached results"""
+        self.assertEqual(live_params({'search': '  Ann   SMITH ', 'status': ''}), {'search': 'ann smith'})
+        self.client.force_login(self.user)
+        url = reverse('claims:claim_list_htmx')
+        first = self.client.get(url, {'search': 'Smith'})
+        self.assertEqual([c.pk for c in first.context['page_obj']], [30001, 30002])
+
+        # Session, user and versions only
+        with self.assertNumQueries(3):
+            again = self.client.get(url, {'search': ' smith'})
+        self.assertEqual([c.pk for c in again.context['page_obj']], [30001, 30002])
+        self.assertEqual(again.context['page_obj'].paginator.count, 2)
+
+    def test_longer_queries_only_check_prefix_matches(self):
+        """Test that a query is narrowed to the rows its cached prefix matched"""
+        self.assertEqual(sorted(c.pk for c in live_search(ClaimList.objects.all(), 'smi')), [30001, 30002])
+        # Pretend only the first claim matched the prefix
+        cache.set(match_key(ClaimList, cache_versions(), 'smi'), [30001])
+        self.assertEqual([c.pk for c in live_search(ClaimList.objects.all(), 'smith')], [30001])
+        cache.set(match_key(ClaimList, cache_versions(), 'smit'), [])
+        nothing = live_search(ClaimList.objects.all(), 'smithers')
+        self.assertEqual((list(nothing), facet_counts(nothing, 'status')), ([], []))
+
+    def test_waiting_requests_share_one_computation(self):
+        """Test that with a shared cache a request for results being computed waits for them"""
+        cache.add('results:computing', True)
+        with ThreadPoolExecutor(max_workers=1) as executor, \
+                mock.patch('claims.live_search.cache_is_shared', return_value=True):
+            executor.submit(lambda: (time.sleep(0.1), cache.set('results', 'shared')))
+            compute = mock.Mock(return_value='own')
+            self.assertEqual(coalesce('results', compute, 30), 'shared')
+        compute.assert_not_called()
+
+        # A per-process cache has no other worker to wait for
+        cache.add('mine:computing', True)
+        self.assertEqual(coalesce('mine', lambda: 'own', 30), 'own')
+        self.assertEqual(cache.get('mine'), 'own')
+
+    def test_search_endpoint_serves_each_list(self):
+        """Test that the live search endpoint renders the results of the named list"""
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('claims:live_search', args=['claims']), {'search': 'bob'})
+        self.assertEqual([c.pk for c in response.context['page_obj']], [30002])
+        self.assertContains(response, 'hx-swap-oob')
+
+        ClaimDetail.objects.create(id=1, claim_id=30001)
+        response = self.client.get(reverse('claims:live_search', args=['claim-details']))
+        self.assertContains(response, 'id="claim-details-results"')
+        self.assertContains(response, '<select id="denial_reason">')
+        self.assertEqual(self.client.get(reverse('claims:live_search', args=['users'])).status_code, 404)
+
+
+class ClaimExportTest(TestCase):
+    """Test cases for the streaming CSV export"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='reviewer', password='testpass123')
+        self.client.force_login(self.user)
+        ClaimList.objects.create(id=1, patient_name='Ann Smith', status=ClaimStatus.intern('Paid'), insurer=Insurer.intern('Aetna'),
+                                 billed_amount=Decimal('200.00'), paid_amount=Decimal('150.00'),
+                                 discharge_date=date(2024, 1, 2))
+        ClaimList.objects.create(id=2, patient_name='Bob Jones', status=ClaimStatus.intern('Denied'), insurer=Insurer.intern('Aetna'))
+        ClaimDetail.objects.create(id=10, claim_id=1, cpt_codes="['99204', '82947']")
+        ClaimDetail.objects.create(id=11, claim_id=1, cpt_codes='', denial_reason=DenialReason.intern('Late filing'))
+
+    def rows(self, response):
+        self.assertTrue(response.streaming)
+        return list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+
+    def test_export_streams_the_filtered_claims_with_details(self):
+        """Test that each detail is a row and claims without details get one"""
+        rows = self.rows(self.client.get(reverse('claims:claim_list_export'), {'policy': 'Aetna'}))
+        self.assertEqual(rows[0][:2], ['Claim ID', 'Patient Name'])
+        self.assertEqual(rows[1], ['1', 'Ann Smith', 'Aetna', 'Paid', '01/02/2024', '200.00', '150.00',
+                                   '50.00', '75.0', '10', '99204; 82947', '-'])
+        self.assertEqual([row[9:] for row in rows[2:]], [['11', '-', 'Late filing'], ['-', '-', '-']])
+
+        rows = self.rows(self.client.get(reverse('claims:claim_list_export'), {'status': 'Denied'}))
+        self.assertEqual([row[0] for row in rows[1:]], ['2'])
+
+    def test_single_claim_export_is_one_query(self):
+        """Test that a claim's export reads its details in the same query"""
+        response = self.client.get(reverse('claims:claim_detail', args=[1]), {'export': 'csv'})
+        self.assertIn('1-ann-smith.csv', response['Content-Disposition'])
+        with self.assertNumQueries(1):
+            rows = self.rows(response)
+        self.assertEqual([row[9] for row in rows[1:]], ['10', '11'])
+
+    def test_asgi_export_is_pulled_chunk_by_chunk(self):
+        """Test that under ASGI the export is an async stream of the same chunks"""
+        async def read(response):
+            return [chunk async for chunk in response.streaming_content]
+
+        claims = ClaimList.objects.all()
+        response = export_response(AsyncRequestFactory().get('/'), claims, 'claims.csv')
+        self.assertTrue(response.is_async)
+        chunks = async_to_sync(read)(response)
+        self.assertEqual(chunks, [line.encode() for line in export_lines(claims)])
+        self.assertEqual(chunks[0].decode().splitlines()[0].split(',')[:2], ['Claim ID', 'Patient Name'])
+
+
+class LookupTableTest(CacheResetMixin, TempFileMixin, TestCase):
+    """Test cases for the interned status, insurer and denial reason columns"""
+
+    header = 'id|patient_name|billed_amount|paid_amount|status|insurer_name|discharge_date'
+
+    def test_loads_store_each_name_once(self):
+        """Test that every load mode references one lookup row per distinct name"""
+        lines = ['1|Ann|10|5|Paid|Aetna|2024-01-02', '2|Bob|10|0|Denied|Aetna|', '3|Cal|10|5|Paid||']
+        for mode in ('replace', 'swap', 'incremental'):
+            load_feed(CSVSource(self.write_csv(lines)), CLAIM_LIST_SCHEMA, mode=mode)
+            self.assertEqual(list(ClaimStatus.objects.values_list('name', flat=True)), ['Denied', 'Paid'])
+            self.assertEqual(list(Insurer.objects.values_list('name', flat=True)), ['Aetna'])
+            self.assertEqual(
+                list(ClaimList.objects.order_by('id').values_list('status__name', 'insurer__name')),
+                [('Paid', 'Aetna'), ('Denied', 'Aetna'), ('Paid', None)],
+            )
+
+        lines[2] = '3|Cal|10|5|Under Review|Cigna|'
+        load_feed(CSVSource(self.write_csv(lines)), CLAIM_LIST_SCHEMA, mode='incremental')
+        cal = ClaimList.objects.select_related('status', 'insurer').get(id=3)
+        self.assertEqual((cal.status.name, cal.insurer.name), ('Under Review', 'Cigna'))
+        self.assertEqual(ClaimStatus.objects.count(), 3)
+
+    def test_cache_interns_new_names_only(self):
+        """Test that a load's cache reads the table once and only writes new names"""
+        ClaimStatus.intern('Paid')
+        resolve = CLAIM_LIST_SCHEMA.resolver()
+        row = {'id': '1', 'status': 'Paid', 'insurer_name': ''}
+        with self.assertNumQueries(1):
+            for _ in range(3):
+                values = resolve(CLAIM_LIST_SCHEMA.values(row))
+        self.assertEqual(values[4:6], (ClaimStatus.objects.get(name='Paid').pk, None))
+        resolve(CLAIM_LIST_SCHEMA.values({**row, 'status': 'Denied'}))
+        with self.assertNumQueries(0):
+            resolve(CLAIM_LIST_SCHEMA.values({**row, 'status': 'Denied'}))
+
+    def test_lists_filter_and_search_by_name(self):
+        """Test that the list filters, facets and search see the names"""
+        load_feed(CSVSource(self.write_csv([
+            '1|Ann|10|5|Paid|Aetna|2024-01-02', '2|Bob|10|0|Denied|Cigna|', '3|Cal|10|5|Paid|Cigna|',
+        ])), CLAIM_LIST_SCHEMA)
+        self.client.force_login(User.objects.create_user(username='reviewer', password='testpass123'))
+
+        response = self.client.get(reverse('claims:claim_list_htmx'), {'status': 'Paid'})
+        self.assertEqual([claim.id for claim in response.context['page_obj']], [1, 3])
+        self.assertEqual(response.context['policies'], [
+            {'value': 'Aetna', 'count': 1}, {'value': 'Cigna', 'count': 1},
+        ])
+        self.assertContains(response, 'Cigna')
+        self.assertEqual(self.ids(search(ClaimList.objects.all(), 'cign')), [2, 3])
+
+    def test_admin_cannot_rename_or_delete_names(self):
+        """Test that the admin shows the lookups without letting staff change them"""
+        insurer = Insurer.intern('Aetna')
+        self.client.force_login(User.objects.create_superuser(username='admin', password='testpass123'))
+        url = reverse('admin:claims_insurer_change', args=[insurer.pk])
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotContains(response, 'name="name"')
+        self.assertEqual(self.client.post(url, {'name': 'Test Aetna'}).status_code, 403)
+        self.assertEqual(self.client.get(reverse('admin:claims_insurer_delete', args=[insurer.pk])).status_code, 403)
+        self.assertEqual(Insurer.objects.get(pk=insurer.pk).name, 'Aetna')
+
+    def ids(self, queryset):
+        return sorted(row.pk for row in queryset)
+
+
+class CptCodeTest(CacheResetMixin, TempFileMixin, TestCase):
+    """Test cases for the normalized CPT code table"""
+
+    header = 'id|claim_id|denial_reason|cpt_codes'
+
+    def codes(self, detail_id):
+        return sorted(ClaimDetailCPT.objects.filter(detail_id=detail_id).values_list('code', flat=True))
+
+    def test_codes_are_parsed_from_either_format(self):
+        """Test that comma-separated and list-like codes split the same way"""
+        self.assertEqual(parse_cpt_codes("['99204', '82947', '99204']"), ['99204', '82947'])
+        self.assertEqual(parse_cpt_codes('99204,82947'), ['99204', '82947'])
+        self.assertEqual(parse_cpt_codes(None), [])
+        self.assertEqual(parse_cpt_query(' 99204, 82947;99213 '), ['99204', '82947', '99213'])
+
+    def test_loads_refresh_the_code_table(self):
+        """Test that a full load splits every detail and a delta only the changed ones"""
+        lines = ['1|1|N/A|"99204,82947"', '2|1|Late filing|99213']
+        load_feed(CSVSource(self.write_csv(lines)), CLAIM_DETAIL_SCHEMA)
+        self.assertEqual((self.codes(1), self.codes(2)), (['82947', '99204'], ['99213']))
+
+        lines[0] = '1|1|N/A|99204'
+        load_feed(CSVSource(self.write_csv(lines)), CLAIM_DETAIL_SCHEMA, mode='incremental')
+        self.assertEqual((self.codes(1), self.codes(2)), (['99204'], ['99213']))
+
+    def test_filter_matches_whole_codes(self):
+        """Test that codes match exactly, by any or all of them"""
+        load_feed(CSVSource(self.write_csv([
+            '1|1||"99204,82947"', '2|1||99204', '3|1||992041',
+        ])), CLAIM_DETAIL_SCHEMA)
+
+        def matching(codes, match='any'):
+            return sorted(ClaimDetail.objects.filter(cpt_filter(codes, match)).values_list('id', flat=True))
+
+        self.assertEqual(matching(['99204']), [1, 2])
+        self.assertEqual(matching(['82947', '992041']), [1, 3])
+        self.assertEqual(matching(['99204', '82947'], MATCH_ALL), [1])
+
+        self.client.force_login(User.objects.create_user(username='reviewer', password='testpass123'))
+        response = self.client.get(reverse('claims:claim_details_list_htmx'),
+                                   {'cpt': '99204 82947', 'cpt_match': 'all'})
+        self.assertEqual([d.id for d in response.context['page_obj']], [1])
+
+    def test_code_stats(self):
+        """Test the per-code denial rate and billed amount, leaving out test insurers"""
+        ClaimList.objects.create(id=1, patient_name='Ann', status=ClaimStatus.intern('Paid'), insurer=Insurer.intern('Aetna'),
+                                 billed_amount=Decimal('100.00'))
+        ClaimList.objects.create(id=2, patient_name='Bob', status=ClaimStatus.intern('Denied'), insurer=Insurer.intern('Aetna'),
+                                 billed_amount=Decimal('40.00'))
+        ClaimList.objects.create(id=3, patient_name='Cal', status=ClaimStatus.intern('Denied'), insurer=Insurer.intern('Test Co'),
+                                 billed_amount=Decimal('70.00'), is_test_insurer=True)
+        load_feed(CSVSource(self.write_csv([
+            '1|1|N/A|"99204,82947"', '2|2|Late filing|99204', '3|3|Late filing|99204', '4|1|N/A|99204',
+        ])), CLAIM_DETAIL_SCHEMA)
+
+        stats = {row['code']: row for row in cpt_code_stats()}
+        self.assertEqual(set(stats), {'82947', '99204'})
+        self.assertEqual((stats['99204']['detail_count'], stats['99204']['denied_count']), (3, 1))
+        self.assertAlmostEqual(stats['99204']['denial_rate'], 100 / 3)
+        # Claim 1 has two details with the code but is billed once
+        self.assertEqual(stats['99204']['billed_total'], Decimal('140.00'))
+        self.assertEqual(stats['82947']['billed_total'], Decimal('100.00'))
+        self.assertEqual(stats['82947']['denial_rate'], 0)
+
+
+@skipUnless(importlib.util.find_spec('pyarrow'), 'Parquet snapshots need pyarrow')
+class SnapshotTest(TempFileMixin, TestCase):
+    """Test cases for Parquet snapshots and loading them back"""
+
+    def setUp(self):
+        import pyarrow.parquet
+        self.parquet = pyarrow.parquet
+        self.directory = self.make_directory()
+        self.user = User.objects.create_user(username='reviewer', password='testpass123')
+        ClaimList.objects.create(id=1, patient_name='Ann Smith', status=ClaimStatus.intern('Paid'), insurer=Insurer.intern('Test Insurer'),
+                                 billed_amount=Decimal('200.00'), paid_amount=Decimal('150.25'),
+                                 discharge_date=date(2024, 1, 2))
+        ClaimList.objects.create(id=2, patient_name='', status=ClaimStatus.intern('Denied'), insurer=Insurer.intern('Aetna'))
+        ClaimDetail.objects.create(id=10, claim_id=1, cpt_codes='99204', denial_reason=DenialReason.intern('Late filing'))
+        ClaimFlag.objects.create(claim_id=1, user=self.user, reason='Underpaid', flagged_at=timezone.now())
+
+    def claims(self):
+        return list(ClaimList.objects.order_by('id').values_list())
+
+    def test_snapshot_round_trips_through_load_feed(self):
+        """Test that a snapshot is typed, dictionary-encoded and loads back unchanged"""
+        before = self.claims()
+        written = write_snapshot(self.directory)
+        self.assertEqual({name: rows for name, (_, rows) in written.items()},
+                         {'claim_list': 2, 'claim_detail': 1, 'claim_flag': 1, 'claim_note': 0})
+
+        path = written['claim_list'][0]
+        schema = self.parquet.read_schema(path)
+        self.assertEqual(str(schema.field('billed_amount').type), 'decimal128(15, 2)')
+        self.assertTrue(str(schema.field('status').type).startswith('dictionary'))
+        self.assertEqual(self.parquet.read_table(written['claim_flag'][0]).column('user').to_pylist(),
+                         ['reviewer'])
+
+        ClaimDetail.objects.all().delete()
+        ClaimFlag.objects.all().delete()
+        ClaimList.objects.all().delete()
+        stats = load_feed(open_source(path), CLAIM_LIST_SCHEMA)
+        self.assertIsInstance(open_source(path), ParquetSource)
+        self.assertEqual((stats.rows_loaded, self.claims()), (2, before))
+
+        # Row by row, as incremental loads read it
+        ClaimList.objects.filter(id=2).update(status=ClaimStatus.intern('Paid'))
+        stats = load_feed(ParquetSource(path), CLAIM_LIST_SCHEMA, mode='incremental')
+        self.assertEqual((stats.updated, self.claims()), (1, before))
+
+    def test_full_snapshot_load_keeps_flags_and_notes(self):
+        """Test that a full load, which would delete the flags, is refused and a delta keeps them"""
+        write_snapshot(self.directory, names=['claim_list', 'claim_detail'])
+        options = {'format': 'parquet', 'data_dir': self.directory, 'stdout': io.StringIO()}
+        with self.assertRaises(CommandError):
+            call_command('load_claims_data', **options)
+
+        call_command('load_claims_data', incremental=True, **options)
+        self.assertEqual(list(ClaimFlag.objects.values_list('claim_id', 'reason')), [(1, 'Underpaid')])
+
+    def test_untyped_files_are_coerced_row_by_row(self):
+        """Test that a Parquet file of strings loads like the CSV feed"""
+        import pyarrow
+        path = os.path.join(self.directory, 'claim_detail_data.parquet')
+        self.parquet.write_table(pyarrow.table({
+            'id': ['11', 'bad'], 'claim_id': ['1', '1'], 'denial_reason': [None, ''], 'cpt_codes': ['99213', ''],
+        }), path)
+        self.assertIsNone(ParquetSource(path).typed_values(CLAIM_DETAIL_SCHEMA))
+        stats = load_feed(ParquetSource(path), CLAIM_DETAIL_SCHEMA, mode='append')
+        self.assertEqual((stats.rows_loaded, stats.rows_skipped), (1, 1))
+        self.assertIsNone(ClaimDetail.objects.get(id=11).denial_reason)
+
+    def test_api_streams_one_table(self):
+        """Test that the snapshot endpoint streams a readable Parquet file"""
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('claims:api_snapshot', args=['claim_detail']))
+        self.assertTrue(response.streaming)
+        table = self.parquet.read_table(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(table.column('cpt_codes').to_pylist(), ['99204'])
+        self.assertEqual(self.client.get(reverse('claims:api_snapshot', args=['users'])).status_code, 404)
+        self.assertEqual(set(SNAPSHOT_TABLES), {'claim_list', 'claim_detail', 'claim_flag', 'claim_note'})
+
+    def test_api_streams_row_groups_under_asgi(self):
+        """Test that under ASGI the file is an async stream rather than read whole first"""
+        async def read(response):
+            return [chunk async for chunk in response.streaming_content]
+
+        request = AsyncRequestFactory().get('/')
+        request.user = self.user
+        response = views.api_snapshot(request, 'claim_detail')
+        self.assertTrue(response.is_async)
+        table = self.parquet.read_table(io.BytesIO(b''.join(async_to_sync(read)(response))))
+        self.assertEqual(table.column('cpt_codes').to_pylist(), ['99204'])
+
+
+class ClaimViewTest(CacheResetMixin, TestCase):
+    """Test cases for the claim page's cached fragments"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='reviewer', password='testpass123')
+        self.other = User.objects.create_user(username='auditor', password='testpass123')
+        self.claim = ClaimList.objects.create(id=1, patient_name='Ann Smith', status=ClaimStatus.intern('Paid'),
+                                              insurer=Insurer.intern('Aetna'), billed_amount=Decimal('200.00'),
+                                              paid_amount=Decimal('150.00'))
+        for pk in (10, 11):
+            ClaimDetail.objects.create(id=pk, claim=self.claim, denial_reason=DenialReason.intern('Late filing'))
+        for user in (self.user, self.other):
+            ClaimFlag.objects.create(claim=self.claim, user=user, reason=f'Flagged by {user}', flagged_at=timezone.now())
+            ClaimNote.objects.create(claim=self.claim, user=user, note=f'Noted by {user}', created_at=timezone.now())
+
+    def test_fragments_are_read_in_a_fixed_number_of_queries(self):
+        """Test that a claim costs the same queries however many rows it has, and two once cached"""
+        # Claim, versions, line items, flags and notes
+        with self.assertNumQueries(5):
+            fragments = claim_view_context(1, self.user)['fragments']
+        self.assertIn('Claim Line Items (2 items)', fragments['line_items'])
+        self.assertIn('Flagged by auditor', fragments['flags'])
+        self.assertIn('Notes (2)', fragments['notes'])
+        self.assertIn('$50.00', fragments['summary'])
+
+        with self.assertNumQueries(2):
+            self.assertEqual(claim_view_context(1, self.user)['fragments'], fragments)
+
+    def test_writes_only_rerender_their_fragment(self):
+        """Test that a note or flag change re-renders that fragment alone"""
+        claim_view_context(1, self.user)
+        ClaimNote.objects.create(claim=self.claim, user=self.user, note='Called the insurer', created_at=timezone.now())
+        with self.assertNumQueries(3):
+            fragments = claim_view_context(1, self.user)['fragments']
+        self.assertIn('Called the insurer', fragments['notes'])
+
+        ClaimFlag.objects.filter(user=self.other).get().delete()
+        with self.assertNumQueries(3):
+            fragments = claim_view_context(1, self.user)['fragments']
+        self.assertNotIn('Flagged by auditor', fragments['flags'])
+
+        # Another claim's versions are untouched
+        ClaimList.objects.create(id=2, patient_name='Bob Jones')
+        claim_view_context(2, self.user)
+        ClaimNote.objects.create(claim=self.claim, user=self.user, note='Again', created_at=timezone.now())
+        with self.assertNumQueries(2):
+            claim_view_context(2, self.user)
+
+    def test_buttons_follow_the_viewer(self):
+        """Test that fragments vary by viewer and keep the CSRF token out of the cache"""
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('claims:flag_claim', args=[1]), {'reason': 'Duplicate'}, HTTP_HX_REQUEST='true')
+        self.assertContains(response, 'Duplicate')
+        self.assertContains(response, 'id="resolveFlagForm"')
+        self.assertContains(response, 'onclick="showDeleteFlagModal(', count=2)
+        self.assertNotIn('csrfmiddlewaretoken', response.context['fragments']['flags'])
+
+        self.client.force_login(self.other)
+        response = self.client.get(reverse('claims:claim_detail_htmx', args=[1]))
+        self.assertContains(response, 'onclick="showDeleteFlagModal(', count=1)
+        self.assertContains(response, 'onclick="showDeleteNoteModal(', count=1)
@@ -9,6 +9,7 @@ urlpatterns = [
     path('flags/', views.flagged_claims, name='flagged_claims'),
     path('notes/', views.notes_list, name='notes_list'),
     path('claims/htmx/', views.claim_list_htmx, name='claim_list_htmx'),
+    path('claims/export/', views.claim_list_export, name='claim_list_export'),
     path('claims/<str:claim_id>/', views.claim_detail, name='claim_detail'),
     path('claims/<str:claim_id>/htmx/', views.claim_detail_htmx, name='claim_detail_htmx'),
     path('claims/<str:claim_id>/flag/', views.flag_claim, name='flag_claim'),
@@ -19,9 +20,13 @@ urlpatterns = [
     path('notes/<int:note_id>/delete/', views.delete_note, name='delete_note'),
     path('claim-details/', views.claim_details_list, name='claim_details_list'),
     path('claim-details/htmx/', views.claim_details_list_htmx, name='claim_details_list_htmx'),
+    path('search/<str:list_name>/', views.live_search_results, name='live_search'),
     path('analytics/', views.analytics, name='analytics'),
     path('api/claims-data/', views.api_claims_data, name='api_claims_data'),
     path('api/data-status/', views.api_data_status, name='api_data_status'),
     path('api/check-changes/', views.api_check_changes, name='api_check_changes'),
     path('api/force-reload/', views.api_force_reload, name='api_force_reload'),
+    path('api/reload-jobs/<int:job_id>/', views.api_reload_job, name='api_reload_job'),
+    path('api/events/', views.api_events, name='api_events'),
+    path('api/snapshots/<str:table>/', views.api_snapshot, name='api_snapshot'),
 ]
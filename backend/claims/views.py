@@ -1,122 +1,80 @@
 from django.shortcuts import render, get_object_or_404, redirect
-from django.core.paginator import Paginator
-from django.db.models import Q, Sum, Count
-from django.http import JsonResponse, HttpResponse
+from django.urls import reverse
+from django.db.models import Sum
+from django.http import Http404, JsonResponse, HttpResponse, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.core.exceptions import ImproperlyConfigured
 from django.utils import timezone
-from django.db import models
 from django.contrib.auth import login
-from .models import ClaimList, ClaimDetail, ClaimFlag, ClaimNote
+from .models import ClaimList, ClaimDetail, ClaimFlag, ClaimNote, ClaimStatus, Insurer, ReloadJob
 from .forms import UserSignUpForm
 from .data_monitor import data_monitor
-import json
-from django.contrib.auth.models import User
+from .events import broadcaster, snapshot as events_snapshot
+from .jobs import enqueue_reload
+from .state import last_reload
+from .rollups import analytics_rollups
+from .claim_view import claim_view_context
+from .cpt import MATCH_ALL, MATCH_ANY, cpt_code_stats, cpt_filter, parse_cpt_query
+from .export import export_response
+from .facets import facet_counts
+from .live_search import live_params, live_results, live_search
+from .lookups import lookup_names
+from .pagination import KeysetPaginator
+from .search import RANKED_ORDERING, search
+from .snapshots import SNAPSHOT_EXTENSION, SNAPSHOT_TABLES, iter_parquet, load_pyarrow
+from .stats import dashboard_stats
+from .streaming import streaming_response
+from asgiref.sync import sync_to_async
+
+# Rows of the per-code table on the analytics page
+TOP_CPT_CODES = 15
 
 @login_required
 def dashboard(request):
     """Main dashboard view with summary statistics"""
-    # Get summary statistics (exclude test insurers)
-    total_claims = ClaimList.objects.exclude(
-        insurer_name__icontains='test'
-    ).count()
-    total_billed = ClaimList.objects.exclude(
-        insurer_name__icontains='test'
-    ).aggregate(total=Sum('billed_amount'))['total'] or 0
-    total_paid = ClaimList.objects.exclude(
-        insurer_name__icontains='test'
-    ).aggregate(total=Sum('paid_amount'))['total'] or 0
-    
-    # Calculate average claim amount
-    average_claim = total_billed / total_claims if total_claims > 0 else 0
-    
-    # Flagged claims statistics
-    total_flagged = ClaimFlag.objects.filter(is_resolved=False).count()
-    resolved_flags = ClaimFlag.objects.filter(is_resolved=True).count()
-    
-    # Calculate average underpayment (difference between billed and paid)
-    underpayment_data = ClaimList.objects.exclude(
-        insurer_name__icontains='test'
-    ).filter(
-        billed_amount__gt=0,
-        paid_amount__lt=models.F('billed_amount')
-    ).aggregate(
-        avg_underpayment=Sum(models.F('billed_amount') - models.F('paid_amount')) / Count('id')
-    )
-    avg_underpayment = underpayment_data['avg_underpayment'] or 0
-    
-    # Claims by status (exclude test insurers)
-    claims_by_status = ClaimList.objects.exclude(
-        insurer_name__icontains='test'
-    ).values('status').annotate(
-        count=Count('id')
-    ).order_by('-count')
-    
-    # Claims by insurer (exclude test insurers)
-    claims_by_insurer = ClaimList.objects.exclude(
-        insurer_name__icontains='test'
-    ).values('insurer_name').annotate(
-        count=Count('id')
-    ).order_by('-count')
-    
-    # Recent claims (exclude test insurers)
-    recent_claims = ClaimList.objects.exclude(
-        insurer_name__icontains='test'
-    ).order_by('-discharge_date')[:10]
-    
-    context = {
-        'total_claims': total_claims,
-        'total_billed': total_billed,
-        'total_paid': total_paid,
-        'average_claim': average_claim,
-        'total_flagged': total_flagged,
-        'resolved_flags': resolved_flags,
-        'avg_underpayment': avg_underpayment,
-        'claims_by_status': claims_by_status,
-        'claims_by_insurer': claims_by_insurer,
-        'recent_claims': recent_claims,
-    }
+    # Computed in one pass over the claims and cached until the data or
+    # the flags change (test insurers are excluded)
+    context = dashboard_stats()
     return render(request, 'claims/dashboard.html', context)
 
-@login_required
-def claim_list(request):
-    """View for listing all claims with search and filtering"""
-    claims = ClaimList.objects.all()
+def claim_list_context(params):
+    """Results of the claim list for a request's live params"""
+    claims = ClaimList.objects.select_related('status', 'insurer')
     
     # Search functionality
-    search_query = request.GET.get('search', '')
+    search_query = params.get('search', '')
     if search_query:
-        claims = claims.filter(
-            Q(id__icontains=search_query) |
-            Q(patient_name__icontains=search_query) |
-            Q(insurer_name__icontains=search_query)
-        )
+        claims = live_search(claims, search_query)
+    
+    status_filter = params.get('status', '')
+    policy_filter = params.get('policy', '')
+    
+    # Filter options with counts; each one counts under the other filters
+    # but not its own (exclude test insurers)
+    statuses = facet_counts(
+        claims.filter(insurer__name=policy_filter) if policy_filter else claims,
+        'status', status_filter,
+    )
+    policies = facet_counts(
+        (claims.filter(status__name=status_filter) if status_filter else claims).filter(is_test_insurer=False),
+        'insurer', policy_filter,
+    )
     
     # Filter by status
-    status_filter = request.GET.get('status', '')
     if status_filter:
-        claims = claims.filter(status=status_filter)
+        claims = claims.filter(status__name=status_filter)
     
     # Filter by insurer
-    policy_filter = request.GET.get('policy', '')
     if policy_filter:
-        claims = claims.filter(insurer_name=policy_filter)
+        claims = claims.filter(insurer__name=policy_filter)
     
-
-    
-    # Get unique values for filters (exclude test insurers)
-    statuses = ClaimList.objects.values_list('status', flat=True).distinct()
-    policies = ClaimList.objects.exclude(
-        insurer_name__icontains='test'
-    ).values_list('insurer_name', flat=True).distinct()
+    # Keyset pagination: searches by rank, otherwise by ID
+    paginator = KeysetPaginator(claims, RANKED_ORDERING if search_query else ('id',), params=params)
+    page_obj = paginator.page(params)
     
-    # Pagination - add ordering to prevent inconsistent results
-    claims = claims.order_by('id')  # Order by ID for consistent pagination
-    paginator = Paginator(claims, 25)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    
-    context = {
+    return {
         'page_obj': page_obj,
         'search_query': search_query,
         'status_filter': status_filter,
@@ -124,204 +82,110 @@ def claim_list(request):
         'statuses': statuses,
         'policies': policies,
     }
+
+def filtered_claims(params):
+    """The claims matching the claim list's search and filters"""
+    claims = ClaimList.objects.all()
+    if params.get('search'):
+        claims = search(claims, params['search'])
+    if params.get('status'):
+        claims = claims.filter(status__name=params['status'])
+    if params.get('policy'):
+        claims = claims.filter(insurer__name=params['policy'])
+    return claims
+
+@login_required
+def claim_list(request):
+    """View for listing all claims with search and filtering"""
+    params = live_params(request.GET)
+    context = live_results('claim_list', params, lambda: claim_list_context(params))
+    # The box shows the search as typed, not as normalized
+    context = {**context, 'search_query': request.GET.get('search', '')}
     return render(request, 'claims/claim_list.html', context)
 
+@login_required
+def claim_list_export(request):
+    """CSV export of every claim matching the claim list's filters, with its details"""
+    claims = filtered_claims(live_params(request.GET))
+    filename = f"claims-{timezone.localtime():%Y%m%d-%H%M%S}.csv"
+    return export_response(request, claims, filename)
+
 @login_required
 def claim_detail(request, claim_id):
     """View for displaying detailed information about a specific claim"""
     claim = get_object_or_404(ClaimList, id=claim_id)
-    claim_details = ClaimDetail.objects.filter(claim_id=claim_id)
     
     # Handle CSV export
     if request.GET.get('export') == 'csv':
-        import csv
-        from django.http import HttpResponse
-        
-        try:
-            # Build a safe filename using claim id and patient name
-            patient_name = (claim.patient_name or 'patient').strip()
-            safe_patient = ''.join(ch.lower() if ch.isalnum() else '-' for ch in patient_name)
-            safe_patient = '-'.join(filter(None, safe_patient.split('-')))  # collapse repeats
-            filename = f"{claim_id}-{safe_patient}.csv"
-            response = HttpResponse(content_type='text/csv; charset=utf-8')
-            response['Content-Disposition'] = f'attachment; filename="{filename}"'
-            response['Access-Control-Allow-Origin'] = '*'
-            
-            writer = csv.writer(response, quoting=csv.QUOTE_MINIMAL)
-            
-            # Calculate financial metrics
-            total_billed = float(claim.billed_amount or 0)
-            total_paid = float(claim.paid_amount or 0)
-            outstanding_balance = total_billed - total_paid
-            payment_rate = (total_paid / total_billed * 100) if total_billed > 0 else 0
-            
-            # Header
-            writer.writerow([
-                'Claim ID',
-                'Patient Name',
-                'Insurer',
-                'Status',
-                'Discharge Date',
-                'Billed Amount',
-                'Paid Amount',
-                'Outstanding Balance',
-                'Payment Rate (%)',
-                'Detail ID',
-                'CPT Codes',
-                'Denial Reason',
-            ])
-            
-            # Write one row per claim detail; include claim meta on each row
-            details_qs = ClaimDetail.objects.filter(claim_id=claim_id).order_by('id')
-            if details_qs.exists():
-                for detail in details_qs:
-                    # Normalize CPT codes: handle comma-separated or list-like strings
-                    raw_codes = detail.cpt_codes or ''
-                    if raw_codes:
-                        parts = [p.strip().strip("[]'\"") for p in raw_codes.split(',')]
-                        parts = [p for p in parts if p]
-                        cpt_normalized = '; '.join(parts) if parts else '-'
-                    else:
-                        cpt_normalized = '-'
-                    writer.writerow([
-                        claim.id,
-                        claim.patient_name or '-',
-                        claim.insurer_name or '-',
-                        claim.status or '-',
-                        claim.discharge_date.strftime('%m/%d/%Y') if claim.discharge_date else '-',
-                        f"{total_billed:.2f}",
-                        f"{total_paid:.2f}",
-                        f"{outstanding_balance:.2f}",
-                        f"{payment_rate:.1f}",
-                        detail.id,
-                        cpt_normalized,
-                        detail.denial_reason or '-',
-                    ])
-            else:
-                # Write a single row with claim info if no details exist
-                writer.writerow([
-                    claim.id,
-                    claim.patient_name or '-',
-                    claim.insurer_name or '-',
-                    claim.status or '-',
-                    claim.discharge_date.strftime('%m/%d/%Y') if claim.discharge_date else '-',
-                    f"{total_billed:.2f}",
-                    f"{total_paid:.2f}",
-                    f"{outstanding_balance:.2f}",
-                    f"{payment_rate:.1f}",
-                    '-',
-                    '-',
-                    '-',
-                ])
-            
-            return response
-        except Exception as e:
-            # Return error response if CSV generation fails
-            error_response = HttpResponse(f"Error generating CSV: {str(e)}", content_type='text/plain')
-            error_response.status_code = 500
-            return error_response
-    
-    # Calculate totals
-    total_billed = claim.billed_amount or 0
-    total_paid = claim.paid_amount or 0
-    total_allowed = total_paid  # Since we don't have allowed amount in our model
-    
-    # Calculate additional financial metrics
-    outstanding_balance = total_billed - total_paid
-    payment_rate = (total_paid / total_billed * 100) if total_billed > 0 else 0
-    
-    # Get flags and notes
-    flags = claim.flags.all().order_by('-flagged_at')
-    notes = claim.notes.all().order_by('-created_at')
-    
-    context = {
-        'claim': claim,
-        'claim_details': claim_details,
-        'total_billed': total_billed,
-        'total_paid': total_paid,
-        'total_allowed': total_allowed,
-        'outstanding_balance': outstanding_balance,
-        'payment_rate': payment_rate,
-        'flags': flags,
-        'notes': notes,
-    }
+        # Build a safe filename using claim id and patient name
+        patient_name = (claim.patient_name or 'patient').strip()
+        safe_patient = ''.join(ch.lower() if ch.isalnum() else '-' for ch in patient_name)
+        safe_patient = '-'.join(filter(None, safe_patient.split('-')))  # collapse repeats
+        response = export_response(request, ClaimList.objects.filter(id=claim.id), f"{claim_id}-{safe_patient}.csv")
+        response['Access-Control-Allow-Origin'] = '*'
+        return response
+    
+    # The claim's content is loaded by claim_detail_htmx
+    context = {'claim': claim}
     return render(request, 'claims/claim_detail.html', context)
 
 @login_required
 def claim_detail_htmx(request, claim_id):
     """HTMX view for claim detail without full page reload"""
-    claim = get_object_or_404(ClaimList, id=claim_id)
-    claim_details = ClaimDetail.objects.filter(claim_id=claim_id)
-    
-    # Calculate totals
-    total_billed = claim.billed_amount or 0
-    total_paid = claim.paid_amount or 0
-    total_allowed = total_paid
-    
-    # Calculate additional financial metrics
-    outstanding_balance = total_billed - total_paid
-    payment_rate = (total_paid / total_billed * 100) if total_billed > 0 else 0
-    
-    # Get flags and notes
-    flags = claim.flags.all().order_by('-flagged_at')
-    notes = claim.notes.all().order_by('-created_at')
-    
-    context = {
-        'claim': claim,
-        'claim_details': claim_details,
-        'total_billed': total_billed,
-        'total_paid': total_paid,
-        'total_allowed': total_allowed,
-        'outstanding_balance': outstanding_balance,
-        'payment_rate': payment_rate,
-        'flags': flags,
-        'notes': notes,
-    }
-    return render(request, 'claims/claim_detail_partial.html', context)
+    return render_claim_partial(request, claim_id)
 
-@login_required
-def claim_details_list(request):
-    """View for listing all claim details with search and filtering"""
-    details = ClaimDetail.objects.all()
+def render_claim_partial(request, claim_id):
+    """The claim detail partial, assembled from cached fragments"""
+    return render(request, 'claims/claim_detail_partial.html', claim_view_context(claim_id, request.user))
+
+def claim_details_context(params):
+    """Results of the claim details list for a request's live params"""
+    details = ClaimDetail.objects.select_related('claim__status', 'claim__insurer', 'denial_reason')
     
     # Search functionality
-    search_query = request.GET.get('search', '')
+    search_query = params.get('search', '')
     if search_query:
-        details = details.filter(
-            Q(claim_id__icontains=search_query) |
-            Q(denial_reason__icontains=search_query) |
-            Q(cpt_codes__icontains=search_query)
-        )
+        details = live_search(details, search_query)
+    
+    # Filter by exact CPT codes, matching any or all of them
+    cpt_query = params.get('cpt', '')
+    cpt_match = MATCH_ALL if params.get('cpt_match') == MATCH_ALL else MATCH_ANY
+    cpt_codes = parse_cpt_query(cpt_query)
+    if cpt_codes:
+        details = details.filter(cpt_filter(cpt_codes, cpt_match))
+    
+    # Denial reasons with counts under the search
+    denial_filter = params.get('denial_reason', '')
+    denial_reasons = facet_counts(details, 'denial_reason', denial_filter)
     
     # Filter by denial reason
-    denial_filter = request.GET.get('denial_reason', '')
     if denial_filter:
         if denial_filter == 'No Denial':
-            # Filter for records with no denial reason (None or empty)
-            details = details.filter(denial_reason__isnull=True) | details.filter(denial_reason='')
+            # Filter for records with no denial reason
+            details = details.filter(denial_reason__isnull=True)
         else:
-            details = details.filter(denial_reason=denial_filter)
-    
-    # Get unique values for filters - exclude None values
-    denial_reasons = ClaimDetail.objects.exclude(
-        denial_reason__isnull=True
-    ).exclude(
-        denial_reason=''
-    ).values_list('denial_reason', flat=True).distinct()
-    
-    # Pagination - add ordering to prevent inconsistent results
-    details = details.order_by('id')  # Order by ID for consistent pagination
+            details = details.filter(denial_reason__name=denial_filter)
     
-    paginator = Paginator(details, 25)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Keyset pagination: searches by rank, otherwise by ID
+    paginator = KeysetPaginator(details, RANKED_ORDERING if search_query else ('id',), params=params)
+    page_obj = paginator.page(params)
     
-    context = {
+    return {
         'page_obj': page_obj,
         'search_query': search_query,
         'denial_filter': denial_filter,
         'denial_reasons': denial_reasons,
+        'cpt_query': cpt_query,
+        'cpt_match': cpt_match,
     }
+
+@login_required
+def claim_details_list(request):
+    """View for listing all claim details with search and filtering"""
+    params = live_params(request.GET)
+    context = live_results('claim_details', params, lambda: claim_details_context(params))
+    # The box shows the search as typed, not as normalized
+    context = {**context, 'search_query': request.GET.get('search', '')}
     return render(request, 'claims/claim_details_list.html', context)
 
 @login_required
@@ -329,64 +193,65 @@ def analytics(request):
     """Analytics view with charts and statistics"""
 
     
-    # Get total claims count (exclude test insurers)
-    total_claims = ClaimList.objects.exclude(
-        insurer_name__icontains='test'
-    ).count()
-    
-    # Calculate total billed amount (exclude test insurers)
-    total_billed = ClaimList.objects.exclude(
-        insurer_name__icontains='test'
-    ).aggregate(total=Sum('billed_amount'))['total'] or 0
-    
-    # Claims by month (exclude test insurers) - using date function instead of strftime
-    claims_by_month = ClaimList.objects.exclude(
-        insurer_name__icontains='test'
-    ).extra(
-        select={'month': "date(discharge_date, 'start of month')"}
-    ).values('month').annotate(
-        count=Count('id'),
-        total_billed=Sum('billed_amount'),
-        total_paid=Sum('paid_amount')
-    ).order_by('month')
-    
-    # Claims by insurer (exclude test insurers)
-    insurer_data = ClaimList.objects.exclude(
-        insurer_name__icontains='test'
-    ).values('insurer_name').annotate(
-        count=Count('id'),
-        total_billed=Sum('billed_amount'),
-        total_paid=Sum('paid_amount')
-    ).order_by('-total_paid')[:10]
+    # Everything comes from the precomputed rollups (test insurers excluded),
+    # so the cost does not grow with the number of claims
+    rollups = analytics_rollups()
+    totals = rollups.aggregate(total_claims=Sum('claim_count'), total_billed=Sum('billed_total'))
+    total_claims = totals['total_claims'] or 0
+    total_billed = totals['total_billed'] or 0
+    
+    # Claims by month
+    claims_by_month = list(rollups.values('month').annotate(
+        count=Sum('claim_count'),
+        total_billed=Sum('billed_total'),
+        total_paid=Sum('paid_total')
+    ).order_by('month'))
+    
+    # Claims by insurer, grouped by key and named from the lookup table
+    insurer_data = list(rollups.values('insurer').annotate(
+        count=Sum('claim_count'),
+        total_billed=Sum('billed_total'),
+        total_paid=Sum('paid_total')
+    ).order_by('-total_paid')[:10])
+    insurer_names = lookup_names(Insurer, [insurer['insurer'] for insurer in insurer_data])
     
     # Calculate averages for display
     for month in claims_by_month:
+        month['month'] = month['month'].isoformat() if month['month'] else None
         month['average'] = month['total_billed'] / month['count'] if month['count'] > 0 else 0
     
     for insurer in insurer_data:
+        insurer['insurer_name'] = insurer_names.get(insurer.pop('insurer'))
         insurer['average'] = insurer['total_paid'] / insurer['count'] if insurer['count'] > 0 else 0
     
     # Get first insurer for summary cards
     first_insurer = insurer_data[0] if insurer_data else None
     
+    # CPT codes with the largest billed amounts
+    cpt_data = sorted(cpt_code_stats(), key=lambda row: (-(row['billed_total'] or 0), row['code']))[:TOP_CPT_CODES]
+    
     context = {
         'total_claims': total_claims,
         'total_billed': total_billed,
-        'claims_by_month': list(claims_by_month),
-        'insurer_data': list(insurer_data),
+        'claims_by_month': claims_by_month,
+        'insurer_data': insurer_data,
         'first_insurer': first_insurer,
+        'cpt_data': cpt_data,
     }
     return render(request, 'claims/analytics.html', context)
 
 @login_required
 def api_claims_data(request):
     """API endpoint for claims data (for charts)"""
-    claims_data = ClaimList.objects.exclude(
-        insurer_name__icontains='test'
-    ).values('status').annotate(
-        count=Count('id')
+    claims_data = analytics_rollups().values('status').annotate(
+        count=Sum('claim_count')
+    ).order_by()
+    names = lookup_names(ClaimStatus)
+    data = sorted(
+        ({'status': names.get(row['status']), 'count': row['count']} for row in claims_data),
+        key=lambda row: (row['status'] is not None, row['status'] or ''),
     )
-    return JsonResponse({'data': list(claims_data)})
+    return JsonResponse({'data': data})
 
 @login_required
 def api_data_status(request):
@@ -399,6 +264,7 @@ def api_data_status(request):
             'total_claims': ClaimList.objects.count(),
             'total_claim_details': ClaimDetail.objects.count(),
             'last_check': timezone.now().isoformat(),
+            'last_reload': last_reload(),
         })
         
         return JsonResponse(data_status)
@@ -407,7 +273,7 @@ def api_data_status(request):
 
 @login_required
 def api_check_changes(request):
-    """API endpoint to check for CSV changes"""
+    """API endpoint to check for CSV changes, queueing a reload if there are any"""
     try:
         changes, current_hashes = data_monitor.check_for_changes()
         
@@ -418,79 +284,103 @@ def api_check_changes(request):
             'last_check': timezone.now().isoformat(),
         }
         
+        if changes:
+            # The check recorded the change for every worker, so no other
+            # poll will see it: the reload has to be queued here
+            job, _ = enqueue_reload(request.user, follow_up=True)
+            response_data['job_id'] = job.id
+            response_data['status_url'] = reverse('claims:api_reload_job', args=[job.id])
+        
         return JsonResponse(response_data)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
 @login_required
 def api_force_reload(request):
-    """API endpoint to force data reload"""
+    """API endpoint to queue a data reload; the run_reload_jobs worker does the loading"""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Reloads must be requested with POST'}, status=405)
+
     try:
-        from .management.commands.load_claims_data import Command as LoadDataCommand
-        
-        # Force reload data
-        load_command = LoadDataCommand()
-        load_command.handle()
-        
-        # Update cache timestamp
-        from django.core.cache import cache
-        cache.set('last_data_reload', timezone.now().isoformat(), timeout=3600)
-        
+        # Requests made while a reload is queued or running share that job
+        job, created = enqueue_reload(request.user)
+
         return JsonResponse({
             'success': True,
-            'message': 'Data reload completed successfully',
-            'reloaded_at': timezone.now().isoformat(),
-            'total_claims': ClaimList.objects.count(),
-            'total_claim_details': ClaimDetail.objects.count(),
-        })
+            'message': 'Data reload queued' if created else 'Data reload already in progress',
+            'job_id': job.id,
+            'status': job.status,
+            'created': created,
+            'status_url': reverse('claims:api_reload_job', args=[job.id]),
+        }, status=202)
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
+@login_required
+def api_snapshot(request, table):
+    """One table of the current data as a streamed Parquet file"""
+    if table not in SNAPSHOT_TABLES:
+        return JsonResponse({'error': f'Unknown table: {table}'}, status=404)
+    try:
+        load_pyarrow()
+    except ImproperlyConfigured as e:
+        return JsonResponse({'error': str(e)}, status=501)
+
+    snapshot = SNAPSHOT_TABLES[table]
+    response = streaming_response(request, iter_parquet(snapshot), content_type='application/vnd.apache.parquet')
+    response['Content-Disposition'] = f'attachment; filename="{snapshot.filename}{SNAPSHOT_EXTENSION}"'
+    return response
+
+@login_required
+def api_reload_job(request, job_id):
+    """API endpoint reporting the progress and row counts of a reload job"""
+    try:
+        job = ReloadJob.objects.get(id=job_id)
+    except ReloadJob.DoesNotExist:
+        return JsonResponse({'error': 'Reload job not found'}, status=404)
+
+    return JsonResponse(job.as_dict())
+
+async def api_events(request):
+    """Server-sent events stream of data-version and reload-progress events"""
+    # login_required does not support async views before Django 5.0
+    is_authenticated = await sync_to_async(lambda: request.user.is_authenticated)()
+    if not is_authenticated:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+
+    if isinstance(request, ASGIRequest):
+        response = StreamingHttpResponse(broadcaster.stream(), content_type='text/event-stream')
+    else:
+        # A WSGI worker cannot hold a stream open, so send the current
+        # events and let the browser reconnect later
+        response = HttpResponse(await sync_to_async(events_snapshot)(), content_type='text/event-stream')
+
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+# Lists served by the live search endpoint, by URL name: the name their
+# results are cached under, the builder of those results and the template
+# rendering them
+LIVE_SEARCH_LISTS = {
+    'claims': ('claim_list', claim_list_context, 'claims/claim_list_partial.html'),
+    'claim-details': ('claim_details', claim_details_context, 'claims/claim_details_list_partial.html'),
+}
+
+@login_required
+def live_search_results(request, list_name):
+    """Live search endpoint: a list's results for the current search and filters"""
+    if list_name not in LIVE_SEARCH_LISTS:
+        raise Http404(f'Unknown list: {list_name}')
+    name, build, template = LIVE_SEARCH_LISTS[list_name]
+    params = live_params(request.GET)
+    context = live_results(name, params, lambda: build(params))
+    return render(request, template, context)
+
 @login_required
 def claim_list_htmx(request):
-    """HTMX view for live search results"""
-    claims = ClaimList.objects.all()
-    
-    # Search functionality
-    search_query = request.GET.get('search', '')
-    if search_query:
-        claims = claims.filter(
-            Q(id__icontains=search_query) |
-            Q(patient_name__icontains=search_query) |
-            Q(insurer_name__icontains=search_query)
-        )
-    
-    # Filter by status
-    status_filter = request.GET.get('status', '')
-    if status_filter:
-        claims = claims.filter(status=status_filter)
-    
-    # Filter by insurer
-    policy_filter = request.GET.get('policy', '')
-    if policy_filter:
-        claims = claims.filter(insurer_name=policy_filter)
-    
-    # Get unique values for filters (exclude test insurers)
-    statuses = ClaimList.objects.values_list('status', flat=True).distinct()
-    policies = ClaimList.objects.exclude(
-        insurer_name__icontains='test'
-    ).values_list('insurer_name', flat=True).distinct()
-    
-    # Pagination - add ordering to prevent inconsistent results
-    claims = claims.order_by('id')  # Order by ID for consistent pagination
-    paginator = Paginator(claims, 25)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    
-    context = {
-        'page_obj': page_obj,
-        'search_query': search_query,
-        'status_filter': status_filter,
-        'policy_filter': policy_filter,
-        'statuses': statuses,
-        'policies': policies,
-    }
-    return render(request, 'claims/claim_list_partial.html', context)
+    """The claim list's live search results, at their original URL"""
+    return live_search_results(request, 'claims')
 
 @login_required
 def flagged_claims(request):
@@ -503,29 +393,24 @@ def flagged_claims(request):
     elif status_filter == 'resolved':
         flags = flags.filter(is_resolved=True)
 
+    search_query = request.GET.get('search', '')
+    if search_query:
+        flags = search(flags, search_query)
+
     user_filter = request.GET.get('user', '')
+    users = facet_counts(flags, 'user__username', user_filter)
     if user_filter:
         flags = flags.filter(user__username=user_filter)
 
-    search_query = request.GET.get('search', '')
-    if search_query:
-        flags = flags.filter(
-            Q(claim__id__icontains=search_query) |
-            Q(claim__patient_name__icontains=search_query) |
-            Q(reason__icontains=search_query)
-        )
-
-    flags = flags.order_by('-flagged_at')
-    paginator = Paginator(flags, 25)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    paginator = KeysetPaginator(flags, ('-flagged_at', '-id'), params=request.GET)
+    page_obj = paginator.page(request.GET)
 
     context = {
         'page_obj': page_obj,
         'search_query': search_query,
         'status_filter': status_filter,
         'user_filter': user_filter,
-        'users': User.objects.values_list('username', flat=True).order_by('username'),
+        'users': users,
     }
     return render(request, 'claims/flagged_claims.html', context)
 
@@ -536,65 +421,30 @@ def notes_list(request):
 
     search_query = request.GET.get('search', '')
     if search_query:
-        notes = notes.filter(
-            Q(claim__id__icontains=search_query) |
-            Q(claim__patient_name__icontains=search_query) |
-            Q(note__icontains=search_query) |
-            Q(user__username__icontains=search_query)
-        )
+        notes = search(notes, search_query)
 
     user_filter = request.GET.get('user', '')
+    users = facet_counts(notes, 'user__username', user_filter)
     if user_filter:
         notes = notes.filter(user__username=user_filter)
 
-    notes = notes.order_by('-created_at')
-    paginator = Paginator(notes, 25)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    paginator = KeysetPaginator(notes, ('-created_at', '-id'), params=request.GET)
+    page_obj = paginator.page(request.GET)
 
     context = {
         'page_obj': page_obj,
         'search_query': search_query,
         'user_filter': user_filter,
-        'users': User.objects.values_list('username', flat=True).order_by('username'),
+        'users': users,
     }
     return render(request, 'claims/notes_list.html', context)
 
 
 @login_required
 def claim_details_list_htmx(request):
-    """HTMX view for claim details live search results"""
-    claim_details = ClaimDetail.objects.all()
-    
-    # Search functionality
-    search_query = request.GET.get('search', '')
-    if search_query:
-        claim_details = claim_details.filter(
-            Q(id__icontains=search_query) |
-            Q(claim_id__icontains=search_query)
-        )
-    
-    # Filter by denial reason
-    denial_filter = request.GET.get('denial_reason', '')
-    if denial_filter:
-        claim_details = claim_details.filter(denial_reason=denial_filter)
-    
-    # Get unique values for filters
-    denial_reasons = ClaimDetail.objects.values_list('denial_reason', flat=True).distinct()
-    
-    # Pagination
-    claim_details = claim_details.order_by('id')
-    paginator = Paginator(claim_details, 25)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    
-    context = {
-        'page_obj': page_obj,
-        'search_query': search_query,
-        'denial_filter': denial_filter,
-        'denial_reasons': denial_reasons,
-    }
-    return render(request, 'claims/claim_details_list_partial.html', context)
+    """The claim details list's live search results, at their original URL"""
+    return live_search_results(request, 'claim-details')
+
 
 @login_required
 def flag_claim(request, claim_id):
@@ -613,34 +463,7 @@ def flag_claim(request, claim_id):
         
         if request.headers.get('HX-Request'):
             # Return the updated claim detail partial for HTMX
-            claim = get_object_or_404(ClaimList, id=claim_id)
-            claim_details = ClaimDetail.objects.filter(claim_id=claim_id)
-            
-            # Calculate totals
-            total_billed = claim.billed_amount or 0
-            total_paid = claim.paid_amount or 0
-            total_allowed = total_paid
-            
-            # Calculate additional financial metrics
-            outstanding_balance = total_billed - total_paid
-            payment_rate = (total_paid / total_billed * 100) if total_billed > 0 else 0
-            
-            # Get flags and notes
-            flags = claim.flags.all().order_by('-flagged_at')
-            notes = claim.notes.all().order_by('-created_at')
-            
-            context = {
-                'claim': claim,
-                'claim_details': claim_details,
-                'total_billed': total_billed,
-                'total_paid': total_paid,
-                'total_allowed': total_allowed,
-                'outstanding_balance': outstanding_balance,
-                'payment_rate': payment_rate,
-                'flags': flags,
-                'notes': notes,
-            }
-            return render(request, 'claims/claim_detail_partial.html', context)
+            return render_claim_partial(request, claim_id)
         return redirect('claims:claim_detail', claim_id=claim_id)
     
     return redirect('claims:claim_detail', claim_id=claim_id)
@@ -664,34 +487,7 @@ def add_note(request, claim_id):
         
         if request.headers.get('HX-Request'):
             # Return the updated claim detail partial for HTMX
-            claim = get_object_or_404(ClaimList, id=claim_id)
-            claim_details = ClaimDetail.objects.filter(claim_id=claim_id)
-            
-            # Calculate totals
-            total_billed = claim.billed_amount or 0
-            total_paid = claim.paid_amount or 0
-            total_allowed = total_paid
-            
-            # Calculate additional financial metrics
-            outstanding_balance = total_billed - total_paid
-            payment_rate = (total_paid / total_billed * 100) if total_billed > 0 else 0
-            
-            # Get flags and notes
-            flags = claim.flags.all().order_by('-flagged_at')
-            notes = claim.notes.all().order_by('-created_at')
-            
-            context = {
-                'claim': claim,
-                'claim_details': claim_details,
-                'total_billed': total_billed,
-                'total_paid': total_paid,
-                'total_allowed': total_allowed,
-                'outstanding_balance': outstanding_balance,
-                'payment_rate': payment_rate,
-                'flags': flags,
-                'notes': notes,
-            }
-            return render(request, 'claims/claim_detail_partial.html', context)
+            return render_claim_partial(request, claim_id)
         return redirect('claims:claim_detail', claim_id=claim_id)
     
     return redirect('claims:claim_detail', claim_id=claim_id)
@@ -713,35 +509,8 @@ def resolve_flag(request, flag_id):
         
         if request.headers.get('HX-Request'):
             # Return the updated claim detail partial for HTMX
-            claim = get_object_or_404(ClaimList, id=flag.claim.id)
-            claim_details = ClaimDetail.objects.filter(claim_id=flag.claim.id)
-            
-            # Calculate totals
-            total_billed = claim.billed_amount or 0
-            total_paid = claim.paid_amount or 0
-            total_allowed = total_paid
-            
-            # Calculate additional financial metrics
-            outstanding_balance = total_billed - total_paid
-            payment_rate = (total_paid / total_billed * 100) if total_billed > 0 else 0
-            
-            # Get flags and notes
-            flags = claim.flags.all().order_by('-flagged_at')
-            notes = claim.notes.all().order_by('-created_at')
-            
-            context = {
-                'claim': claim,
-                'claim_details': claim_details,
-                'total_billed': total_billed,
-                'total_paid': total_paid,
-                'total_allowed': total_allowed,
-                'outstanding_balance': outstanding_balance,
-                'payment_rate': payment_rate,
-                'flags': flags,
-                'notes': notes,
-            }
-            return render(request, 'claims/claim_detail_partial.html', context)
-        return redirect('claims:claim_detail', claim_id=flag.claim.id)
+            return render_claim_partial(request, flag.claim_id)
+        return redirect('claims:claim_detail', claim_id=flag.claim_id)
     
     return redirect('claims:claim_detail', claim_id=flag.claim.id)
 
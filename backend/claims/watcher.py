@@ -0,0 +1,178 @@
+"""
+Event-driven watching of the Data folder.
+
+On Linux the folder is watched with inotify, called through libc so no
+extra package is needed; the process sleeps in select() until the kernel
+reports a write. Elsewhere, or when inotify is unavailable, a polling
+watcher compares stat fingerprints (no file reads) once per interval.
+
+Either way ``watch_changes`` only yields a file once it is completely
+written: inotify reports the writer closing the file (or an atomic rename
+into place), and the polling watcher waits for a poll in which the file
+did not change. Bursts of writes are debounced into a single batch.
+"""
+import ctypes
+import os
+import select
+import struct
+import time
+from pathlib import Path
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Quiet time after the last completed write before a batch is released
+DEBOUNCE_SECONDS = 0.25
+
+# How often the polling fallback stats the folder
+POLL_INTERVAL = 1.0
+
+# inotify event masks, from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+
+# Events after which the file is no longer being written
+IN_COMPLETE = IN_CLOSE_WRITE | IN_MOVED_TO | IN_MOVED_FROM | IN_DELETE
+
+EVENT_HEADER = struct.Struct('iIII')
+READ_SIZE = 64 * 1024
+
+
+class InotifyWatcher:
+    """Reports writes in a directory as they happen, using Linux inotify"""
+
+    kind = 'inotify'
+
+    def __init__(self, directory):
+        libc = ctypes.CDLL(None, use_errno=True)
+        # Raises AttributeError where libc has no inotify
+        init, add_watch = libc.inotify_init1, libc.inotify_add_watch
+
+        self.fd = init(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+
+        mask = IN_MODIFY | IN_CREATE | IN_COMPLETE
+        if add_watch(self.fd, os.fsencode(str(directory)), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, os.strerror(errno), str(directory))
+
+    def read(self, timeout=None):
+        """
+        Wait up to ``timeout`` seconds (forever if None) and return
+        ``(name, complete)`` for each event.
+        """
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, READ_SIZE)
+        except BlockingIOError:
+            return []
+
+        events = []
+        offset = 0
+        while offset < len(data):
+            _, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b'\0')
+            offset += length
+            if name:
+                events.append((os.fsdecode(name), bool(mask & IN_COMPLETE)))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """Fallback that compares stat fingerprints once per interval"""
+
+    kind = 'polling'
+
+    def __init__(self, directory, interval=POLL_INTERVAL):
+        self.directory = Path(directory)
+        self.interval = interval
+        self.snapshot = self.scan()
+        self.unsettled = set()
+
+    def scan(self):
+        """Map each file name to its (size, mtime_ns, inode)"""
+        snapshot = {}
+        try:
+            entries = list(os.scandir(self.directory))
+        except OSError:
+            return snapshot
+        for entry in entries:
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            snapshot[entry.name] = (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+        return snapshot
+
+    def read(self, timeout=None):
+        """
+        Sleep for one interval (or ``timeout`` if shorter) and return
+        ``(name, complete)`` for files that changed or have since settled.
+        """
+        time.sleep(self.interval if timeout is None else min(timeout, self.interval))
+        current = self.scan()
+
+        changed = {
+            name for name in current.keys() | self.snapshot.keys()
+            if current.get(name) != self.snapshot.get(name)
+        }
+        settled = self.unsettled - changed
+        self.snapshot = current
+        self.unsettled = changed
+
+        # A file counts as completely written once a poll sees it unchanged
+        return [(name, False) for name in changed] + [(name, True) for name in settled]
+
+    def close(self):
+        pass
+
+
+def open_watcher(directory, interval=POLL_INTERVAL):
+    """Watch ``directory`` with inotify where available, polling otherwise"""
+    try:
+        return InotifyWatcher(directory)
+    except (AttributeError, OSError) as e:
+        logger.info(f'inotify unavailable for {directory} ({e}); polling every {interval}s')
+        return PollingWatcher(directory, interval)
+
+
+def watch_changes(directory, suffix='.csv', debounce=DEBOUNCE_SECONDS, watcher=None):
+    """
+    Yield sorted lists of the ``suffix`` files in ``directory`` that
+    changed, once every file in a burst of writes has been completely
+    written and nothing has changed for ``debounce`` seconds.
+    """
+    watcher = watcher or open_watcher(directory)
+    pending = {}
+    last_event = 0.0
+
+    try:
+        while True:
+            timeout = None
+            if pending and all(pending.values()):
+                timeout = max(0.0, last_event + debounce - time.monotonic())
+
+            for name, complete in watcher.read(timeout):
+                if name.endswith(suffix):
+                    pending[name] = complete
+                    last_event = time.monotonic()
+
+            if (pending and all(pending.values())
+                    and time.monotonic() - last_event >= debounce):
+                yield sorted(pending)
+                pending = {}
+    finally:
+        watcher.close()
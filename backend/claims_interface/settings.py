@@ -128,6 +128,28 @@ else:
     print("No DATABASE_URL found, using SQLite")
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+# Share the cache between workers through Redis when REDIS_URL is set, so
+# live searches are coalesced across them (see claims.live_search); each
+# process keeps its own cache otherwise
+REDIS_URL = os.getenv('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -180,6 +202,9 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 CRISPY_ALLOWED_TEMPLATE_PACKS = "bootstrap5"
 CRISPY_TEMPLATE_PACK = "bootstrap5"
 
+# Claims ingestion: rows rejected while loading the feeds are written here
+CLAIMS_QUARANTINE_DIR = BASE_DIR / 'quarantine'
+
 # Authentication Configuration
 LOGIN_REDIRECT_URL = '/dashboard/'
 LOGOUT_REDIRECT_URL = '/login/'
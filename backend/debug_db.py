@@ -6,7 +6,7 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'claims_interface.settings')
 django.setup()
 
 from django.db import connection
-from claims.models import ClaimList, ClaimDetail
+from claims.models import ClaimList, ClaimDetail, ClaimStatus, Insurer
 
 # Test direct database connection
 cursor = connection.cursor()
@@ -31,8 +31,8 @@ try:
         patient_name='Test Patient',
         billed_amount=100.00,
         paid_amount=50.00,
-        status='Test',
-        insurer_name='Test Insurer',
+        status=ClaimStatus.intern('Test'),
+        insurer=Insurer.intern('Test Insurer'),
         discharge_date='2022-01-01'
     )
     test_claim.save()
@@ -1,13 +1,15 @@
 /**
- * Data Monitor - Automatically detects CSV changes and updates frontend
+ * Data Monitor - Listens for data changes pushed by the server and updates frontend
  */
 class DataMonitor {
     constructor(options = {}) {
-        this.checkInterval = options.checkInterval || 30000; // 30 seconds
+        this.eventsUrl = options.eventsUrl || '/dashboard/api/events/';
         this.autoReload = options.autoReload !== false; // Default: true
         this.isMonitoring = false;
-        this.lastDataStatus = null;
+        this.eventSource = null;
+        this.dataVersion = null;
         this.changeCallbacks = [];
+        this.progressCallbacks = [];
         
         // Initialize
         this.init();
@@ -16,84 +18,85 @@ class DataMonitor {
     init() {
         // Start monitoring when page loads
         this.startMonitoring();
-        
-        // Set up periodic checks
-        setInterval(() => {
-            if (this.isMonitoring) {
-                this.checkForChanges();
-            }
-        }, this.checkInterval);
-        
-        // Check for changes when page becomes visible
-        document.addEventListener('visibilitychange', () => {
-            if (!document.hidden && this.isMonitoring) {
-                this.checkForChanges();
-            }
-        });
     }
     
     startMonitoring() {
+        if (this.isMonitoring || !window.EventSource) {
+            return;
+        }
         this.isMonitoring = true;
-        // monitoring started
         
-        // Initial check
-        this.checkForChanges();
+        // The server pushes events, so nothing runs here while the data is
+        // unchanged; EventSource reconnects by itself when the stream ends
+        this.eventSource = new EventSource(this.eventsUrl);
+        this.eventSource.addEventListener('version', event => {
+            this.handleVersion(JSON.parse(event.data));
+        });
+        this.eventSource.addEventListener('reload', event => {
+            this.handleProgress(JSON.parse(event.data));
+        });
     }
     
     stopMonitoring() {
         this.isMonitoring = false;
-    }
-    
-    async checkForChanges() {
-        try {
-            const response = await fetch('/dashboard/api/check-changes/');
-            const data = await response.json();
-            
-            if (data.changes_detected) {
-                this.handleChanges(data);
-            }
-            
-        } catch (error) {
-            // silent
+        if (this.eventSource) {
+            this.eventSource.close();
+            this.eventSource = null;
         }
     }
     
-    async handleChanges(changeData) {
+    handleVersion(versionData) {
+        // The first event only tells us which data the page was built from
+        const previousVersion = this.dataVersion;
+        this.dataVersion = versionData.data_version;
+        if (previousVersion === null || previousVersion === versionData.data_version) {
+            return;
+        }
+        
         // Notify all registered callbacks
         this.changeCallbacks.forEach(callback => {
             try {
-                callback(changeData);
+                callback(versionData);
             } catch (error) {
             }
         });
         
-        // Auto-reload if enabled
+        // Refresh the page with the reloaded data if enabled
         if (this.autoReload) {
-            await this.reloadData();
+            this.updatePageData(versionData);
+        }
+    }
+    
+    handleProgress(job) {
+        this.progressCallbacks.forEach(callback => {
+            try {
+                callback(job);
+            } catch (error) {
+            }
+        });
+    }
+    
+    async checkForChanges() {
+        try {
+            // changed files are queued for reload by the server, and the
+            // result arrives as a version event
+            await fetch('/dashboard/api/check-changes/');
+        } catch (error) {
+            // silent
         }
     }
     
     async reloadData() {
         try {
-            // auto-reloading
-            
-            const response = await fetch('/dashboard/api/force-reload/', {
+            // queue a reload; progress and the new data version arrive as
+            // events
+            await fetch('/dashboard/api/force-reload/', {
                 method: 'POST',
                 headers: {
                     'X-CSRFToken': this.getCSRFToken(),
                     'Content-Type': 'application/json',
                 }
             });
-            
-            const result = await response.json();
-            
-            if (result.success) {
-                // reload completed
-                this.updatePageData(result);
-            } else {
-                // silent
-            }
-            
         } catch (error) {
             // silent
         }
@@ -196,6 +199,11 @@ class DataMonitor {
         this.changeCallbacks.push(callback);
     }
     
+    // Register callback for reload progress events
+    onReloadProgress(callback) {
+        this.progressCallbacks.push(callback);
+    }
+    
     // Manual check for changes
     async manualCheck() {
         await this.checkForChanges();
@@ -209,7 +217,6 @@ class DataMonitor {
 
 // Global instance
 window.dataMonitor = new DataMonitor({
-    checkInterval: 30000, // 30 seconds
     autoReload: true
 });
 